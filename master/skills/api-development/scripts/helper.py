@@ -1,20 +1,389 @@
+import asyncio
+import json
+import logging
+import random
+import ssl
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import requests
+from requests.adapters import HTTPAdapter
+
+# Transient statuses worth another attempt; the Idempotency-Key makes POST retries safe
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+log = logging.getLogger(__name__)
+
+
+def _tls_failure(exc):
+    """
+    True for certificate/TLS failures, which another attempt will not fix.
+    requests raises SSLError (a ConnectionError subclass); httpx chains the ssl error.
+    """
+    while exc is not None:
+        if isinstance(exc, (requests.exceptions.SSLError, ssl.SSLError)):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class Idempotent:
+    """
+    post_many item that reuses the caller's Idempotency-Key: Idempotent("order-1", data).
+    Any other item (tuples included) is sent as the JSON body under a fresh key.
+    """
+
+    __slots__ = ("key", "data")
+
+    def __init__(self, key, data):
+        self.key = key
+        self.data = data
+
+
+def _keyed(item):
+    if isinstance(item, Idempotent):
+        return item.key, item.data
+    return None, item
+
+
+class APIError(Exception):
+    """
+    Request failed after all attempts. `status` is None for transport errors.
+    """
+
+    def __init__(self, message, status=None, body=None, attempts=1):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+        self.attempts = attempts
+
+
+def backoff_delay(attempt, base=0.05, cap=2.0, retry_after=None, rng=random, retry_after_cap=60.0):
+    """
+    Full-jitter exponential backoff: U(0, min(cap, base * 2**attempt)).
+    A server Retry-After (seconds) is honoured as a floor up to retry_after_cap;
+    beyond that the answer is None: don't retry, the server asked for longer than we wait.
+    """
+    delay = rng.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after:
+        try:
+            wait = float(retry_after)
+        except ValueError:
+            return delay  # HTTP-date form; keep the jittered delay
+        if wait > retry_after_cap:
+            return None
+        delay = max(delay, wait)
+    return delay
 
-class APIClient:
-    def __init__(self, base_url, api_key):
-        self.base = base_url
+
+class _BaseClient:
+    """
+    Retry policy, idempotency keys and timing hooks shared by the sync and async clients.
+    Hooks are called as hook(event) once per attempt, event = {method, path, status,
+    seconds, attempt, outcome, idempotency_key}; outcome is ok / retry / error.
+    A hook that raises is logged and skipped: by then the server has acted on the request.
+    A Retry-After longer than retry_after_cap seconds ends the retries.
+    """
+
+    def __init__(self, base_url, api_key, max_retries=3, backoff_base=0.05, backoff_cap=2.0,
+                 connect_timeout=3.05, read_timeout=10, hooks=None, retry_after_cap=60.0):
+        self.base = base_url.rstrip("/")
         self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_after_cap = retry_after_cap
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.hooks = list(hooks or [])
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _request_headers(self, idempotency_key):
+        # One key per logical call, reused on every retry of it
+        return {**self.headers, "Idempotency-Key": idempotency_key or str(uuid.uuid4())}
+
+    def _emit(self, method, path, status, seconds, attempt, outcome, idempotency_key):
+        if not self.hooks:
+            return
+        event = {"method": method, "path": path, "status": status, "seconds": seconds,
+                 "attempt": attempt, "outcome": outcome, "idempotency_key": idempotency_key}
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                log.exception("hook %r failed for %s %s", hook, method, path)
+
+    def _delay(self, attempt, retry_after=None):
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap, retry_after,
+                             retry_after_cap=self.retry_after_cap)
+
+    @staticmethod
+    def _decode(status, text):
+        try:
+            return json.loads(text) if text else None
+        except ValueError:
+            raise APIError(f"HTTP {status}: response is not JSON", status, text)
+
+
+class APIClient(_BaseClient):
+    """
+    Pooled, retrying API client: keep-alive Session with a bounded per-host pool,
+    connect/read timeouts, jittered backoff and automatic Idempotency-Key.
+    """
+
+    def __init__(self, base_url, api_key, pool_size=32, **kwargs):
+        super().__init__(base_url, api_key, **kwargs)
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # pool_block: callers wait for a free connection instead of opening extras
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, path, data, idempotency_key=None):
+        """
+        POST JSON and return the decoded body. Raises APIError once retries are exhausted.
+        """
+        url = f"{self.base}{path}"
+        headers = self._request_headers(idempotency_key)
+        key = headers["Idempotency-Key"]
+        timeout = (self.connect_timeout, self.read_timeout)
+
+        for attempt in range(self.max_retries + 1):
+            final = attempt == self.max_retries
+            start = time.perf_counter()
+            try:
+                r = self.session.post(url, json=data, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                final = final or _tls_failure(e)
+                self._emit("POST", path, None, time.perf_counter() - start, attempt, "error" if final else "retry", key)
+                if final:
+                    raise APIError(f"POST {path} failed: {e}", attempts=attempt + 1) from e
+                time.sleep(self._delay(attempt))
+                continue
+
+            seconds = time.perf_counter() - start
+            if r.status_code < 400:
+                self._emit("POST", path, r.status_code, seconds, attempt, "ok", key)
+                return self._decode(r.status_code, r.text)
+            delay = None
+            if not final and r.status_code in RETRY_STATUSES:
+                delay = self._delay(attempt, r.headers.get("Retry-After"))
+            if delay is None:
+                self._emit("POST", path, r.status_code, seconds, attempt, "error", key)
+                raise APIError(f"POST {path}: HTTP {r.status_code}", r.status_code, r.text, attempt + 1)
+            self._emit("POST", path, r.status_code, seconds, attempt, "retry", key)
+            time.sleep(delay)
+
+    def post_many(self, path, items, concurrency=None):
+        """
+        POST every item with at most `concurrency` in flight (default: pool_size).
+        Items are data or Idempotent(key, data). Returns results in input order;
+        a failed item is its APIError, not a raise.
+        """
+        def one(item):
+            key, data = _keyed(item)
+            try:
+                return self.post(path, data, key)
+            except APIError as e:
+                return e
+
+        with ThreadPoolExecutor(min(concurrency or self.pool_size, self.pool_size)) as pool:
+            return list(pool.map(one, items))
 
-    def post(self, path, data):
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncAPIClient(_BaseClient):
+    """
+    asyncio variant on httpx: pooled keep-alive connections, same retry/idempotency/hooks.
+    """
+
+    def __init__(self, base_url, api_key, max_connections=100, **kwargs):
+        import httpx
+
+        super().__init__(base_url, api_key, **kwargs)
+        self.max_connections = max_connections
+        self.transport_errors = (httpx.TransportError,)
+        self.client = httpx.AsyncClient(
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+        )
+
+    async def post(self, path, data, idempotency_key=None):
         url = f"{self.base}{path}"
+        headers = self._request_headers(idempotency_key)
+        key = headers["Idempotency-Key"]
+
+        for attempt in range(self.max_retries + 1):
+            final = attempt == self.max_retries
+            start = time.perf_counter()
+            try:
+                r = await self.client.post(url, json=data, headers=headers)
+            except self.transport_errors as e:
+                final = final or _tls_failure(e)
+                self._emit("POST", path, None, time.perf_counter() - start, attempt, "error" if final else "retry", key)
+                if final:
+                    raise APIError(f"POST {path} failed: {e!r}", attempts=attempt + 1) from e
+                await asyncio.sleep(self._delay(attempt))
+                continue
+
+            seconds = time.perf_counter() - start
+            if r.status_code < 400:
+                self._emit("POST", path, r.status_code, seconds, attempt, "ok", key)
+                return self._decode(r.status_code, r.text)
+            delay = None
+            if not final and r.status_code in RETRY_STATUSES:
+                delay = self._delay(attempt, r.headers.get("Retry-After"))
+            if delay is None:
+                self._emit("POST", path, r.status_code, seconds, attempt, "error", key)
+                raise APIError(f"POST {path}: HTTP {r.status_code}", r.status_code, r.text, attempt + 1)
+            self._emit("POST", path, r.status_code, seconds, attempt, "retry", key)
+            await asyncio.sleep(delay)
+
+    async def post_many(self, path, items, concurrency=None):
+        sem = asyncio.Semaphore(min(concurrency or self.max_connections, self.max_connections))
+
+        async def one(item):
+            key, data = _keyed(item)
+            async with sem:
+                try:
+                    return await self.post(path, data, key)
+                except APIError as e:
+                    return e
+
+        return await asyncio.gather(*(one(item) for item in items))
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # avoid 40ms delayed-ACK stalls on reused connections
+    fail_rate = 0.0
+    seen = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        key = self.headers.get("Idempotency-Key")
+        if random.random() < self.fail_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        # Replays of a completed key get the original response back
+        out = self.seen.get(key)
+        if out is None:
+            out = json.dumps({"id": str(uuid.uuid4()), "request": json.loads(body or b"{}")}).encode()
+            self.seen[key] = out
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve_stub_process(port_queue, fail_rate):
+    handler = type("StubHandler", (_StubHandler,), {"fail_rate": fail_rate, "seen": {}})
+    server_cls = type("StubServer", (ThreadingHTTPServer,), {"request_queue_size": 512, "daemon_threads": True})
+    server = server_cls(("127.0.0.1", 0), handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def benchmark(n=2000, concurrency=16, fail_rate=0.05):
+    """
+    Local stub failing `fail_rate` of calls with 503: per-call requests.post vs APIClient vs AsyncAPIClient.
+    """
+    import multiprocessing
+
+    # Stub runs in its own process so it does not share the client's GIL
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve_stub_process, args=(port_queue, fail_rate), daemon=True)
+    server.start()
+    base = f"http://127.0.0.1:{port_queue.get()}"
+    items = [{"amount": 100 + i, "currency": "USD"} for i in range(n)]
+
+    def unpooled(data):
         try:
-            r = requests.post(url, json=data, headers=self.headers)
+            r = requests.post(f"{base}/v1/payments", json=data, headers={"Authorization": "Bearer sk_test"}, timeout=10)
             r.raise_for_status()
             return r.json()
-        except Exception as e:
-            print(f"API Error: {e}")
-            return None
+        except requests.RequestException as e:
+            return e
+
+    results = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        out = list(pool.map(unpooled, items))
+    results["requests.post per call"] = (out, time.perf_counter() - start, None)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def timing(event):
+        with lock:
+            latencies.append(event["seconds"])
+
+    with APIClient(base, "sk_test", pool_size=concurrency, hooks=[timing]) as client:
+        start = time.perf_counter()
+        out = client.post_many("/v1/payments", items)
+        results["APIClient"] = (out, time.perf_counter() - start, sorted(latencies))
+
+    async def run_async():
+        async_latencies = []
+        async with AsyncAPIClient(base, "sk_test", max_connections=concurrency,
+                                  hooks=[lambda e: async_latencies.append(e["seconds"])]) as client:
+            start = time.perf_counter()
+            out = await client.post_many("/v1/payments", items)
+            return out, time.perf_counter() - start, sorted(async_latencies)
+
+    try:
+        results["AsyncAPIClient"] = asyncio.run(run_async())
+    except ImportError:
+        print("httpx not installed; skipping AsyncAPIClient")
+    server.terminate()
+
+    print(f"{n} POSTs, concurrency {concurrency}, stub fails {fail_rate:.0%} with 503")
+    for name, (out, elapsed, samples) in results.items():
+        ok = sum(1 for r in out if isinstance(r, dict))
+        line = f"{name:<24} {n / elapsed:7,.0f} req/s  succeeded {ok}/{n}"
+        if samples:
+            line += f"  attempt p50 {samples[len(samples) // 2] * 1000:.2f} ms p99 {samples[int(len(samples) * 0.99)] * 1000:.2f} ms"
+        print(line)
+
 
 if __name__ == "__main__":
-    client = APIClient("https://api.example.com", "sk_test_123")
-    print(client.post("/v1/payments", {"amount": 100}))
+    client = APIClient("https://api.example.com", "sk_test_123", max_retries=1)
+    try:
+        print(client.post("/v1/payments", {"amount": 100}))
+    except APIError as e:
+        print(f"API Error: {e}")
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -1,5 +1,11 @@
+import codecs
 import json
 import gzip
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 def parse_cloudtrail(file_path):
     """
@@ -13,6 +19,339 @@ def parse_cloudtrail(file_path):
         if rec.get('eventName') == 'ConsoleLogin':
             print(f"Login: {rec['userIdentity'].get('userName')} from {rec['sourceIPAddress']}")
 
+
+_RECORDS_START = re.compile(r'"Records"\s*:\s*\[')
+_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def iter_records(file_path, chunk_size=1 << 20, stats=None):
+    """
+    Yield CloudTrail records one at a time from {"Records": [...]} (.json or .json.gz).
+    Memory is bounded by chunk_size plus the largest single record.
+    stats["bytes"] counts uncompressed bytes read.
+    """
+    decoder = json.JSONDecoder()
+    opener = gzip.open if file_path.endswith(".gz") else open
+    with opener(file_path, "rb") as f:
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+
+        def read():
+            # Decode ourselves so stats count bytes, not characters; "" only at EOF
+            while True:
+                data = f.read(chunk_size)
+                if stats is not None:
+                    stats["bytes"] += len(data)
+                text = utf8.decode(data, final=not data)
+                if text or not data:
+                    return text
+
+        # 1. Skip to the start of the Records array
+        buf = ""
+        while True:
+            chunk = read()
+            buf += chunk
+            match = _RECORDS_START.search(buf)
+            if match:
+                pos = match.end()
+                break
+            if not chunk:
+                return
+            buf = buf[-64:]  # key may straddle the chunk boundary
+
+        # 2. raw_decode one record at a time, refilling when a record is cut off
+        eof = False
+        while True:
+            pos = _SEPARATOR.match(buf, pos).end()
+            if pos < len(buf):
+                if buf[pos] == "]":
+                    return
+                try:
+                    record, pos = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield record
+                    continue
+            elif eof:
+                raise ValueError(f"{file_path}: Records array is not terminated")
+
+            chunk = read()
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+def _get(record, path):
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def _field(expr):
+    # "userIdentity.userName|userIdentity.arn": first non-null alternative
+    paths = [tuple(p.split(".")) for p in expr.split("|")]
+    if len(paths) == 1 and len(paths[0]) == 1:
+        key = paths[0][0]
+        return lambda record: record.get(key)
+    if len(paths) == 1:
+        path = paths[0]
+        return lambda record: _get(record, path)
+
+    def get(record):
+        for path in paths:
+            value = _get(record, path)
+            if value is not None:
+                return value
+        return None
+
+    return get
+
+
+def compile_filter(spec):
+    """
+    Declarative filter -> predicate. Keys AND together:
+      "field.path": value | [values] | {"exists": bool}
+      "any": [spec, ...]   "not": spec
+    """
+    checks = []
+    for field, expected in (spec or {}).items():
+        if field == "any":
+            subs = [compile_filter(s) for s in expected]
+            checks.append(lambda r, subs=subs: any(p(r) for p in subs))
+        elif field == "not":
+            sub = compile_filter(expected)
+            checks.append(lambda r, sub=sub: not sub(r))
+        else:
+            get = _field(field)
+            if isinstance(expected, dict):
+                want = expected["exists"]
+                checks.append(lambda r, get=get, want=want: (get(r) is not None) == want)
+            elif isinstance(expected, (list, tuple, set, frozenset)):
+                values = frozenset(expected)
+                checks.append(lambda r, get=get, values=values: get(r) in values)
+            else:
+                checks.append(lambda r, get=get, expected=expected: get(r) == expected)
+    if not checks:
+        return lambda record: True
+    if len(checks) == 1:
+        return checks[0]
+    if len(checks) == 2:
+        first, second = checks
+        return lambda record: first(record) and second(record)
+    return lambda record: all(check(record) for check in checks)
+
+
+FILTERS = {
+    "console_login": {"eventName": "ConsoleLogin"},
+    "failed_auth": {"any": [
+        {"eventName": "ConsoleLogin", "responseElements.ConsoleLogin": "Failure"},
+        {"errorCode": ["AccessDenied", "AccessDeniedException", "Client.UnauthorizedOperation",
+                       "UnauthorizedOperation", "InvalidClientTokenId", "SignatureDoesNotMatch"]},
+    ]},
+    "privilege_change": {"eventSource": "iam.amazonaws.com", "eventName": [
+        "AttachUserPolicy", "AttachGroupPolicy", "AttachRolePolicy", "PutUserPolicy", "PutGroupPolicy",
+        "PutRolePolicy", "CreatePolicyVersion", "SetDefaultPolicyVersion", "AddUserToGroup", "CreateUser",
+        "CreateRole", "CreateAccessKey", "CreateLoginProfile", "UpdateLoginProfile", "UpdateAssumeRolePolicy",
+        "DeactivateMFADevice", "DeleteRolePermissionsBoundary", "DeleteUserPermissionsBoundary",
+    ]},
+    "root_activity": {"userIdentity.type": "Root"},
+}
+
+# name, filter (FILTERS key or inline spec), group_by fields, optional per-event projection
+AGGREGATIONS = [
+    {"name": "logins_per_user_ip", "filter": "console_login",
+     "group_by": ["userIdentity.userName|userIdentity.arn", "sourceIPAddress", "responseElements.ConsoleLogin"]},
+    {"name": "failed_auth", "filter": "failed_auth",
+     "group_by": ["userIdentity.arn|userIdentity.principalId", "sourceIPAddress", "eventName", "errorCode"]},
+    {"name": "privilege_changes", "filter": "privilege_change",
+     "group_by": ["userIdentity.arn", "eventName"],
+     "emit": ["eventTime", "eventName", "userIdentity.arn", "sourceIPAddress", "requestParameters",
+              "recipientAccountId"]},
+    {"name": "root_activity", "filter": "root_activity", "group_by": ["eventName", "sourceIPAddress"]},
+]
+
+_COMPILED = None
+
+
+def _compile(aggregations, filters):
+    compiled = []
+    for agg in aggregations:
+        spec = filters[agg["filter"]] if isinstance(agg["filter"], str) else agg["filter"]
+        compiled.append((
+            agg["name"],
+            compile_filter(spec),
+            [_field(f) for f in agg["group_by"]],
+            [(f, _field(f)) for f in agg.get("emit", ())],
+        ))
+    return compiled
+
+
+def _init_worker(aggregations, filters):
+    global _COMPILED
+    _COMPILED = _compile(aggregations, filters)
+
+
+def _analyze_file(file_path):
+    """
+    One file -> (partial groups, emitted events, stats). Runs in a pool worker.
+    A file that cannot be read or parsed contributes nothing; stats["error"] says why.
+    """
+    try:
+        return _aggregate_file(file_path)
+    except (OSError, ValueError, EOFError) as exc:
+        return {}, [], {"bytes": 0, "records": 0, "compressed_bytes": 0, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def _aggregate_file(file_path):
+    groups = {name: {} for name, _, _, _ in _COMPILED}
+    events = []
+    stats = {"bytes": 0, "records": 0}
+    for record in iter_records(file_path, stats=stats):
+        stats["records"] += 1
+        for name, match, group_by, emit in _COMPILED:
+            if not match(record):
+                continue
+            key = tuple(get(record) for get in group_by)
+            when = record.get("eventTime") or ""
+            slot = groups[name].get(key)
+            if slot is None:
+                groups[name][key] = [1, when, when]
+            else:
+                slot[0] += 1
+                slot[1] = min(slot[1], when)
+                slot[2] = max(slot[2], when)
+            if emit:
+                events.append({"aggregation": name, "event": {f: get(record) for f, get in emit}})
+    stats["compressed_bytes"] = os.path.getsize(file_path)
+    return groups, events, stats
+
+
+def analyze(paths, output_path, aggregations=AGGREGATIONS, filters=FILTERS, workers=None):
+    """
+    Fan files out over a process pool, merge partial aggregations, and write JSONL:
+    emitted events as they arrive, then one line per (aggregation, group).
+    """
+    workers = workers or os.cpu_count()
+    paths = list(paths)
+    names = {agg["name"]: agg["group_by"] for agg in aggregations}
+    merged = {name: {} for name in names}
+    totals = {"files": 0, "records": 0, "bytes": 0, "compressed_bytes": 0, "failed": []}
+
+    start = time.perf_counter()
+    with open(output_path, "w") as out:
+        if workers == 1:
+            _init_worker(aggregations, filters)
+            results = map(_analyze_file, paths)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(aggregations, filters))
+            results = pool.map(_analyze_file, paths, chunksize=max(1, len(paths) // (workers * 8)))
+        try:
+            for path, (groups, events, stats) in zip(paths, results):
+                totals["files"] += 1
+                if "error" in stats:
+                    totals["failed"].append({"file": path, "error": stats["error"]})
+                for key in ("records", "bytes", "compressed_bytes"):
+                    totals[key] += stats[key]
+                for event in events:
+                    out.write(json.dumps(event, default=str) + "\n")
+                for name, partial in groups.items():
+                    target = merged[name]
+                    for key, (count, first, last) in partial.items():
+                        slot = target.get(key)
+                        if slot is None:
+                            target[key] = [count, first, last]
+                        else:
+                            slot[0] += count
+                            slot[1] = min(slot[1], first)
+                            slot[2] = max(slot[2], last)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        for name, target in merged.items():
+            for key, (count, first, last) in sorted(target.items(), key=lambda kv: -kv[1][0]):
+                out.write(json.dumps({"aggregation": name, "key": dict(zip(names[name], key)),
+                                      "count": count, "first_seen": first, "last_seen": last}) + "\n")
+
+    elapsed = time.perf_counter() - start
+    mb = totals["bytes"] / 2**20
+    totals.update(seconds=round(elapsed, 2), workers=workers, mb_per_s=round(mb / elapsed, 1),
+                  mb_per_s_per_core=round(mb / elapsed / workers, 1))
+    return totals
+
+
+def _synthetic_record(rng, i):
+    users = [f"user{n}" for n in range(50)]
+    kind = rng.random()
+    record = {
+        "eventVersion": "1.08",
+        "userIdentity": {"type": "IAMUser", "principalId": f"AIDA{i:012d}",
+                         "arn": f"arn:aws:iam::123456789012:user/{rng.choice(users)}",
+                         "accountId": "123456789012", "userName": rng.choice(users)},
+        "eventTime": f"2024-05-01T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+        "eventSource": "ec2.amazonaws.com", "eventName": "DescribeInstances", "awsRegion": "us-east-1",
+        "sourceIPAddress": f"10.0.{rng.randint(0, 3)}.{rng.randint(1, 254)}",
+        "userAgent": "aws-cli/2.15.0 Python/3.11.6 Linux/5.15", "requestParameters": {"maxResults": 100},
+        "responseElements": None, "requestID": f"{i:08x}-0000-0000-0000-000000000000",
+        "eventID": f"{i:08x}-1111-1111-1111-111111111111", "readOnly": True,
+        "eventType": "AwsApiCall", "recipientAccountId": "123456789012",
+    }
+    if kind < 0.02:
+        record.update(eventSource="signin.amazonaws.com", eventName="ConsoleLogin",
+                      responseElements={"ConsoleLogin": "Failure" if rng.random() < 0.3 else "Success"})
+    elif kind < 0.03:
+        record.update(eventSource="iam.amazonaws.com", eventName="AttachUserPolicy", readOnly=False,
+                      requestParameters={"userName": rng.choice(users),
+                                         "policyArn": "arn:aws:iam::aws:policy/AdministratorAccess"})
+    elif kind < 0.05:
+        record.update(errorCode="AccessDenied", errorMessage="User is not authorized")
+    return record
+
+
+def benchmark(files=48, records_per_file=5000, path="/tmp/cloudtrail-bench"):
+    """
+    MB/s (uncompressed) per core for 1 vs all workers, and peak memory of json.load vs iter_records.
+    """
+    import random
+    import shutil
+    import tracemalloc
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    rng = random.Random(5)
+    paths = []
+    for n in range(files):
+        file_path = os.path.join(path, f"123456789012_CloudTrail_us-east-1_{n:05d}.json.gz")
+        with gzip.open(file_path, "wt", compresslevel=6) as f:
+            json.dump({"Records": [_synthetic_record(rng, n * records_per_file + i)
+                                   for i in range(records_per_file)]}, f)
+        paths.append(file_path)
+
+    tracemalloc.start()
+    with gzip.open(paths[0], "rt") as f:
+        json.load(f)
+    load_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    for _ in iter_records(paths[0]):
+        pass
+    stream_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"peak memory per file: json.load {load_peak / 2**20:.1f} MiB, iter_records {stream_peak / 2**20:.1f} MiB")
+
+    for workers in sorted({1, os.cpu_count()}):
+        out = os.path.join(path, "report.jsonl")
+        print(analyze(paths, out, workers=workers))
+    with open(out) as f:
+        print("sample:", f.readline().strip()[:160])
+    shutil.rmtree(path, ignore_errors=True)
+
 if __name__ == "__main__":
     # parse_cloudtrail('dummy.json.gz')
     print("CloudTrail Parser Ready")
+
+    if "--bench" in sys.argv:
+        benchmark()
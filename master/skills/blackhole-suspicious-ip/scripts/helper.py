@@ -1,4 +1,10 @@
+import bisect
 import ipaddress
+import os
+import socket
+import sys
+import threading
+import time
 
 BLACKLIST = [
     "1.2.3.4",
@@ -22,5 +28,143 @@ def is_ip_blocked(ip):
                 
     return False
 
+
+def _merge_ranges(ranges):
+    """
+    Sort and merge overlapping/adjacent (start, end) integer ranges.
+    Returns (starts, ends) lists for bisect.
+    """
+    starts, ends = [], []
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            if end > ends[-1]:
+                ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class CompiledBlocklist:
+    """
+    Blocklist compiled to sorted, merged integer ranges per address family.
+    Lookup is a single bisect (O(log n)). reload() builds a new snapshot and
+    swaps it in one assignment, so lookups never block or see a partial feed.
+    """
+
+    def __init__(self, entries=()):
+        self.snapshot = self._compile(entries)
+        self.loaded_at = time.time()
+        self._watcher = None
+
+    @staticmethod
+    def _compile(entries):
+        v4, v6 = [], []
+        for entry in entries:
+            entry = entry.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            net = ipaddress.ip_network(entry, strict=False)
+            bucket = v4 if net.version == 4 else v6
+            bucket.append((int(net.network_address), int(net.broadcast_address)))
+        return {4: _merge_ranges(v4), 6: _merge_ranges(v6)}
+
+    def reload(self, entries):
+        """
+        Compile a new feed off the request path, then swap it in atomically.
+        """
+        snapshot = self._compile(entries)
+        self.snapshot = snapshot
+        self.loaded_at = time.time()
+
+    def reload_from_file(self, path):
+        with open(path) as f:
+            self.reload(f)
+
+    def watch(self, path, interval=30):
+        """
+        Reload from path in a daemon thread whenever its mtime changes.
+        """
+        def run():
+            last_mtime = None
+            while True:
+                try:
+                    mtime = os.stat(path).st_mtime
+                    if mtime != last_mtime:
+                        self.reload_from_file(path)
+                        last_mtime = mtime
+                except (OSError, ValueError) as e:
+                    # Keep serving the previous snapshot on a bad/missing feed
+                    print(f"Blocklist reload failed: {e}")
+                time.sleep(interval)
+
+        self._watcher = threading.Thread(target=run, name="blocklist-reload", daemon=True)
+        self._watcher.start()
+
+    def is_blocked(self, ip):
+        """
+        Check if IP falls in any blocked range.
+        """
+        family = 6 if ":" in ip else 4
+        try:
+            packed = socket.inet_pton(socket.AF_INET6 if family == 6 else socket.AF_INET, ip)
+        except OSError:
+            raise ValueError(f"{ip!r} does not appear to be an IPv4 or IPv6 address")
+
+        starts, ends = self.snapshot[family]
+        value = int.from_bytes(packed, "big")
+
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def __len__(self):
+        return len(self.snapshot[4][0]) + len(self.snapshot[6][0])
+
+
+def benchmark(entries=500_000, lookups=500_000, seed=7):
+    """
+    Lookups per second against a synthetic mixed IPv4/IPv6 feed.
+    """
+    import random
+
+    rng = random.Random(seed)
+    feed = []
+    for _ in range(entries):
+        if rng.random() < 0.8:
+            net = ipaddress.ip_network((rng.getrandbits(32), rng.choice([24, 28, 32, 32, 32])), strict=False)
+            feed.append(str(net))
+        else:
+            net = ipaddress.ip_network((rng.getrandbits(128), rng.choice([48, 64, 128])), strict=False)
+            feed.append(str(net))
+
+    start = time.perf_counter()
+    blocklist = CompiledBlocklist(feed)
+    print(f"Compiled {entries:,} entries into {len(blocklist):,} ranges in {time.perf_counter() - start:.2f}s")
+
+    probes = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(lookups * 4 // 5)]
+    probes += [str(ipaddress.IPv6Address(rng.getrandbits(128))) for _ in range(lookups // 5)]
+
+    start = time.perf_counter()
+    hits = sum(blocklist.is_blocked(ip) for ip in probes)
+    elapsed = time.perf_counter() - start
+    print(f"{lookups / elapsed:,.0f} lookups/s ({hits} hits)")
+
+    # Linear scan for scale (small sample: it is O(n) per lookup)
+    global BLACKLIST
+    BLACKLIST, original = feed, BLACKLIST
+    sample = probes[:20]
+    start = time.perf_counter()
+    for ip in sample:
+        is_ip_blocked(ip)
+    print(f"is_ip_blocked (linear): {len(sample) / (time.perf_counter() - start):,.1f} lookups/s")
+    BLACKLIST = original
+
+
 if __name__ == "__main__":
     print(f"Is 203.0.113.10 blocked? {is_ip_blocked('203.0.113.10')}")
+
+    blocklist = CompiledBlocklist(BLACKLIST)
+    print(f"Compiled: Is 203.0.113.10 blocked? {blocklist.is_blocked('203.0.113.10')}")
+
+    if "--bench" in sys.argv:
+        benchmark()
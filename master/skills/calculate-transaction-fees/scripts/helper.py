@@ -1,8 +1,19 @@
+import bisect
+import csv
+import sys
+import time
 from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
 
-def calculate_fees(amount_cents, model_config):
+try:
+    import numpy as np
+except ImportError:  # Bulk path falls back to Python ints
+    np = None
+
+def calculate_fees(amount_cents, model_config, card_bin=None, card_category=None, region=None):
     """
     Calculate fees based on model. Amount in cents.
+    IC_PLUS with an 'interchange_table' looks up interchange/scheme by card_bin, card_category and region.
     """
     amount = Decimal(amount_cents)
     
@@ -12,6 +23,34 @@ def calculate_fees(amount_cents, model_config):
         
         fee = (amount * variable) + fixed
         
+    elif model_config['type'] == 'IC_PLUS' and 'interchange_table' in model_config:
+        # Per-card interchange/scheme from the loaded table
+        row = model_config['interchange_table'].lookup(card_bin, card_category, region)
+        if row is None:
+            raise ValueError(f"No interchange row for BIN {card_bin} ({card_category}, {region or 'any region'})")
+
+        ic_fee = amount * row['_interchange_rate'] + row['_interchange_fixed']
+        scheme_fee = amount * row['_scheme_rate'] + row['_scheme_fixed']
+        fee = ic_fee + scheme_fee + amount * Decimal(model_config['markup_percent']) / 100
+        if 'markup_fixed' in model_config:
+            fee += Decimal(model_config['markup_fixed'])
+
+        # Markup absorbs the rounding remainder so the components sum to the fee
+        total_fee = fee.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+        ic_cents = int(ic_fee.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+        scheme_cents = int(scheme_fee.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+        return {
+            "gross": int(amount),
+            "fee": int(total_fee),
+            "net": int(amount - total_fee),
+            "breakdown": {
+                "interchange": ic_cents,
+                "scheme": scheme_cents,
+                "markup": int(total_fee) - ic_cents - scheme_cents,
+                "interchange_row": row['row'],
+            }
+        }
+
     elif model_config['type'] == 'IC_PLUS':
         # Simple simulation of sum(components)
         ic = Decimal(model_config['interchange_percent']) / 100
@@ -34,8 +73,236 @@ def calculate_fees(amount_cents, model_config):
         "net": int(net)
     }
 
+class InterchangeTable:
+    """
+    Interchange/scheme rates indexed by (card category, region) and BIN range.
+    Lookup is a bisect over sorted, non-overlapping ranges (O(log n)), cached per BIN.
+    Rows: bin_start, bin_end, card_category, interchange_percent, scheme_percent,
+    optional region, interchange_fixed / scheme_fixed (cents) and any extra columns (scheme...).
+    Rows without a region apply to any region that has no row of its own for the BIN.
+    """
+
+    def __init__(self, rows, bin_digits=8, cache_size=65536):
+        self.bin_digits = bin_digits
+        by_category = {}
+        for row in rows:
+            start = self._bin_key(row['bin_start'], '0')
+            end = self._bin_key(row['bin_end'], '9')
+            if start > end:
+                raise ValueError(f"Invalid BIN range {row['bin_start']}-{row['bin_end']}")
+            key = (row['card_category'], row.get('region') or None)
+            by_category.setdefault(key, []).append((start, end, {
+                "row": row,
+                "_interchange_rate": Decimal(row['interchange_percent']) / 100,
+                "_interchange_fixed": Decimal(row.get('interchange_fixed') or 0),
+                "_scheme_rate": Decimal(row['scheme_percent']) / 100,
+                "_scheme_fixed": Decimal(row.get('scheme_fixed') or 0),
+            }))
+
+        self.index = {}
+        for (category, region), ranges in by_category.items():
+            ranges.sort(key=lambda r: r[0])
+            for prev, cur in zip(ranges, ranges[1:]):
+                if cur[0] <= prev[1]:
+                    raise ValueError(f"Overlapping BIN ranges for {category} ({region or 'any region'}): "
+                                     f"{prev[2]['row']['bin_start']}-{prev[2]['row']['bin_end']} and "
+                                     f"{cur[2]['row']['bin_start']}-{cur[2]['row']['bin_end']}")
+            self.index[(category, region)] = (
+                [r[0] for r in ranges],
+                [r[1] for r in ranges],
+                [r[2] for r in ranges],
+            )
+
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        with open(path, newline="") as f:
+            return cls(list(csv.DictReader(f)), **kwargs)
+
+    def _bin_key(self, value, fill):
+        return int(str(value)[:self.bin_digits].ljust(self.bin_digits, fill))
+
+    def _lookup(self, card_bin, card_category, region=None):
+        """
+        Matching rate entry for a BIN, card category and region, or None.
+        """
+        key = self._bin_key(card_bin, '0')
+        for index_key in ((card_category, region), (card_category, None)) if region else ((card_category, None),):
+            ranges = self.index.get(index_key)
+            if ranges is None:
+                continue
+            starts, ends, entries = ranges
+            i = bisect.bisect_right(starts, key) - 1
+            if i >= 0 and key <= ends[i]:
+                return entries[i]
+        return None
+
+def _scaled(value, scale):
+    """
+    Exact integer value * 10**scale of a Decimal string/number.
+    """
+    scaled = Decimal(value).scaleb(scale)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"{value} has more than {scale} decimal places")
+    return int(scaled)
+
+
+def _decimal_places(value):
+    exponent = Decimal(value).as_tuple().exponent
+    return max(0, -exponent)
+
+
+class FeeModel:
+    """
+    Precompiled fee model. Same results as calculate_fees(), in integer arithmetic.
+    fee = (amount * rate_num + fixed_num) / denom, rounded ROUND_HALF_UP.
+    """
+
+    def __init__(self, model_config):
+        if 'interchange_table' in model_config:
+            raise ValueError("FeeModel needs flat rates; use calculate_fees() for interchange tables")
+
+        if model_config['type'] == 'BLENDED':
+            percents = [model_config['percent']]
+            fixed = model_config['fixed_cents']
+        elif model_config['type'] == 'IC_PLUS':
+            percents = [
+                model_config['interchange_percent'],
+                model_config['scheme_percent'],
+                model_config['markup_percent'],
+            ]
+            fixed = model_config.get('markup_fixed', 0)
+        else:
+            raise ValueError(f"Unknown fee model type: {model_config['type']}")
+
+        # Common decimal scale so every component is an exact integer
+        scale = max(_decimal_places(v) for v in percents + [fixed])
+        self.type = model_config['type']
+        self.denom = 100 * 10 ** scale
+        self.rate_num = sum(_scaled(p, scale) for p in percents)
+        self.fixed_num = _scaled(fixed, scale + 2)
+
+    def fee(self, amount_cents):
+        """
+        Fee in cents for one amount (ROUND_HALF_UP, i.e. half away from zero).
+        """
+        num = int(amount_cents) * self.rate_num + self.fixed_num
+        q = (abs(num) * 2 + self.denom) // (2 * self.denom)
+        return q if num >= 0 else -q
+
+    def calculate(self, amount_cents):
+        """
+        Same output as calculate_fees(amount_cents, model_config).
+        """
+        fee = self.fee(amount_cents)
+        return {"gross": int(amount_cents), "fee": fee, "net": int(amount_cents) - fee}
+
+    def _fits_int64(self, amounts):
+        if len(amounts) == 0:
+            return True
+        peak = int(np.abs(amounts).max())
+        return (peak * abs(self.rate_num) + abs(self.fixed_num)) * 2 + self.denom < 2 ** 63
+
+    def calculate_many(self, amounts_cents):
+        """
+        Bulk fees over integer cent amounts.
+        Returns {"gross", "fee", "net"} columns (int64 arrays with numpy, else lists).
+        """
+        if np is None:
+            gross = [int(a) for a in amounts_cents]
+            fee = [self.fee(a) for a in gross]
+            return {"gross": gross, "fee": fee, "net": [g - f for g, f in zip(gross, fee)]}
+
+        gross = np.asarray(amounts_cents)
+        if gross.dtype.kind not in "iu" and gross.size:  # [] comes in as float64
+            raise TypeError("amounts must be integer cents")
+        gross = gross.astype(np.int64, copy=False)
+
+        if self._fits_int64(gross):
+            num = gross * self.rate_num + self.fixed_num
+            q = (np.abs(num) * 2 + self.denom) // (2 * self.denom)
+            fee = np.where(num >= 0, q, -q)
+        else:
+            # Exact Python ints for amounts that would overflow int64 intermediates
+            fee = np.array([self.fee(a) for a in gross.tolist()], dtype=np.int64)
+
+        return {"gross": gross, "fee": fee, "net": gross - fee}
+
+    def stream(self, chunks):
+        """
+        Yield bulk results for each chunk of amounts (see iter_amount_chunks).
+        """
+        for chunk in chunks:
+            yield self.calculate_many(chunk)
+
+
+def iter_amount_chunks(path, column="amount_cents", chunk_size=1_000_000):
+    """
+    Stream an integer cents column from a CSV or Parquet file in chunks.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=[column]):
+            yield batch.column(0).to_numpy()
+        return
+
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        chunk = []
+        for row in reader:
+            chunk.append(int(row[column]))
+            if len(chunk) >= chunk_size:
+                yield np.array(chunk, dtype=np.int64) if np is not None else chunk
+                chunk = []
+        if chunk:
+            yield np.array(chunk, dtype=np.int64) if np is not None else chunk
+
+
+def benchmark(n=200_000, seed=7):
+    """
+    Compare calculate_fees vs FeeModel.calculate_many and check they agree.
+    """
+    import random
+
+    rng = random.Random(seed)
+    amounts = [rng.randint(-50_000, 5_000_000) for _ in range(n)]
+    conf = {"type": "IC_PLUS", "interchange_percent": "1.65", "scheme_percent": "0.13",
+            "markup_percent": "0.45", "markup_fixed": "12.5"}
+
+    start = time.perf_counter()
+    expected = [calculate_fees(a, conf) for a in amounts]
+    baseline_s = time.perf_counter() - start
+
+    model = FeeModel(conf)
+    start = time.perf_counter()
+    result = model.calculate_many(amounts)
+    bulk_s = time.perf_counter() - start
+
+    assert [e["fee"] for e in expected] == [int(f) for f in result["fee"]], "FeeModel diverged"
+    assert [e["net"] for e in expected] == [int(v) for v in result["net"]], "FeeModel diverged"
+
+    print(f"Transactions:   {n}")
+    print(f"calculate_fees: {n / baseline_s:,.0f} tx/s")
+    print(f"calculate_many: {n / bulk_s:,.0f} tx/s ({baseline_s / bulk_s:.1f}x)")
+
 # Test
 if __name__ == "__main__":
     # $100.00, Blended 2.9% + 30c
     conf = {"type": "BLENDED", "percent": "2.9", "fixed_cents": "30"}
     print(calculate_fees(10000, conf)) 
+    print(FeeModel(conf).calculate(10000))
+
+    # $100.00 IC++ with a per-BIN interchange table
+    table = InterchangeTable([
+        {"bin_start": "400000", "bin_end": "449999", "card_category": "CONSUMER_DEBIT",
+         "region": "US", "interchange_percent": "0.05", "interchange_fixed": "21", "scheme_percent": "0.13"},
+        {"bin_start": "400000", "bin_end": "449999", "card_category": "CONSUMER_CREDIT",
+         "region": "US", "interchange_percent": "1.65", "interchange_fixed": "10", "scheme_percent": "0.13"},
+    ])
+    ic_conf = {"type": "IC_PLUS", "interchange_table": table, "markup_percent": "0.5", "markup_fixed": "5"}
+    print(calculate_fees(10000, ic_conf, card_bin="424242", card_category="CONSUMER_DEBIT", region="US"))
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -1,32 +1,216 @@
+import sys
+import threading
 import time
+from collections import OrderedDict
 
 class MockRedis:
     def __init__(self):
         self.data = {}
-        
+        self.expiry = {}
+
+    def _purge(self, key):
+        exp = self.expiry.get(key)
+        if exp is not None and exp <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expiry[key]
+
     def incr(self, key):
+        self._purge(key)
         self.data[key] = self.data.get(key, 0) + 1
         return self.data[key]
-        
+
     def expire(self, key, seconds):
-        pass # Mock
+        if key in self.data:
+            self.expiry[key] = time.monotonic() + seconds
+
+
+class GCRALimiter:
+    """
+    In-process rate limiter using GCRA (Generic Cell Rate Algorithm).
+    Allows `limit` requests per `period` seconds (bursts up to `limit`).
+    Per key state is one float (theoretical arrival time); a key expires once
+    its TAT has passed. Memory is capped at `capacity` keys with LRU eviction,
+    spread over lock-striped shards for concurrent callers.
+    """
+
+    def __init__(self, limit, period, capacity=100_000, shards=16, clock=time.monotonic):
+        if shards & (shards - 1):
+            raise ValueError("shards must be a power of two")
+        self.limit = limit
+        self.period = period
+        self.interval = period / limit
+        self.tolerance = period - self.interval
+        self.clock = clock
+        self.shard_capacity = max(1, capacity // shards)
+        self.mask = shards - 1
+        self.shards = [OrderedDict() for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+
+    def allow(self, key, now=None):
+        """
+        Consume one request for key.
+        Returns (allowed, retry_after_seconds).
+        """
+        if now is None:
+            now = self.clock()
+        i = hash(key) & self.mask
+        shard = self.shards[i]
+
+        with self.locks[i]:
+            tat = shard.get(key, now)
+            if tat < now:
+                tat = now
+
+            if tat - now > self.tolerance:
+                shard.move_to_end(key)
+                return False, tat - now - self.tolerance
+
+            shard[key] = tat + self.interval
+            shard.move_to_end(key)
+
+            # Drop expired keys from the LRU end, then enforce the size cap
+            while shard:
+                oldest_key, oldest_tat = next(iter(shard.items()))
+                if oldest_tat > now and len(shard) <= self.shard_capacity:
+                    break
+                shard.popitem(last=False)
+
+        return True, 0.0
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+
+# GCRA in Lua so check-and-set is atomic on the server; the key TTL is its TAT
+GCRA_LUA = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+if tat - now > tolerance then
+    return {0, tostring(tat - now - tolerance)}
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+class RedisGCRALimiter:
+    """
+    Same GCRA semantics backed by a Redis-compatible server (Redis, KeyDB, Dragonfly).
+    `client` is a redis-py style client exposing register_script().
+    Keys carry a PX expiry, so idle keys are reclaimed by the server.
+    """
+
+    def __init__(self, client, limit, period, prefix="velocity:"):
+        self.interval = period / limit
+        self.tolerance = period - self.interval
+        self.prefix = prefix
+        self.script = client.register_script(GCRA_LUA)
+
+    def allow(self, key, now=None):
+        if now is None:
+            now = time.time()  # Wall clock: shared across processes
+        allowed, retry_after = self.script(
+            keys=[f"{self.prefix}{key}"],
+            args=[now, self.interval, self.tolerance],
+        )
+        return bool(int(allowed)), float(retry_after)
+
+
+class VelocityLimiter:
+    """
+    Velocity checks across several dimensions (ip, card_fingerprint, email).
+    `limiters` maps dimension -> GCRALimiter / RedisGCRALimiter.
+    """
+
+    def __init__(self, limiters):
+        self.limiters = limiters
+
+    def check(self, **attributes):
+        """
+        Check each supplied dimension, e.g. check(ip="1.2.3.4", email="a@b.c").
+        """
+        blocked_by = []
+        retry_after = 0.0
+        for dimension, value in attributes.items():
+            limiter = self.limiters.get(dimension)
+            if limiter is None or value is None:
+                continue
+            allowed, wait = limiter.allow(f"{dimension}:{value}")
+            if not allowed:
+                blocked_by.append(dimension)
+                retry_after = max(retry_after, wait)
+
+        return {"allowed": not blocked_by, "blocked_by": blocked_by, "retry_after": round(retry_after, 3)}
+
 
 def simulate_attack(count=20):
     redis = MockRedis()
     ip = "192.168.1.50"
-    
+
     blocked_at = None
-    
+
     for i in range(count):
         count = redis.incr(f"velocity:{ip}")
+        redis.expire(f"velocity:{ip}", 60)
         if count > 10:
             if not blocked_at:
                 blocked_at = i + 1
             print(f"Request {i+1}: BLOCKED")
         else:
             print(f"Request {i+1}: Allowed")
-            
+
     return blocked_at
 
+
+def benchmark(spray_keys=1_000_000, capacity=100_000, threads=8, checks_per_thread=200_000):
+    """
+    Key-spraying memory check plus multi-threaded throughput.
+    """
+    import tracemalloc
+
+    limiter = GCRALimiter(limit=10, period=60, capacity=capacity)
+
+    tracemalloc.start()
+    print(f"Spraying {spray_keys:,} unique keys (capacity {capacity:,})")
+    step = spray_keys // 5
+    for i in range(spray_keys):
+        limiter.allow(f"ip:{i}")
+        if (i + 1) % step == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"  {i + 1:>10,} keys seen: {len(limiter):>8,} tracked, {current / 2**20:7.1f} MiB")
+    tracemalloc.stop()
+
+    limiter = GCRALimiter(limit=1_000_000, period=1, capacity=capacity)
+    keys = [f"card:{i}" for i in range(1000)]
+
+    def worker():
+        for i in range(checks_per_thread):
+            limiter.allow(keys[i % 1000])
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"{threads} threads: {threads * checks_per_thread / elapsed:,.0f} checks/s")
+
+
 if __name__ == "__main__":
     simulate_attack()
+
+    velocity = VelocityLimiter({
+        "ip": GCRALimiter(limit=10, period=60),
+        "card_fingerprint": GCRALimiter(limit=3, period=60),
+        "email": GCRALimiter(limit=5, period=300),
+    })
+    for i in range(5):
+        print(velocity.check(ip="192.168.1.50", card_fingerprint="fp_abc", email="user@example.com"))
+
+    if "--bench" in sys.argv:
+        benchmark()
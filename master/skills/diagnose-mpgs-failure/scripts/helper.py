@@ -1,8 +1,207 @@
+import gzip
+import json
+import sys
+import time
+from collections import Counter
+
+# ISO 8583 field 39 response codes: code -> (status, message, action)
+ISO_8583_CODES = {
+    "00": ("SUCCESS", "Approved", "None"),
+    "01": ("FAILED_REFER", "Refer to Card Issuer", "Contact Issuer"),
+    "02": ("FAILED_REFER", "Refer to Card Issuer (Special Condition)", "Contact Issuer"),
+    "03": ("FAILED_MERCHANT", "Invalid Merchant", "Check acquirer merchant setup"),
+    "04": ("FAILED_LOST_STOLEN", "Pick Up Card", "Do not retry"),
+    "05": ("FAILED_GENERIC", "Do Not Honor (Generic Decline)", "Retry or contact bank"),
+    "06": ("FAILED_SYSTEM", "Error", "Retry later"),
+    "07": ("FAILED_FRAUD", "Pick Up Card (Special Condition, Fraud)", "Do not retry"),
+    "08": ("SUCCESS", "Honor with Identification", "None"),
+    "09": ("PENDING", "Request in Progress", "Query status later"),
+    "10": ("SUCCESS", "Partial Approval", "Collect remaining amount"),
+    "11": ("SUCCESS", "Approved (VIP)", "None"),
+    "12": ("FAILED_INVALID_REQUEST", "Invalid Transaction", "Check transaction type"),
+    "13": ("FAILED_INVALID_REQUEST", "Invalid Amount", "Check amount format"),
+    "14": ("FAILED_INVALID_CARD", "Invalid Card Number", "Validation check"),
+    "15": ("FAILED_INVALID_CARD", "No Such Issuer", "Validation check"),
+    "17": ("FAILED_DECLINE", "Customer Cancellation", "None"),
+    "19": ("FAILED_SYSTEM", "Re-enter Transaction", "Retry"),
+    "21": ("FAILED_DECLINE", "No Action Taken", "Retry or contact bank"),
+    "25": ("FAILED_INVALID_REQUEST", "Unable to Locate Record", "Check original transaction reference"),
+    "28": ("FAILED_SYSTEM", "File Temporarily Unavailable", "Retry later"),
+    "30": ("FAILED_INVALID_REQUEST", "Format Error", "Investigate Request Format"),
+    "33": ("FAILED_EXPIRED", "Expired Card (Pick Up)", "Update exp date"),
+    "34": ("FAILED_FRAUD", "Suspected Fraud (Pick Up)", "Do not retry"),
+    "35": ("FAILED_RESTRICTED", "Card Acceptor Contact Acquirer (Pick Up)", "Do not retry"),
+    "36": ("FAILED_RESTRICTED", "Restricted Card (Pick Up)", "Do not retry"),
+    "38": ("FAILED_PIN", "Allowable PIN Tries Exceeded (Pick Up)", "Do not retry"),
+    "39": ("FAILED_INVALID_CARD", "No Credit Account", "Use a different card"),
+    "40": ("FAILED_INVALID_REQUEST", "Requested Function Not Supported", "Check transaction type"),
+    "41": ("FAILED_LOST_STOLEN", "Lost Card", "Do not retry"),
+    "43": ("FAILED_LOST_STOLEN", "Stolen Card", "Do not retry"),
+    "44": ("FAILED_INVALID_CARD", "No Investment Account", "Use a different card"),
+    "46": ("FAILED_INVALID_CARD", "Closed Account", "Use a different card"),
+    "51": ("FAILED_FUNDS", "Insufficient Funds", "Retry with different card"),
+    "52": ("FAILED_INVALID_CARD", "No Checking Account", "Use a different card"),
+    "53": ("FAILED_INVALID_CARD", "No Savings Account", "Use a different card"),
+    "54": ("FAILED_EXPIRED", "Card Expired", "Update exp date"),
+    "55": ("FAILED_PIN", "Incorrect PIN", "Re-enter PIN"),
+    "56": ("FAILED_INVALID_CARD", "No Card Record", "Validation check"),
+    "57": ("FAILED_RESTRICTED", "Transaction Not Permitted to Cardholder", "Use a different card"),
+    "58": ("FAILED_MERCHANT", "Transaction Not Permitted to Terminal", "Check acquirer merchant setup"),
+    "59": ("FAILED_FRAUD", "Suspected Fraud", "Do not retry"),
+    "61": ("FAILED_LIMIT", "Exceeds Withdrawal Amount Limit", "Retry with lower amount"),
+    "62": ("FAILED_RESTRICTED", "Restricted Card", "Use a different card"),
+    "63": ("FAILED_FRAUD", "Security Violation", "Do not retry"),
+    "64": ("FAILED_INVALID_REQUEST", "Original Amount Incorrect", "Check amount"),
+    "65": ("FAILED_AUTH_REQUIRED", "Exceeds Withdrawal Frequency / SCA Required", "Retry with 3DS"),
+    "68": ("FAILED_SYSTEM", "Response Received Too Late", "Query status before retry"),
+    "70": ("FAILED_REFER", "Contact Card Issuer", "Contact Issuer"),
+    "71": ("FAILED_PIN", "PIN Not Changed", "Contact Issuer"),
+    "75": ("FAILED_PIN", "Allowable PIN Tries Exceeded", "Do not retry"),
+    "76": ("FAILED_INVALID_CARD", "Invalid / Nonexistent Account", "Use a different card"),
+    "77": ("FAILED_INVALID_REQUEST", "Inconsistent with Original", "Check original transaction reference"),
+    "78": ("FAILED_RESTRICTED", "Blocked, First Used / No Account", "Contact Issuer"),
+    "79": ("FAILED_DECLINE", "Lifecycle Decline", "Retry or contact bank"),
+    "80": ("FAILED_INVALID_REQUEST", "Invalid Date", "Check request"),
+    "82": ("FAILED_CVV", "Negative CAM, dCVV, iCVV or CVV", "Re-enter card details"),
+    "83": ("FAILED_FRAUD", "Fraud / Security Decline", "Do not retry"),
+    "85": ("SUCCESS", "No Reason to Decline", "None"),
+    "86": ("FAILED_PIN", "Cannot Verify PIN", "Retry"),
+    "88": ("FAILED_SYSTEM", "Cryptographic Failure", "Retry later"),
+    "89": ("FAILED_MERCHANT", "Invalid Terminal", "Check acquirer merchant setup"),
+    "91": ("FAILED_ISSUER_UNAVAILABLE", "Issuer or Switch Inoperative", "Retry later"),
+    "92": ("FAILED_ISSUER_UNAVAILABLE", "Unable to Route Transaction", "Retry later"),
+    "93": ("FAILED_RESTRICTED", "Transaction Violation of Law", "Do not retry"),
+    "94": ("FAILED_INVALID_REQUEST", "Duplicate Transmission", "Query status before retry"),
+    "96": ("FAILED_SYSTEM", "System Malfunction", "Retry later"),
+    "1A": ("FAILED_AUTH_REQUIRED", "Additional Customer Authentication Required", "Retry with 3DS"),
+    "N7": ("FAILED_CVV", "CVV2 Mismatch", "Re-enter CVV"),
+    "N3": ("FAILED_INVALID_REQUEST", "Cash Service Not Available", "None"),
+    "N4": ("FAILED_LIMIT", "Cashback Request Exceeds Issuer Limit", "Retry with lower amount"),
+    "Q1": ("FAILED_AUTH_REQUIRED", "Card Authentication Failed", "Retry with 3DS"),
+    "R0": ("FAILED_RESTRICTED", "Stop Payment Order", "Do not retry recurring"),
+    "R1": ("FAILED_RESTRICTED", "Revocation of Authorization Order", "Do not retry recurring"),
+    "R3": ("FAILED_RESTRICTED", "Revocation of All Authorizations Order", "Do not retry recurring"),
+}
+
+# MPGS response.gatewayCode values other than APPROVED / DECLINED
+MPGS_GATEWAY_CODES = {
+    "APPROVED_AUTO": ("SUCCESS", "Transaction Approved (Auto)", "None"),
+    "APPROVED_PENDING_SETTLEMENT": ("SUCCESS", "Approved, Pending Settlement", "None"),
+    "PARTIALLY_APPROVED": ("SUCCESS", "Partially Approved", "Collect remaining amount"),
+    "PENDING": ("PENDING", "Pending (Async Flow)", "Query status later"),
+    "SUBMITTED": ("PENDING", "Submitted to Acquirer", "Query status later"),
+    "DEFERRED_TRANSACTION_RECEIVED": ("PENDING", "Deferred Transaction Received", "Query status later"),
+    "REFERRED": ("FAILED_REFER", "Referred by Issuer", "Contact Issuer"),
+    "DECLINED_AVS": ("FAILED_AVS", "Declined (AVS Mismatch)", "Check billing address"),
+    "DECLINED_CSC": ("FAILED_CVV", "Declined (CSC Mismatch)", "Re-enter CVV"),
+    "DECLINED_AVS_CSC": ("FAILED_CVV", "Declined (AVS and CSC Mismatch)", "Re-enter card details"),
+    "DECLINED_DO_NOT_CONTACT": ("FAILED_RESTRICTED", "Declined, Do Not Contact Issuer", "Do not retry"),
+    "DECLINED_INVALID_PIN": ("FAILED_PIN", "Declined (Invalid PIN)", "Re-enter PIN"),
+    "DECLINED_PIN_REQUIRED": ("FAILED_PIN", "Declined (PIN Required)", "Retry with PIN"),
+    "DECLINED_PAYMENT_PLAN": ("FAILED_DECLINE", "Declined (Payment Plan)", "Retry without plan"),
+    "EXPIRED_CARD": ("FAILED_EXPIRED", "Card Expired", "Update exp date"),
+    "INSUFFICIENT_FUNDS": ("FAILED_FUNDS", "Insufficient Funds", "Retry with different card"),
+    "BLOCKED": ("FAILED_FRAUD", "Blocked by Risk Rules", "Manual Review"),
+    "AUTHENTICATION_FAILED": ("FAILED_AUTH_REQUIRED", "3DS Authentication Failed", "Retry 3DS"),
+    "AUTHENTICATION_IN_PROGRESS": ("PENDING", "3DS Authentication in Progress", "Wait for 3DS result"),
+    "NOT_ENROLLED_3D_SECURE": ("FAILED_AUTH_REQUIRED", "Card Not Enrolled in 3DS", "Check 3DS policy"),
+    "TIMED_OUT": ("FAILED_SYSTEM", "Timed Out", "Query status before retry"),
+    "ACQUIRER_SYSTEM_ERROR": ("FAILED_SYSTEM", "Acquirer System Error", "Retry later"),
+    "SYSTEM_ERROR": ("FAILED_SYSTEM", "Gateway System Error", "Retry later"),
+    "LOCK_FAILURE": ("FAILED_SYSTEM", "Order Locked by Concurrent Request", "Retry"),
+    "EXCEEDED_RETRY_LIMIT": ("FAILED_LIMIT", "Exceeded Retry Limit", "Do not retry"),
+    "DUPLICATE_BATCH": ("FAILED_INVALID_REQUEST", "Duplicate Batch", "Check batch reference"),
+    "NOT_SUPPORTED": ("FAILED_INVALID_REQUEST", "Not Supported", "Check acquirer configuration"),
+    "ABORTED": ("FAILED_DECLINE", "Aborted", "Retry"),
+    "CANCELLED": ("FAILED_DECLINE", "Cancelled", "None"),
+    "UNSPECIFIED_FAILURE": ("FAILED_SYSTEM", "Unspecified Failure", "Manual Review"),
+}
+
+# Cybersource legacy reasonCode and REST errorInformation.reason
+CYBERSOURCE_CODES = {
+    "100": ("SUCCESS", "Transaction Approved", "None"),
+    "110": ("SUCCESS", "Partial Approval", "Collect remaining amount"),
+    "101": ("FAILED_INVALID_REQUEST", "Missing Required Fields", "Investigate Request Format"),
+    "102": ("FAILED_INVALID_REQUEST", "Invalid Field Data", "Investigate Request Format"),
+    "104": ("FAILED_INVALID_REQUEST", "Duplicate Merchant Reference Code", "Query status before retry"),
+    "150": ("FAILED_SYSTEM", "General System Failure", "Query status before retry"),
+    "151": ("FAILED_SYSTEM", "Server Timeout", "Query status before retry"),
+    "152": ("FAILED_SYSTEM", "Service Timeout", "Query status before retry"),
+    "200": ("FAILED_AVS", "AVS Decline", "Check billing address"),
+    "201": ("FAILED_REFER", "Issuer Referral", "Contact Issuer"),
+    "202": ("FAILED_EXPIRED", "Card Expired", "Update exp date"),
+    "203": ("FAILED_GENERIC", "General Decline", "Retry or contact bank"),
+    "204": ("FAILED_FUNDS", "Insufficient Funds", "Retry with different card"),
+    "205": ("FAILED_LOST_STOLEN", "Lost or Stolen Card", "Do not retry"),
+    "207": ("FAILED_ISSUER_UNAVAILABLE", "Issuing Bank Unavailable", "Retry later"),
+    "208": ("FAILED_RESTRICTED", "Inactive Card or Not Authorized for CNP", "Use a different card"),
+    "210": ("FAILED_LIMIT", "Credit Limit Reached", "Retry with lower amount"),
+    "211": ("FAILED_CVV", "Invalid CVN", "Re-enter CVV"),
+    "221": ("FAILED_FRAUD", "Customer on Negative File", "Do not retry"),
+    "230": ("FAILED_CVV", "CVN Check Failed", "Re-enter CVV"),
+    "231": ("FAILED_INVALID_CARD", "Invalid Account Number", "Validation check"),
+    "232": ("FAILED_INVALID_CARD", "Card Type Not Accepted", "Use a different card"),
+    "233": ("FAILED_GENERIC", "General Decline by Processor", "Retry or contact bank"),
+    "234": ("FAILED_MERCHANT", "Merchant Configuration Error", "Check Cybersource merchant setup"),
+    "236": ("FAILED_SYSTEM", "Processor Failure", "Retry later"),
+    "240": ("FAILED_INVALID_CARD", "Invalid Card Type", "Validation check"),
+    "475": ("FAILED_AUTH_REQUIRED", "Payer Authentication Required", "Retry with 3DS"),
+    "476": ("FAILED_AUTH_REQUIRED", "Payer Authentication Failed", "Retry 3DS"),
+    "480": ("PENDING", "Decision Manager Review", "Manual Review"),
+    "481": ("FAILED_FRAUD", "Decision Manager Reject", "Do not retry"),
+    "MISSING_FIELD": ("FAILED_INVALID_REQUEST", "Missing Required Fields", "Investigate Request Format"),
+    "INVALID_DATA": ("FAILED_INVALID_REQUEST", "Invalid Field Data", "Investigate Request Format"),
+    "DUPLICATE_REQUEST": ("FAILED_INVALID_REQUEST", "Duplicate Request", "Query status before retry"),
+    "SYSTEM_ERROR": ("FAILED_SYSTEM", "General System Failure", "Query status before retry"),
+    "SERVER_TIMEOUT": ("FAILED_SYSTEM", "Server Timeout", "Query status before retry"),
+    "SERVICE_TIMEOUT": ("FAILED_SYSTEM", "Service Timeout", "Query status before retry"),
+    "AVS_FAILED": ("FAILED_AVS", "AVS Decline", "Check billing address"),
+    "CONTACT_PROCESSOR": ("FAILED_REFER", "Issuer Referral", "Contact Issuer"),
+    "EXPIRED_CARD": ("FAILED_EXPIRED", "Card Expired", "Update exp date"),
+    "PROCESSOR_DECLINED": ("FAILED_GENERIC", "General Decline", "Retry or contact bank"),
+    "INSUFFICIENT_FUND": ("FAILED_FUNDS", "Insufficient Funds", "Retry with different card"),
+    "STOLEN_LOST_CARD": ("FAILED_LOST_STOLEN", "Lost or Stolen Card", "Do not retry"),
+    "ISSUER_UNAVAILABLE": ("FAILED_ISSUER_UNAVAILABLE", "Issuing Bank Unavailable", "Retry later"),
+    "UNAUTHORIZED_CARD": ("FAILED_RESTRICTED", "Inactive Card or Not Authorized for CNP", "Use a different card"),
+    "CREDIT_LIMIT_REACHED": ("FAILED_LIMIT", "Credit Limit Reached", "Retry with lower amount"),
+    "INVALID_CVN": ("FAILED_CVV", "Invalid CVN", "Re-enter CVV"),
+    "CV_FAILED": ("FAILED_CVV", "CVN Check Failed", "Re-enter CVV"),
+    "BLACKLISTED_CUSTOMER": ("FAILED_FRAUD", "Customer on Negative File", "Do not retry"),
+    "INVALID_ACCOUNT": ("FAILED_INVALID_CARD", "Invalid Account Number", "Validation check"),
+    "CARD_TYPE_NOT_ACCEPTED": ("FAILED_INVALID_CARD", "Card Type Not Accepted", "Use a different card"),
+    "GENERAL_DECLINE": ("FAILED_GENERIC", "General Decline by Processor", "Retry or contact bank"),
+    "INVALID_MERCHANT_CONFIGURATION": ("FAILED_MERCHANT", "Merchant Configuration Error", "Check Cybersource merchant setup"),
+    "PROCESSOR_UNAVAILABLE": ("FAILED_SYSTEM", "Processor Failure", "Retry later"),
+    "CONSUMER_AUTHENTICATION_REQUIRED": ("FAILED_AUTH_REQUIRED", "Payer Authentication Required", "Retry with 3DS"),
+    "CONSUMER_AUTHENTICATION_FAILED": ("FAILED_AUTH_REQUIRED", "Payer Authentication Failed", "Retry 3DS"),
+    "DECISION_PROFILE_REVIEW": ("PENDING", "Decision Manager Review", "Manual Review"),
+    "DECISION_PROFILE_REJECT": ("FAILED_FRAUD", "Decision Manager Reject", "Do not retry"),
+}
+
+CYBERSOURCE_APPROVED = {"AUTHORIZED", "PARTIAL_AUTHORIZED", "PENDING", "TRANSMITTED", "COMPLETED"}
+
+
+def _result(entry):
+    status, message, action = entry
+    return {"status": status, "message": message, "action": action}
+
+
+def _declined(entry, code):
+    """
+    The gateway declined: the code explains why, it never turns the result into a success.
+    """
+    status, message, action = entry
+    if status == "SUCCESS":
+        return {"status": "FAILED_DECLINE", "message": f"Declined (Code {code}: {message})", "action": "Contact Issuer"}
+    return _result(entry)
+
+
 def diagnose_mpgs(response):
     """
     Diagnose MPGS response JSON.
     """
-    gateway_code = response.get('response', {}).get('gatewayCode')
+    result = response.get('response') or {}
+    gateway_code = result.get('gatewayCode')
     if not gateway_code and 'error' in response:
         return {
             "status": "SYSTEM_ERROR",
@@ -14,21 +213,125 @@ def diagnose_mpgs(response):
         return {"status": "SUCCESS", "message": "Transaction Approved", "action": "None"}
 
     if gateway_code == "DECLINED":
-        acq_code = response.get('response', {}).get('acquirerCode')
-        
+        acq_code = result.get('acquirerCode')
+
         # Map ISO codes
-        if acq_code == "51":
-            return {"status": "FAILED_FUNDS", "message": "Insufficient Funds", "action": "Retry with different card"}
-        elif acq_code == "05":
-            return {"status": "FAILED_GENERIC", "message": "Do Not Honor (Generic Decline)", "action": "Retry or contact bank"}
-        elif acq_code == "54":
-            return {"status": "FAILED_EXPIRED", "message": "Card Expired", "action": "Update exp date"}
-        else:
-            return {"status": "FAILED_DECLINE", "message": f"Declined by bank (Code {acq_code})", "action": "Contact Issuer"}
+        entry = ISO_8583_CODES.get(acq_code)
+        if entry is not None:
+            return _declined(entry, acq_code)
+        return {"status": "FAILED_DECLINE", "message": f"Declined by bank (Code {acq_code})", "action": "Contact Issuer"}
+
+    entry = MPGS_GATEWAY_CODES.get(gateway_code)
+    if entry is not None:
+        return _result(entry)
 
     return {"status": "UNKNOWN", "message": "Unknown State", "action": "Manual Review"}
 
+
+def diagnose_cybersource(response):
+    """
+    Diagnose Cybersource REST (status / errorInformation / processorInformation)
+    or legacy (decision / reasonCode) response JSON.
+    """
+    status = response.get('status')
+    if status in CYBERSOURCE_APPROVED:
+        return {"status": "SUCCESS" if status != "PENDING" else "PENDING",
+                "message": f"Transaction {status.title()}", "action": "None"}
+
+    declined = status in ("DECLINED", "INVALID_REQUEST", "SERVER_ERROR") or response.get('decision') in ("REJECT", "ERROR")
+
+    # Issuer's ISO code is the most specific signal when present (approval codes explain nothing here)
+    processor_code = (response.get('processorInformation') or {}).get('responseCode')
+    entry = ISO_8583_CODES.get(processor_code)
+    if entry is not None and entry[0] != "SUCCESS":
+        return _result(entry)
+
+    reason = (response.get('errorInformation') or {}).get('reason')
+    if reason is None and 'reasonCode' in response:
+        reason = str(response['reasonCode'])
+
+    entry = CYBERSOURCE_CODES.get(reason)
+    if entry is not None:
+        return _declined(entry, reason) if declined else _result(entry)
+
+    if status in ("INVALID_REQUEST", "SERVER_ERROR"):
+        return {"status": "SYSTEM_ERROR",
+                "message": response.get('message', status),
+                "action": "Investigate Request Format"}
+    if status == "DECLINED" or response.get('decision') == "REJECT":
+        return {"status": "FAILED_DECLINE", "message": f"Declined (Reason {reason})", "action": "Contact Issuer"}
+
+    return {"status": "UNKNOWN", "message": "Unknown State", "action": "Manual Review"}
+
+
+DIAGNOSERS = {
+    "MPGS": diagnose_mpgs,
+    "CYBERSOURCE": diagnose_cybersource,
+}
+
+
+def aggregate_declines(path, group_by=("psp", "bin", "merchant_id")):
+    """
+    Stream a JSONL file of {"psp", "bin", "merchant_id", "response"} records
+    (optionally .gz) and count diagnosis status per group.
+    Memory is bounded by the number of distinct groups, not the file size.
+    """
+    counts = Counter()
+    errors = 0
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, 'rt') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                diagnose = DIAGNOSERS[record['psp'].upper()]
+                status = diagnose(record.get('response') or {})['status']
+            except (ValueError, KeyError, AttributeError, TypeError):
+                errors += 1
+                continue
+
+            if status == "SUCCESS":
+                continue
+            key = tuple(record.get(field) for field in group_by)
+            counts[key + (status,)] += 1
+
+    rows = [dict(zip(group_by + ("status",), key), count=count) for key, count in counts.most_common()]
+    return {"rows": rows, "skipped_lines": errors}
+
+
+def benchmark(n=500_000, path="/tmp/declines.jsonl"):
+    """
+    Generate a synthetic day of declines and time aggregate_declines().
+    """
+    import random
+
+    rng = random.Random(7)
+    iso_codes = list(ISO_8583_CODES)
+    cs_reasons = [k for k in CYBERSOURCE_CODES if not k.isdigit()]
+    with open(path, 'w') as f:
+        for _ in range(n):
+            if rng.random() < 0.5:
+                response = {"response": {"gatewayCode": "DECLINED", "acquirerCode": rng.choice(iso_codes)}}
+                psp = "MPGS"
+            else:
+                response = {"status": "DECLINED", "errorInformation": {"reason": rng.choice(cs_reasons)}}
+                psp = "CYBERSOURCE"
+            f.write(json.dumps({"psp": psp, "bin": rng.choice(["411111", "555555", "378282"]),
+                                "merchant_id": f"M{rng.randint(1, 20)}", "response": response}) + "\n")
+
+    start = time.perf_counter()
+    result = aggregate_declines(path)
+    elapsed = time.perf_counter() - start
+    print(f"{n:,} records in {elapsed:.2f}s ({n / elapsed:,.0f} rec/s), {len(result['rows'])} groups")
+    print(result['rows'][:3])
+
 # Test
 if __name__ == "__main__":
     r = {"response": {"gatewayCode": "DECLINED", "acquirerCode": "51"}}
     print(diagnose_mpgs(r))
+    print(diagnose_cybersource({"status": "DECLINED", "errorInformation": {"reason": "EXPIRED_CARD"}}))
+
+    if "--bench" in sys.argv:
+        benchmark()
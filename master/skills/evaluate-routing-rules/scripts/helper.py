@@ -1,3 +1,13 @@
+import random
+import sys
+import time
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+
+try:
+    import numpy as np
+except ImportError:  # Batch evaluation only
+    np = None
+
 def evaluate_routing(transaction, rules):
     """
     Evaluate transaction against a list of routing rules.
@@ -39,6 +49,287 @@ def evaluate_routing(transaction, rules):
     # For now, return matches.
     return eligible_psps
 
+class _BinTrieNode:
+    __slots__ = ("children", "rules")
+
+    def __init__(self):
+        self.children = {}
+        self.rules = []
+
+
+def _to_minor_units(value, minor_per_major=100, rounding=ROUND_FLOOR):
+    """
+    Convert a major-unit amount ("1500.00", 1000) to integer minor units.
+    """
+    scaled = Decimal(str(value)) * minor_per_major
+    return int(scaled.to_integral_value(rounding=rounding))
+
+
+class CompiledRuleSet:
+    """
+    Routing rules compiled once for repeated evaluation.
+    Returns the same failover chain as evaluate_routing().
+    """
+
+    def __init__(self, rules, minor_per_major=100):
+        self.minor_per_major = minor_per_major
+
+        # Priority order is fixed at compile time (stable, like sorted())
+        sorted_rules = sorted(rules, key=lambda x: x.get('priority', 999))
+        self.targets = [rule['target_psp'] for rule in sorted_rules]
+        self.min_amounts = []
+        self.has_bin = []
+
+        by_currency = {}
+        any_currency = []
+        self.bin_trie = _BinTrieNode()
+
+        for idx, rule in enumerate(sorted_rules):
+            conditions = rule.get('conditions', {})
+
+            # Currency index: rule idx lists per currency + wildcard list
+            if 'currency' in conditions:
+                for cur in set(conditions['currency']):
+                    by_currency.setdefault(cur, []).append(idx)
+            else:
+                any_currency.append(idx)
+
+            # Amount threshold in integer minor units, rounded up so that
+            # `amount >= threshold` matches the float compare for whole-cent amounts
+            if 'min_amount' in conditions:
+                self.min_amounts.append(
+                    _to_minor_units(conditions['min_amount'], minor_per_major, ROUND_CEILING)
+                )
+            else:
+                self.min_amounts.append(None)
+
+            # BIN prefix trie: each prefix terminates at a node listing its rules
+            if 'bin_prefix' in conditions:
+                self.has_bin.append(True)
+                for prefix in set(conditions['bin_prefix']):
+                    node = self.bin_trie
+                    for ch in prefix:
+                        node = node.children.setdefault(ch, _BinTrieNode())
+                    node.rules.append(idx)
+            else:
+                self.has_bin.append(False)
+
+        # Pre-merge wildcard rules into each currency's candidate list
+        self.any_currency = any_currency
+        self.candidates = {
+            cur: sorted(idxs + any_currency) for cur, idxs in by_currency.items()
+        }
+        self.uses_amount = any(m is not None for m in self.min_amounts)
+
+    def _match_bins(self, card_bin):
+        """
+        Collect rule indexes whose BIN prefix matches card_bin.
+        """
+        node = self.bin_trie
+        matched = set(node.rules)
+        for ch in card_bin:
+            node = node.children.get(ch)
+            if node is None:
+                break
+            matched.update(node.rules)
+        return matched
+
+    def evaluate(self, transaction):
+        """
+        Evaluate transaction. Returns list of PSP Config IDs in order of preference.
+        """
+        candidates = self.candidates.get(transaction.get('currency'), self.any_currency)
+        if not candidates:
+            return []
+
+        amount = None
+        if self.uses_amount:
+            amount = _to_minor_units(transaction['amount'], self.minor_per_major)
+
+        bins = None
+        eligible_psps = []
+        for idx in candidates:
+            min_amount = self.min_amounts[idx]
+            if min_amount is not None and amount < min_amount:
+                continue
+            if self.has_bin[idx]:
+                if bins is None:
+                    bins = self._match_bins(transaction['card_bin'])
+                if idx not in bins:
+                    continue
+            eligible_psps.append(self.targets[idx])
+
+        return eligible_psps
+
+
+def evaluate_routing_batch(transactions, rules, bin_digits=6, chunk_size=65536, max_matrix_bytes=16 * 2**20):
+    """
+    Evaluate columnar transactions against routing rules (same conditions as evaluate_routing).
+    Input: {"amount": float array (major units), "currency": str array, "card_bin": int array}
+    Returns CSR-style chains: chain[offsets[i]:offsets[i+1]] are indexes into psps for tx i.
+    The (rules x chunk) match matrix is kept under max_matrix_bytes by shrinking the chunk.
+    """
+    if np is None:
+        raise ImportError("evaluate_routing_batch requires numpy")
+
+    amounts = np.asarray(transactions['amount'], dtype=np.float64)
+    currencies = np.asarray(transactions['currency'])
+    bins = np.asarray(transactions['card_bin'], dtype=np.int64)
+    n = len(amounts)
+
+    sorted_rules = sorted(rules, key=lambda x: x.get('priority', 999))
+    if not sorted_rules:
+        return {
+            "psps": np.array([], dtype=object),
+            "offsets": np.zeros(n + 1, dtype=np.int64),
+            "chain": np.zeros(0, dtype=np.int32),
+            "primary": np.full(n, -1, dtype=np.int32),
+        }
+    chunk_size = max(1, min(chunk_size, max_matrix_bytes // len(sorted_rules)))
+    psps = list(dict.fromkeys(rule['target_psp'] for rule in sorted_rules))
+    psp_index = {psp: i for i, psp in enumerate(psps)}
+    targets = np.array([psp_index[rule['target_psp']] for rule in sorted_rules], dtype=np.int32)
+
+    # BIN prefixes become (digits, integer value): bin // 10**(bin_digits - digits) == value
+    compiled = []
+    for rule in sorted_rules:
+        conditions = rule.get('conditions', {})
+        bin_prefixes = None
+        if 'bin_prefix' in conditions:
+            bin_prefixes = {}
+            for p in conditions['bin_prefix']:
+                if len(p) <= bin_digits:
+                    bin_prefixes.setdefault(len(p), []).append(int(p) if p else 0)
+        compiled.append((
+            set(conditions['currency']) if 'currency' in conditions else None,
+            float(conditions['min_amount']) if 'min_amount' in conditions else None,
+            bin_prefixes,
+        ))
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    chain_parts = []
+    primary = np.full(n, -1, dtype=np.int32)
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        amt = amounts[start:stop]
+        cur_codes, cur_inverse = np.unique(currencies[start:stop], return_inverse=True)
+        bin_heads = {}
+
+        matches = np.ones((len(sorted_rules), stop - start), dtype=bool)
+        for idx, (rule_currencies, min_amount, bin_prefixes) in enumerate(compiled):
+            mask = matches[idx]
+
+            # Check Currency (lookup table over the chunk's distinct codes)
+            if rule_currencies is not None:
+                allowed = np.fromiter((c in rule_currencies for c in cur_codes.tolist()), dtype=bool, count=len(cur_codes))
+                mask &= allowed[cur_inverse]
+
+            # Check Min Amount
+            if min_amount is not None:
+                mask &= amt >= min_amount
+
+            # Check BIN (prefix == leading digits of the integer BIN)
+            if bin_prefixes is not None:
+                bin_mask = np.zeros(stop - start, dtype=bool)
+                for digits, values in bin_prefixes.items():
+                    if digits not in bin_heads:
+                        bin_heads[digits] = bins[start:stop] // 10 ** (bin_digits - digits)
+                    bin_mask |= np.isin(bin_heads[digits], values)
+                mask &= bin_mask
+
+        # Row-major nonzero over (tx, rule) keeps priority order within each tx
+        tx_idx, rule_idx = np.nonzero(matches.T)
+        chain_parts.append(targets[rule_idx])
+        offsets[start + 1:stop + 1] = np.bincount(tx_idx, minlength=stop - start)
+
+        has_match = matches.any(axis=0)
+        primary[start:stop] = np.where(has_match, targets[matches.argmax(axis=0)], -1)
+
+    np.cumsum(offsets, out=offsets)
+    chain = np.concatenate(chain_parts) if chain_parts else np.zeros(0, dtype=np.int32)
+
+    return {
+        "psps": np.array(psps, dtype=object),
+        "offsets": offsets,
+        "chain": chain,
+        "primary": primary,
+    }
+
+
+def print_traffic_report(result):
+    """
+    Print traffic share per PSP for a batch result.
+    """
+    psps = result['psps']
+    primary = result['primary']
+    total = len(primary)
+    if total == 0:
+        print("No transactions.")
+        return
+
+    if len(psps) == 0:
+        print(f"{'(no route)':<24} {total:>12} {1:>8.2%}")
+        return
+
+    primary_counts = np.bincount(primary[primary >= 0], minlength=len(psps))
+
+    # Count each PSP at most once per tx for chain coverage
+    tx_of_entry = np.repeat(np.arange(total), np.diff(result['offsets']))
+    unique_pairs = np.unique(tx_of_entry.astype(np.int64) * len(psps) + result['chain'])
+    chain_counts = np.bincount(unique_pairs % len(psps), minlength=len(psps))
+
+    print(f"{'PSP':<24} {'Primary':>12} {'Share':>8} {'In Chain':>9}")
+    for i in np.argsort(-primary_counts, kind='stable'):
+        print(f"{psps[i]:<24} {primary_counts[i]:>12} {primary_counts[i] / total:>8.2%} {chain_counts[i] / total:>9.2%}")
+    unrouted = int((primary < 0).sum())
+    print(f"{'(no route)':<24} {unrouted:>12} {unrouted / total:>8.2%}")
+
+
+def benchmark(n_rules=10_000, n_tx=200, seed=7):
+    """
+    Compare evaluate_routing vs CompiledRuleSet on synthetic rules.
+    """
+    rng = random.Random(seed)
+    currencies = ["USD", "EUR", "GBP", "JPY", "AED", "SAR", "CAD", "AUD"]
+
+    rules = []
+    for i in range(n_rules):
+        conditions = {}
+        if rng.random() < 0.8:
+            conditions['currency'] = rng.sample(currencies, rng.randint(1, 2))
+        if rng.random() < 0.5:
+            conditions['min_amount'] = rng.choice([10, 50, 100.5, 500, 1000, 2500.25])
+        if rng.random() < 0.6:
+            conditions['bin_prefix'] = [str(rng.randint(3, 6)) + str(rng.randint(0, 99999)).zfill(5)[:rng.randint(0, 4)]
+                                        for _ in range(rng.randint(1, 3))]
+        rules.append({"priority": rng.randint(1, 500), "target_psp": f"psp-{i}", "conditions": conditions})
+
+    txs = [{
+        "amount": f"{rng.randint(1, 500000) / 100:.2f}",
+        "currency": rng.choice(currencies),
+        "card_bin": str(rng.randint(300000, 699999)),
+    } for _ in range(n_tx)]
+
+    start = time.perf_counter()
+    compiled = CompiledRuleSet(rules)
+    compile_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [evaluate_routing(tx, rules) for tx in txs]
+    baseline_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [compiled.evaluate(tx) for tx in txs]
+    compiled_s = time.perf_counter() - start
+
+    assert actual == expected, "CompiledRuleSet diverged from evaluate_routing"
+
+    print(f"Rules: {n_rules}, Transactions: {n_tx}")
+    print(f"Compile:          {compile_s * 1000:.1f} ms (once)")
+    print(f"evaluate_routing: {baseline_s / n_tx * 1e6:.1f} us/tx")
+    print(f"CompiledRuleSet:  {compiled_s / n_tx * 1e6:.1f} us/tx ({baseline_s / compiled_s:.1f}x)")
+
 # Test
 if __name__ == "__main__":
     tx = {"amount": "1500.00", "currency": "USD", "card_bin": "411111"}
@@ -48,3 +339,15 @@ if __name__ == "__main__":
         {"priority": 10, "target_psp": "fallback-mpgs", "conditions": {}}
     ]
     print(evaluate_routing(tx, r))
+    print(CompiledRuleSet(r).evaluate(tx))
+
+    if np is not None:
+        batch = evaluate_routing_batch({
+            "amount": np.array([1500.00, 20.00, 50.00]),
+            "currency": np.array(["USD", "USD", "EUR"]),
+            "card_bin": np.array([411111, 555555, 400000]),
+        }, r)
+        print_traffic_report(batch)
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -1,6 +1,11 @@
 import hmac
 import hashlib
+import json
+import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 def verify_webhook(secret, signature_header, timestamp, raw_body):
     """
@@ -25,6 +30,184 @@ def verify_webhook(secret, signature_header, timestamp, raw_body):
     
     return {"valid": False, "reason": "Signature Mismatch"}
 
+class SeenEventCache:
+    """
+    Bounded, time-ordered set of processed event IDs.
+    Insertion order is arrival order, so expiry and the size cap both pop
+    from the front; check-and-add is O(1).
+    """
+
+    def __init__(self, ttl_seconds=86_400, capacity=1_000_000, clock=time.time):
+        self.ttl = ttl_seconds
+        self.capacity = capacity
+        self.clock = clock
+        self.seen = OrderedDict()
+        self.next_purge = 0
+        self.lock = threading.Lock()
+
+    def add_if_new(self, event_id):
+        """
+        Returns True if event_id was not seen within the TTL (and records it).
+        """
+        now = self.clock()
+        with self.lock:
+            seen_at = self.seen.get(event_id)
+            if seen_at is not None and now - seen_at <= self.ttl:
+                return False
+
+            # Purge expired IDs from the front at most once a second, or when full
+            if now >= self.next_purge or len(self.seen) >= self.capacity:
+                self._purge(now)
+                self.next_purge = now + 1
+
+            self.seen[event_id] = now
+            self.seen.move_to_end(event_id)
+            return True
+
+    def discard(self, event_id):
+        """
+        Forget event_id, e.g. when processing it failed and the PSP will redeliver.
+        """
+        with self.lock:
+            self.seen.pop(event_id, None)
+
+    def _purge(self, now):
+        seen = self.seen
+        while seen:
+            oldest_id = next(iter(seen))
+            if now - seen[oldest_id] <= self.ttl and len(seen) < self.capacity:
+                break
+            del seen[oldest_id]
+
+    def __len__(self):
+        return len(self.seen)
+
+
+class WebhookPipeline:
+    """
+    Batch webhook verification: per-endpoint precomputed HMAC keys, a worker
+    pool, timestamp window, and event-ID dedup for PSP retry bursts.
+    With a handler, an event ID only stays recorded once its handler succeeded.
+    """
+
+    def __init__(self, endpoint_secrets, tolerance=300, workers=8, seen_cache=None):
+        self.tolerance = tolerance
+        self.hmacs = {
+            endpoint: hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+            for endpoint, secret in endpoint_secrets.items()
+        }
+        self.seen = seen_cache or SeenEventCache()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook")
+
+    def verify(self, event, now=None):
+        """
+        Verify one event: {"endpoint", "signature", "timestamp", "body", optional "event_id"}.
+        """
+        return self._verify(event, now)[0]
+
+    def _verify(self, event, now):
+        """
+        Returns (result, dedup key or None). Never raises on bad input, so one
+        malformed event cannot take down a batch.
+        """
+        if not isinstance(event, dict) or not isinstance(event.get('body'), str):
+            return {"valid": False, "reason": "Malformed Event"}, None
+        template = self.hmacs.get(event.get('endpoint'))
+        if template is None:
+            return {"valid": False, "reason": "Unknown Endpoint"}, None
+
+        # 1. Replay Check (timestamp window)
+        now = int(time.time()) if now is None else now
+        timestamp = event.get('timestamp')
+        try:
+            if abs(now - int(timestamp)) > self.tolerance:
+                return {"valid": False, "reason": "Timestamp expired (Replay Risk)"}, None
+        except (TypeError, ValueError):
+            return {"valid": False, "reason": "Malformed Timestamp"}, None
+
+        # 2. Compute Signature from the endpoint's keyed template
+        mac = template.copy()
+        mac.update(f"{timestamp}.{event['body']}".encode('utf-8'))
+
+        # 3. Constant Time Compare (compare_digest raises on non-ASCII str)
+        signature = event.get('signature')
+        if not isinstance(signature, str) or not signature.isascii():
+            return {"valid": False, "reason": "Malformed Signature"}, None
+        if not hmac.compare_digest(mac.hexdigest(), signature):
+            return {"valid": False, "reason": "Signature Mismatch"}, None
+
+        # 4. Dedup only after the signature holds, so forged IDs cannot poison the cache
+        try:
+            event_id = event.get('event_id') or json.loads(event['body']).get('id')
+        except (AttributeError, TypeError, ValueError):  # not JSON, or not a JSON object
+            return {"valid": False, "reason": "Malformed Body"}, None
+        if event_id is None:
+            return {"valid": True}, None
+        key = f"{event['endpoint']}:{event_id}"
+        if not self.seen.add_if_new(key):
+            return {"valid": False, "reason": "Duplicate Event"}, None
+
+        return {"valid": True}, key
+
+    def handle(self, event, handler, now=None):
+        """
+        Verify, then run handler(event). A failing handler releases the event ID so
+        the PSP's redelivery is processed instead of being dropped as a duplicate.
+        """
+        result, key = self._verify(event, now)
+        if not result["valid"]:
+            return result
+        try:
+            handler(event)
+        except Exception as e:
+            if key is not None:
+                self.seen.discard(key)
+            return {"valid": True, "handled": False, "error": f"{type(e).__name__}: {e}"}
+        return {"valid": True, "handled": True}
+
+    def verify_batch(self, events, chunk_size=256, handler=None):
+        """
+        Verify (and with a handler, handle) events on the worker pool. Results are in input order.
+        """
+        now = int(time.time())
+        chunks = [events[i:i + chunk_size] for i in range(0, len(events), chunk_size)]
+        if handler is None:
+            run = lambda chunk: [self.verify(e, now) for e in chunk]
+        else:
+            run = lambda chunk: [self.handle(e, handler, now) for e in chunk]
+        results = []
+        for chunk_results in self.pool.map(run, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def benchmark(n=200_000, duplicates=0.5):
+    """
+    Verify a retry burst (half duplicates) with verify_webhook vs WebhookPipeline.
+    """
+    sec = "whsec_123"
+    ts = str(int(time.time()))
+    events = []
+    for i in range(n):
+        body = json.dumps({"id": f"evt_{int(i * (1 - duplicates))}", "type": "payment.captured"})
+        sig = hmac.new(sec.encode(), f"{ts}.{body}".encode(), hashlib.sha256).hexdigest()
+        events.append({"endpoint": "stripe", "signature": sig, "timestamp": ts, "body": body})
+
+    start = time.perf_counter()
+    accepted = sum(verify_webhook(sec, e['signature'], e['timestamp'], e['body'])['valid'] for e in events)
+    elapsed = time.perf_counter() - start
+    print(f"verify_webhook:  {n / elapsed:,.0f} events/s, accepted {accepted:,}")
+
+    pipeline = WebhookPipeline({"stripe": sec})
+    start = time.perf_counter()
+    accepted = sum(r['valid'] for r in pipeline.verify_batch(events))
+    elapsed = time.perf_counter() - start
+    pipeline.close()
+    print(f"WebhookPipeline: {n / elapsed:,.0f} events/s, accepted {accepted:,} (duplicates dropped)")
+
 # Test
 if __name__ == "__main__":
     sec = "secret123"
@@ -35,3 +218,10 @@ if __name__ == "__main__":
     
     print(verify_webhook(sec, valid_sig, ts, body))
     print(verify_webhook(sec, "bad_sig", ts, body))
+
+    pipeline = WebhookPipeline({"stripe": sec})
+    event = {"endpoint": "stripe", "signature": valid_sig, "timestamp": ts, "body": body}
+    print(pipeline.verify_batch([event, event]))
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -1,4 +1,13 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 
 def execute_mpgs_transaction(gateway_url, merchant_id, api_password, order_id, txn_id, payload):
@@ -16,5 +25,248 @@ def execute_mpgs_transaction(gateway_url, merchant_id, api_password, order_id, t
     
     return response.json()
 
+
+class CallMetrics:
+    """
+    Per-operation call latencies (bounded window) and outcome counts.
+    """
+
+    def __init__(self, window=10_000):
+        self.latencies = defaultdict(lambda: deque(maxlen=window))
+        self.counts = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def record(self, operation, seconds, outcome):
+        with self.lock:
+            self.latencies[operation].append(seconds)
+            self.counts[operation][outcome] += 1
+
+    def summary(self):
+        with self.lock:
+            snapshot = {op: sorted(values) for op, values in self.latencies.items()}
+            counts = {op: dict(c) for op, c in self.counts.items()}
+
+        report = {}
+        for op, values in snapshot.items():
+            if not values:
+                continue
+            report[op] = {
+                "count": sum(counts[op].values()),
+                "outcomes": counts[op],
+                "p50_ms": round(values[len(values) // 2] * 1000, 2),
+                "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))] * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return report
+
+
+class MPGSClient:
+    """
+    Pooled MPGS client: keep-alive Session, bounded per-host pool, connect/read timeouts.
+    """
+
+    def __init__(self, gateway_url, merchant_id, api_password, pool_size=20,
+                 connect_timeout=3.05, read_timeout=30, metrics=None):
+        self.base = f"{gateway_url}/merchant/{merchant_id}"
+        self.timeout = (connect_timeout, read_timeout)
+        self.metrics = metrics or CallMetrics()
+
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(f"merchant.{merchant_id}", api_password)
+        # pool_block: callers wait for a free connection instead of opening extras
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def execute(self, order_id, txn_id, payload):
+        """
+        Execute MPGS Transaction over the pooled session.
+        """
+        url = f"{self.base}/order/{order_id}/transaction/{txn_id}"
+        operation = payload.get("apiOperation", "UNKNOWN")
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self.session.put(url, json=payload, timeout=self.timeout)
+            outcome = str(response.status_code)
+            return response.json()
+        except requests.Timeout:
+            outcome = "timeout"
+            raise
+        finally:
+            self.metrics.record(operation, time.perf_counter() - start, outcome)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncMPGSClient:
+    """
+    asyncio MPGS client on httpx: pooled connections, HTTP/2 when `h2` is installed.
+    """
+
+    def __init__(self, gateway_url, merchant_id, api_password, max_connections=20,
+                 connect_timeout=3.05, read_timeout=30, metrics=None):
+        import httpx
+
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+
+        self.base = f"{gateway_url}/merchant/{merchant_id}"
+        self.metrics = metrics or CallMetrics()
+        self.timeout_errors = (httpx.TimeoutException,)
+        self.client = httpx.AsyncClient(
+            auth=(f"merchant.{merchant_id}", api_password),
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+
+    async def execute(self, order_id, txn_id, payload):
+        url = f"{self.base}/order/{order_id}/transaction/{txn_id}"
+        operation = payload.get("apiOperation", "UNKNOWN")
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.client.put(url, json=payload)
+            outcome = str(response.status_code)
+            return response.json()
+        except self.timeout_errors:
+            outcome = "timeout"
+            raise
+        finally:
+            self.metrics.record(operation, time.perf_counter() - start, outcome)
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # avoid 40ms delayed-ACK stalls on reused connections
+    delay = 0.0
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = json.loads(body or b"{}")
+        if self.delay:
+            time.sleep(self.delay)
+        out = json.dumps({
+            "result": "SUCCESS",
+            "response": {"gatewayCode": "APPROVED"},
+            "transaction": {"type": payload.get("apiOperation")},
+        }).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+def run_stub_server(port=0, delay=0.0):
+    """
+    Start a local MPGS stub on 127.0.0.1. Returns (server, base_url); call server.shutdown().
+    """
+    server = _make_stub_server(port, delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/rest/version/72"
+
+
+def _make_stub_server(port, delay):
+    handler = type("StubHandler", (_StubHandler,), {"delay": delay})
+    server_cls = type("StubServer", (ThreadingHTTPServer,), {"request_queue_size": 512, "daemon_threads": True})
+    return server_cls(("127.0.0.1", port), handler)
+
+
+def _serve_stub_process(port_queue, delay):
+    server = _make_stub_server(0, delay)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+
+def benchmark(n=2000, concurrency=16, delay=0.005):
+    """
+    p50/p99 and throughput: execute_mpgs_transaction vs MPGSClient vs AsyncMPGSClient (local stub).
+    """
+    import multiprocessing
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Stub runs in its own process so it does not share the client's GIL
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve_stub_process, args=(port_queue, delay), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get()}/api/rest/version/72"
+    payload = {"apiOperation": "AUTHORIZE", "order": {"amount": "10.00", "currency": "USD"}}
+
+    def timed(fn, i):
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    def run_threads(fn):
+        with ThreadPoolExecutor(concurrency) as pool:
+            start = time.perf_counter()
+            samples = list(pool.map(lambda i: timed(fn, i), range(n)))
+            return samples, time.perf_counter() - start
+
+    results = {}
+    results["execute_mpgs_transaction"] = run_threads(
+        lambda i: execute_mpgs_transaction(url, "TEST01", "pw", f"o{i}", "1", payload))
+
+    with MPGSClient(url, "TEST01", "pw", pool_size=concurrency) as client:
+        results["MPGSClient"] = run_threads(lambda i: client.execute(f"o{i}", "1", payload))
+
+    async def run_async():
+        async with AsyncMPGSClient(url, "TEST01", "pw", max_connections=concurrency) as client:
+            sem = asyncio.Semaphore(concurrency)
+
+            async def one(i):
+                async with sem:
+                    start = time.perf_counter()
+                    await client.execute(f"o{i}", "1", payload)
+                    return time.perf_counter() - start
+
+            start = time.perf_counter()
+            samples = await asyncio.gather(*(one(i) for i in range(n)))
+            return samples, time.perf_counter() - start
+
+    try:
+        results["AsyncMPGSClient"] = asyncio.run(run_async())
+    except ImportError:
+        print("httpx not installed; skipping AsyncMPGSClient")
+    server.terminate()
+
+    print(f"{n} calls, concurrency {concurrency}, stub delay {delay * 1000:.0f} ms")
+    for name, (samples, elapsed) in results.items():
+        p50, p99 = _percentiles(samples)
+        print(f"{name:<26} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  {n / elapsed:8,.0f} req/s")
+
+
 if __name__ == "__main__":
     print("MPGS Helper Ready")
+
+    if "--bench" in sys.argv:
+        benchmark()
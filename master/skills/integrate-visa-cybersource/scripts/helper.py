@@ -1,7 +1,10 @@
 import hmac
 import hashlib
 import base64
-from datetime import datetime
+import sys
+import threading
+import time
+from datetime import datetime, timezone
 
 def generate_cybersource_signature(merchant_id, key_id, secret_key, host, resource, payload):
     """
@@ -28,5 +31,122 @@ def generate_cybersource_signature(merchant_id, key_id, secret_key, host, resour
         "Signature": auth_header
     }
 
+
+SIGNED_HEADERS = "host date (request-target) digest v-c-merchant-id"
+
+
+def body_digest(payload, chunk_size=65536):
+    """
+    SHA-256 body digest (base64), fed incrementally.
+    payload: str, bytes, or an iterable of str/bytes chunks (e.g. a file opened 'rb').
+    """
+    h = hashlib.sha256()
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        view = memoryview(payload)
+        for i in range(0, len(view), chunk_size):
+            h.update(view[i:i + chunk_size])
+    else:
+        for chunk in payload:
+            h.update(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    return base64.b64encode(h.digest()).decode('utf-8')
+
+
+class CybersourceSigner:
+    """
+    Reusable HTTP Signature signer for one merchant.
+    Shared secrets are base64-decoded once into keyed HMAC templates; several
+    key IDs can be active for rotation. The Date header is cached per second.
+    """
+
+    def __init__(self, merchant_id, host, keys, active_key_id=None):
+        self.merchant_id = merchant_id
+        self.host = host
+        self.hmacs = {}
+        self.lock = threading.Lock()
+        for key_id, secret_key in keys.items():
+            self.add_key(key_id, secret_key)
+        self.active_key_id = active_key_id or next(iter(keys))
+        self._date_cache = (None, None)
+
+    def add_key(self, key_id, secret_key):
+        template = hmac.new(base64.b64decode(secret_key), digestmod=hashlib.sha256)
+        with self.lock:
+            self.hmacs = {**self.hmacs, key_id: template}
+
+    def remove_key(self, key_id):
+        if key_id == self.active_key_id:
+            raise ValueError("Cannot remove the active key; activate another key first")
+        with self.lock:
+            self.hmacs = {k: v for k, v in self.hmacs.items() if k != key_id}
+
+    def activate(self, key_id):
+        if key_id not in self.hmacs:
+            raise KeyError(f"Unknown key_id {key_id}")
+        self.active_key_id = key_id
+
+    def http_date(self, now=None):
+        second = int(time.time() if now is None else now)
+        cached_second, cached = self._date_cache
+        if second != cached_second:
+            cached = datetime.fromtimestamp(second, timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')
+            self._date_cache = (second, cached)
+        return cached
+
+    def sign(self, resource, payload, key_id=None, now=None):
+        """
+        Same headers as generate_cybersource_signature().
+        """
+        key_id = key_id or self.active_key_id
+        date = self.http_date(now)
+        digest = body_digest(payload)
+
+        sig_string = (f"host: {self.host}\ndate: {date}\n(request-target): post {resource}\n"
+                      f"digest: SHA-256={digest}\nv-c-merchant-id: {self.merchant_id}")
+
+        mac = self.hmacs[key_id].copy()
+        mac.update(sig_string.encode('utf-8'))
+        signature = base64.b64encode(mac.digest()).decode('utf-8')
+
+        return {
+            "Date": date,
+            "Digest": f"SHA-256={digest}",
+            "v-c-merchant-id": self.merchant_id,
+            "Signature": f'keyid="{key_id}", algorithm="HmacSHA256", headers="{SIGNED_HEADERS}", signature="{signature}"'
+        }
+
+
+def benchmark(n=100_000):
+    """
+    Signatures per second: generate_cybersource_signature vs CybersourceSigner.
+    """
+    secret = base64.b64encode(b"0123456789abcdef0123456789abcdef").decode()
+    payload = '{"clientReferenceInformation":{"code":"TC50171_3"},"orderInformation":{"amountDetails":{"totalAmount":"102.21","currency":"USD"}}}'
+    signer = CybersourceSigner("mid", "apitest.cybersource.com", {"kid": secret})
+
+    start = time.perf_counter()
+    for _ in range(n):
+        generate_cybersource_signature("mid", "kid", secret, "apitest.cybersource.com", "/pts/v2/payments", payload)
+    before = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        signer.sign("/pts/v2/payments", payload)
+    after = n / (time.perf_counter() - start)
+
+    expected = generate_cybersource_signature("mid", "kid", secret, "apitest.cybersource.com", "/pts/v2/payments", payload)
+    assert signer.sign("/pts/v2/payments", payload)["Digest"] == expected["Digest"]
+
+    print(f"generate_cybersource_signature: {before:,.0f} sig/s")
+    print(f"CybersourceSigner:              {after:,.0f} sig/s ({after / before:.1f}x)")
+
+
 if __name__ == "__main__":
     print(generate_cybersource_signature("mid", "kid", "c2VjcmV0", "apitest.cybersource.com", "/pts/v2/payments", "{}"))
+
+    signer = CybersourceSigner("mid", "apitest.cybersource.com", {"kid": "c2VjcmV0"})
+    print(signer.sign("/pts/v2/payments", "{}"))
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -1,4 +1,8 @@
+import heapq
 import secrets
+import sqlite3
+import sys
+import threading
 import time
 
 # Mock Redis
@@ -35,8 +39,210 @@ def validate_session(token):
         
     return {"valid": True, "data": data}
 
+class PaymentSession:
+    __slots__ = ("token", "order_id", "amount", "exp")
+
+    def __init__(self, token, order_id, amount, exp):
+        self.token = token
+        self.order_id = order_id
+        self.amount = amount
+        self.exp = exp
+
+    def to_dict(self):
+        return {"order_id": self.order_id, "amount": self.amount, "exp": self.exp}
+
+
+class SessionBackend:
+    """
+    Persistence interface for SessionStore. The default keeps nothing.
+    """
+
+    def save(self, session):
+        pass
+
+    def delete(self, tokens):
+        pass
+
+    def load(self, now):
+        return []
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Persist sessions to SQLite so a restart keeps live payment links.
+    """
+
+    def __init__(self, path="sessions.db"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, order_id TEXT, amount TEXT, exp REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_exp ON sessions (exp)")
+
+    def save(self, session):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)",
+                (session.token, session.order_id, session.amount, session.exp),
+            )
+
+    def delete(self, tokens):
+        with self.conn:
+            self.conn.executemany("DELETE FROM sessions WHERE token = ?", [(t,) for t in tokens])
+
+    def load(self, now):
+        with self.conn:
+            self.conn.execute("DELETE FROM sessions WHERE exp <= ?", (now,))
+        rows = self.conn.execute("SELECT token, order_id, amount, exp FROM sessions")
+        return [PaymentSession(*row) for row in rows]
+
+
+class SessionStore:
+    """
+    Payment session store with active expiry.
+    A min-heap ordered by expiry lets every write (and an optional sweeper
+    thread) drop expired sessions without scanning. At capacity the session
+    closest to expiry is evicted. Backend writes happen under the lock, so the
+    persisted set always matches the in-memory one (a save cannot land after a
+    concurrent delete of the same token).
+    """
+
+    def __init__(self, capacity=1_000_000, backend=None, clock=time.time):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.backend = backend or SessionBackend()
+        self.clock = clock
+        self.sessions = {}
+        self.heap = []  # (exp, token); entries for removed sessions are skipped
+        self.lock = threading.Lock()
+        self._sweeper = None
+
+        for session in self.backend.load(self.clock()):
+            self.sessions[session.token] = session
+            self.heap.append((session.exp, session.token))
+        heapq.heapify(self.heap)
+
+    def create(self, order_id, amount, ttl_seconds=900):
+        """
+        Generate Opaque Token and store with TTL.
+        """
+        token = secrets.token_urlsafe(32)
+        now = self.clock()
+        session = PaymentSession(token, order_id, amount, now + ttl_seconds)
+
+        with self.lock:
+            removed = self._expire(now)
+            while len(self.sessions) >= self.capacity:
+                removed.append(self._pop_next())
+            self.sessions[token] = session
+            heapq.heappush(self.heap, (session.exp, token))
+            if removed:
+                self.backend.delete(removed)
+            self.backend.save(session)
+        return token
+
+    def validate(self, token):
+        """
+        Check availability and expiration.
+        """
+        session = self.sessions.get(token)
+        if session is None:
+            return {"valid": False, "reason": "Not Found"}
+
+        if self.clock() > session.exp:
+            self.invalidate(token)
+            return {"valid": False, "reason": "Expired"}
+
+        return {"valid": True, "data": session.to_dict()}
+
+    def invalidate(self, token):
+        with self.lock:
+            session = self.sessions.pop(token, None)
+            self._compact()
+            if session is not None:
+                self.backend.delete([token])
+
+    def sweep(self):
+        """
+        Remove all expired sessions. Returns number removed.
+        """
+        with self.lock:
+            removed = self._expire(self.clock())
+            if removed:
+                self.backend.delete(removed)
+        return len(removed)
+
+    def start_sweeper(self, interval=5):
+        def run():
+            while True:
+                time.sleep(interval)
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def _pop_next(self):
+        """
+        Pop the live session with the earliest expiry. Caller holds the lock.
+        """
+        while True:
+            exp, token = heapq.heappop(self.heap)
+            session = self.sessions.get(token)
+            if session is not None and session.exp == exp:
+                del self.sessions[token]
+                return token
+
+    def _expire(self, now):
+        removed = []
+        while self.heap and self.heap[0][0] < now:
+            exp, token = heapq.heappop(self.heap)
+            session = self.sessions.get(token)
+            if session is not None and session.exp == exp:
+                del self.sessions[token]
+                removed.append(token)
+        return removed
+
+    def _compact(self):
+        # Rebuild once stale entries from invalidate() dominate the heap
+        if len(self.heap) > 2 * len(self.sessions) + 1024:
+            self.heap = [(s.exp, t) for t, s in self.sessions.items()]
+            heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+def benchmark(sessions_per_day=10_000_000, ttl_seconds=900, simulated_hours=2):
+    """
+    Simulate creation at a daily rate on a fake clock and report live size + RSS.
+    """
+    import resource
+
+    clock = [0.0]
+    store = SessionStore(capacity=500_000, clock=lambda: clock[0])
+    per_second = sessions_per_day / 86_400
+    total = int(per_second * simulated_hours * 3600)
+
+    start = time.perf_counter()
+    for i in range(total):
+        clock[0] = i / per_second
+        store.create(f"ORD-{i}", "50.00", ttl_seconds)
+        if (i + 1) % (total // 8) == 0:
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"  t={clock[0] / 60:6.1f} min: {len(store):>8,} live, heap {len(store.heap):>8,}, max RSS {rss_mb:.0f} MiB")
+    print(f"{total / (time.perf_counter() - start):,.0f} creates/s")
+
+
 # Test
 if __name__ == "__main__":
     t = create_payment_session("ORD-1", "50.00")
     print(f"Token: {t}")
     print(validate_session(t))
+
+    store = SessionStore(capacity=10_000)
+    t2 = store.create("ORD-2", "75.00")
+    print(store.validate(t2))
+
+    if "--bench" in sys.argv:
+        benchmark()
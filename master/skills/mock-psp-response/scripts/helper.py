@@ -1,4 +1,12 @@
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import sys
 import time
+from collections import defaultdict
+from decimal import Decimal
 
 def mock_gateway_response(amount):
     """
@@ -24,6 +32,244 @@ def mock_gateway_response(amount):
     # Default to Success
     return {"result": "APPROVED", "code": "00"}
 
+
+def _load_latency_helper():
+    """
+    Per-PSP latency profiles and sketches live in monitor-transaction-latency.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "..", "monitor-transaction-latency", "scripts", "helper.py")
+    spec = importlib.util.spec_from_file_location("latency_helper", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+latency = _load_latency_helper()
+
+# Penny value -> (HTTP status, body); same scenarios as mock_gateway_response
+SCENARIOS = {
+    0: (200, {"result": "APPROVED", "code": "00"}),
+    51: (402, {"result": "DECLINED", "code": "51", "msg": "Insufficient Funds"}),
+    5: (402, {"result": "DECLINED", "code": "05", "msg": "Do Not Honor"}),
+    31: (200, {"result": "3DS_REQUIRED", "url": "http://mock/challenge"}),
+    99: (504, {"result": "ERROR", "code": "TIMEOUT"}),
+}
+TIMEOUT_CENTS = 99
+REASONS = {200: "OK", 400: "Bad Request", 402: "Payment Required", 404: "Not Found", 504: "Gateway Timeout"}
+
+
+def scenario_for(amount):
+    """
+    (status, body) for an amount; Decimal avoids float drift on e.g. "0.29".
+    """
+    cents = int(Decimal(str(amount)) * 100) % 100
+    return SCENARIOS.get(cents, SCENARIOS[0])
+
+
+class AsyncMockPSP:
+    """
+    Non-blocking mock PSP: the penny scenarios, with latency drawn from a
+    monitor-transaction-latency profile. Usable in-process (respond) or as a
+    keep-alive HTTP/1.1 server (POST /payments {"amount": "12.51"}).
+    """
+
+    def __init__(self, profile="default", latency_scale=1.0, timeout_after=5.0, seed=None):
+        self.profile = profile
+        self.latency_scale = latency_scale
+        self.timeout_after = timeout_after
+        self.rng = random.Random(seed)
+        self.served = 0
+
+    async def respond(self, amount):
+        status, body = scenario_for(amount)
+        if status == 504:
+            await asyncio.sleep(self.timeout_after)
+        else:
+            await asyncio.sleep(latency.sample_latency(self.profile, self.rng, self.latency_scale))
+        self.served += 1
+        return status, body
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                    method, path = request_line.split()[:2]
+                except ValueError:
+                    # Framing of the rest of the stream is unknown: answer and hang up
+                    method = path = None
+                    headers["connection"] = "close"
+                else:
+                    body = await reader.readexactly(length)
+
+                if method is None:
+                    status, payload = 400, {"result": "ERROR", "code": "BAD_REQUEST"}
+                elif method != b"POST" or path != b"/payments":
+                    status, payload = 404, {"result": "ERROR", "code": "NOT_FOUND"}
+                else:
+                    try:
+                        status, payload = await self.respond(json.loads(body or b"{}")["amount"])
+                    except (KeyError, ValueError, ArithmeticError):
+                        status, payload = 400, {"result": "ERROR", "code": "BAD_REQUEST"}
+
+                out = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(out)}\r\n\r\n".encode() + out)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """
+        Start serving; returns the asyncio Server (port in server.sockets[0].getsockname()[1]).
+        """
+        return await asyncio.start_server(self._handle, host, port, backlog=4096)
+
+
+class HTTPPaymentClient:
+    """
+    Minimal keep-alive HTTP/1.1 client with a fixed connection pool (no dependencies).
+    A semaphore bounds open connections; a connection that fails is closed and its
+    slot released, so a waiter opens a fresh one.
+    """
+
+    def __init__(self, host, port, connections=100):
+        self.host = host
+        self.port = port
+        self.size = connections
+        self.slots = asyncio.Semaphore(connections)
+        self.idle = []
+
+    async def submit(self, amount):
+        async with self.slots:
+            if self.idle:
+                reader, writer = self.idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                body = json.dumps({"amount": str(amount)}).encode()
+                writer.write(f"POST /payments HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                payload = json.loads(await reader.readexactly(length))
+            except BaseException:
+                writer.close()
+                raise
+            self.idle.append((reader, writer))
+        return status, payload
+
+    async def close(self):
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+
+
+DEFAULT_MIX = (("10.00", 0.95), ("10.51", 0.02), ("10.05", 0.015), ("10.31", 0.01), ("10.99", 0.005))
+
+
+async def run_load(submit, payments=10_000, concurrency=1000, mix=DEFAULT_MIX, seed=11):
+    """
+    Drive `payments` calls through `submit(amount)` with `concurrency` in flight.
+    Returns throughput, latency percentiles and outcome counts.
+    """
+    rng = random.Random(seed)
+    amounts, weights = zip(*mix)
+    queue = iter(rng.choices(amounts, weights, k=payments))
+    sketch = latency.LatencySketch()
+    outcomes = defaultdict(int)
+
+    async def worker():
+        for amount in queue:
+            start = time.perf_counter()
+            try:
+                status, body = await submit(amount)
+                outcomes[f"{status} {body.get('result')}"] += 1
+            except Exception as exc:
+                outcomes[type(exc).__name__] += 1
+            sketch.add(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "payments": payments,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "throughput": round(payments / elapsed, 1),
+        "p50_ms": round(sketch.quantile(0.50) * 1000, 1),
+        "p95_ms": round(sketch.quantile(0.95) * 1000, 1),
+        "p99_ms": round(sketch.quantile(0.99) * 1000, 1),
+        "max_ms": round(sketch.quantile(1.0) * 1000, 1),
+        "outcomes": dict(outcomes),
+    }
+
+
+def _serve_process(port_queue, profile, latency_scale, timeout_after):
+    async def main():
+        server = await AsyncMockPSP(profile, latency_scale, timeout_after).start()
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def benchmark(payments=10_000, concurrency=1000, profile="default", latency_scale=1.0, timeout_after=5.0):
+    """
+    Standard regression run: mock PSP in its own process, load generator over HTTP.
+    """
+    import multiprocessing
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve_process, daemon=True,
+                                     args=(port_queue, profile, latency_scale, timeout_after))
+    server.start()
+    port = port_queue.get()
+
+    async def main():
+        client = HTTPPaymentClient("127.0.0.1", port, connections=concurrency)
+        try:
+            return await run_load(client.submit, payments, concurrency)
+        finally:
+            await client.close()
+
+    try:
+        report = asyncio.run(main())
+    finally:
+        server.terminate()
+    print(f"profile={profile} scale={latency_scale}")
+    for key, value in report.items():
+        print(f"  {key:<12} {value}")
+    return report
+
 # Test
 if __name__ == "__main__":
     print(mock_gateway_response("12.51"))
+    print(asyncio.run(AsyncMockPSP(latency_scale=0.01).respond("12.51")))
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -1,25 +1,308 @@
+import math
 import random
+import sys
+import threading
 import time
+import weakref
+from contextlib import contextmanager
+
+# Per-PSP latency profiles (seconds). "uniform": base + U(0, jitter);
+# "lognormal": median * e^(sigma * N(0, 1)). Outliers add `outlier` seconds.
+LATENCY_PROFILES = {
+    "default": {"distribution": "uniform", "base": 0.2, "jitter": 0.5, "outlier_rate": 0.01, "outlier": 2.0},
+    "LegacyBank": {"distribution": "uniform", "base": 1.0, "jitter": 0.5, "outlier_rate": 0.01, "outlier": 2.0},
+}
+
+
+def sample_latency(profile, rng=random, scale=1.0):
+    """
+    Draw one latency (seconds) from a profile name or profile dict.
+    """
+    if isinstance(profile, str):
+        profile = LATENCY_PROFILES.get(profile, LATENCY_PROFILES["default"])
+    if profile["distribution"] == "lognormal":
+        duration = profile["median"] * math.exp(profile["sigma"] * rng.gauss(0.0, 1.0))
+    else:
+        duration = profile["base"] + rng.random() * profile["jitter"]
+    if rng.random() < profile.get("outlier_rate", 0.0):
+        duration += profile.get("outlier", 0.0)
+    return duration * scale
+
 
 def simulate_latency(psp_name):
     """
     Simulate latency based on PSP profile.
     Returns: duration in seconds.
     """
-    base = 0.2
-    jitter = random.random() * 0.5
-    
-    if psp_name == "LegacyBank":
-        base = 1.0 # Slower
-        
-    duration = base + jitter
-    
-    # Simulate outlier (1% chance)
-    if random.random() > 0.99:
-        duration += 2.0
-        
-    return round(duration, 3)
+    return round(sample_latency(psp_name), 3)
+
+
+class LatencySketch:
+    """
+    Log-bucketed quantile sketch (DDSketch-style): every quantile is within
+    `accuracy` relative error, bucket count is bounded by the value range,
+    and two sketches merge by adding counts.
+    """
+
+    def __init__(self, accuracy=0.01, min_value=1e-5, max_value=300.0):
+        self.accuracy = accuracy
+        self.min_value = min_value
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.log_min = math.log(min_value)
+        self.inv_log_gamma = 1 / self.log_gamma
+        self.max_index = math.ceil(math.log(max_value / min_value) / self.log_gamma)
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        index = 0
+        if value > self.min_value:
+            index = min(math.ceil((math.log(value) - self.log_min) * self.inv_log_gamma), self.max_index)
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other):
+        if other.gamma != self.gamma or other.min_value != self.min_value:
+            raise ValueError("Cannot merge sketches with different accuracy or range")
+        # list() snapshots the dict in one step, so a writer thread cannot resize it mid-merge
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        running = 0
+        for index in sorted(self.counts):
+            running += self.counts[index]
+            if running > rank:
+                break
+        # Bucket i covers (min * gamma^(i-1), min * gamma^i]; return its relative-error midpoint
+        return self.min_value * self.gamma ** index * 2 / (1 + self.gamma)
+
+    def empty_copy(self):
+        sketch = LatencySketch.__new__(LatencySketch)
+        sketch.__dict__.update(self.__dict__, counts={}, count=0, sum=0.0)
+        return sketch
+
+
+class _ShardOwner:
+    """
+    Held only by the thread-local, so it is collected when its thread exits.
+    """
+
+    __slots__ = ("__weakref__",)
+
+
+def _retire_shard(monitor_ref, shard):
+    monitor = monitor_ref()
+    if monitor is not None:
+        monitor._retire(shard)
+
+
+class LatencyMonitor:
+    """
+    Rolling per-(psp, operation) latency sketches for the authorization hot path.
+
+    Each thread writes only to its own shard (a ring of per-slot sketches), so
+    record() takes no lock; readers merge the live slots of every shard. When a
+    thread exits its shard is folded into a shared `retired` shard, so thread
+    churn does not grow the shard list. Scores are cached for `refresh` seconds
+    so routing reads are a dict lookup.
+    """
+
+    def __init__(self, window=60.0, slots=6, accuracy=0.01, refresh=1.0, min_samples=50,
+                 clock=time.monotonic):
+        self.slot_seconds = window / slots
+        self.slots = slots
+        self.template = LatencySketch(accuracy)
+        self.refresh = refresh
+        self.min_samples = min_samples
+        self.clock = clock
+        self.local = threading.local()
+        self.retired = {}
+        self.shards = [self.retired]
+        self.shards_lock = threading.Lock()
+        self.score_cache = {}
+
+    def _shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = {}
+            owner = self.local.owner = _ShardOwner()
+            weakref.finalize(owner, _retire_shard, weakref.ref(self), shard)
+            with self.shards_lock:
+                self.shards.append(shard)
+            self.local.shard = shard
+        return shard
+
+    def _retire(self, shard):
+        """
+        Fold a dead thread's shard into `retired` (slot by slot, newest epoch wins).
+        """
+        with self.shards_lock:
+            for key, ring in shard.items():
+                target = self.retired.setdefault(key, [(-1, None)] * self.slots)
+                for i, (epoch, sketch) in enumerate(ring):
+                    current_epoch, current = target[i]
+                    if epoch > current_epoch:
+                        target[i] = (epoch, sketch)  # no thread writes this sketch any more
+                    elif epoch == current_epoch and epoch >= 0:
+                        current.merge(sketch)
+            # By identity: a folded shard can compare equal to `retired`
+            self.shards = [s for s in self.shards if s is not shard]
+
+    def record(self, psp, operation, seconds):
+        try:
+            shard = self.local.shard
+        except AttributeError:
+            shard = self._shard()
+        epoch = int(self.clock() // self.slot_seconds)
+        ring = shard.get((psp, operation))
+        if ring is None:
+            ring = shard[(psp, operation)] = [(-1, None)] * self.slots
+        slot_epoch, sketch = ring[epoch % self.slots]
+        if slot_epoch != epoch:
+            sketch = self.template.empty_copy()
+            ring[epoch % self.slots] = (epoch, sketch)  # single assignment: readers see old or new slot
+        sketch.add(seconds)
+
+    @contextmanager
+    def timer(self, psp, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(psp, operation, time.perf_counter() - start)
+
+    def snapshot(self, psp, operation):
+        """
+        Merged sketch of the rolling window across all threads.
+        """
+        oldest = int(self.clock() // self.slot_seconds) - self.slots + 1
+        merged = self.template.empty_copy()
+        # Held while merging so a retiring shard is never counted twice
+        with self.shards_lock:
+            for shard in self.shards:
+                ring = shard.get((psp, operation))
+                if ring is None:
+                    continue
+                for slot_epoch, sketch in list(ring):
+                    if slot_epoch >= oldest and sketch is not None:
+                        merged.merge(sketch)
+        return merged
+
+    def keys(self):
+        with self.shards_lock:
+            return sorted({key for shard in self.shards for key in list(shard)})
+
+    def percentiles(self, psp, operation):
+        sketch = self.snapshot(psp, operation)
+        if not sketch.count:
+            return {"count": 0}
+        return {
+            "count": sketch.count,
+            "mean_ms": round(sketch.sum / sketch.count * 1000, 2),
+            "p50_ms": round(sketch.quantile(0.50) * 1000, 2),
+            "p95_ms": round(sketch.quantile(0.95) * 1000, 2),
+            "p99_ms": round(sketch.quantile(0.99) * 1000, 2),
+        }
+
+    def report(self):
+        return {f"{psp}/{operation}": self.percentiles(psp, operation) for psp, operation in self.keys()}
+
+    def latency_score(self, psp, operation="authorize"):
+        """
+        Weighted tail latency in ms (0.5*p50 + 0.3*p95 + 0.2*p99); None until
+        `min_samples` calls are in the window. Lower is better.
+        """
+        now = self.clock()
+        cached = self.score_cache.get((psp, operation))
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        sketch = self.snapshot(psp, operation)
+        score = None
+        if sketch.count >= self.min_samples:
+            score = 1000 * (0.5 * sketch.quantile(0.50) + 0.3 * sketch.quantile(0.95) + 0.2 * sketch.quantile(0.99))
+        self.score_cache[(psp, operation)] = (now + self.refresh, score)
+        return score
+
+    def rank(self, psps, operation="authorize"):
+        """
+        PSPs fastest first. PSPs without enough data get the median known score,
+        so a cold PSP is neither starved nor flooded.
+        """
+        scores = {psp: self.latency_score(psp, operation) for psp in psps}
+        known = sorted(s for s in scores.values() if s is not None)
+        default = known[len(known) // 2] if known else 0.0
+        return sorted(psps, key=lambda psp: default if scores[psp] is None else scores[psp])
+
+    def route(self, amount, names):
+        """
+        Drop-in `route` callable for payment-orchestration's HedgedOrchestrator.
+        """
+        return self.rank(names)
+
+
+def benchmark(samples=1_000_000, threads=8):
+    """
+    Record throughput (1 vs N threads, vs one locked sketch), accuracy, and memory.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    rng = random.Random(3)
+    values = [rng.lognormvariate(-3.0, 0.6) for _ in range(samples)]
+
+    monitor = LatencyMonitor()
+    start = time.perf_counter()
+    for v in values:
+        monitor.record("stripe", "authorize", v)
+    single_s = time.perf_counter() - start
+
+    locked = LatencySketch()
+    lock = threading.Lock()
+    per_thread = samples // threads
+
+    def locked_worker(chunk):
+        for v in chunk:
+            with lock:
+                locked.add(v)
+
+    def sharded_worker(chunk):
+        for v in chunk:
+            monitor.record("adyen", "authorize", v)
+
+    chunks = [values[i * per_thread:(i + 1) * per_thread] for i in range(threads)]
+    timings = {}
+    for label, worker in (("locked sketch", locked_worker), ("sharded monitor", sharded_worker)):
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            list(pool.map(worker, chunks))
+            timings[label] = time.perf_counter() - start
+
+    exact = sorted(values)
+    sketch = monitor.snapshot("stripe", "authorize")
+    print(f"record, 1 thread:         {samples / single_s:12,.0f} /s")
+    for label, elapsed in timings.items():
+        print(f"record, {threads} threads {label:<16} {per_thread * threads / elapsed:10,.0f} /s")
+    for q in (0.5, 0.95, 0.99):
+        true = exact[int(q * (samples - 1))]
+        print(f"p{int(q * 100):<3} exact {true * 1000:7.2f} ms  sketch {sketch.quantile(q) * 1000:7.2f} ms  "
+              f"err {abs(sketch.quantile(q) - true) / true:.2%}")
+    print(f"buckets held for {samples:,} samples: {len(sketch.counts)}")
+    print(monitor.report())
+    print("latency rank:", monitor.rank(["adyen", "stripe", "checkout"]))
 
 if __name__ == "__main__":
     for _ in range(5):
         print(f"Adyen Latency: {simulate_latency('Adyen')}s")
+
+    if "--bench" in sys.argv:
+        benchmark()
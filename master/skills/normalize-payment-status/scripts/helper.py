@@ -1,23 +1,336 @@
+import sys
+import threading
+import time
+from collections import Counter
+from types import MappingProxyType
+
+# Platform statuses: AUTHORIZED, CAPTURED, SETTLED, FAILED, DECLINED, VOIDED,
+# REFUNDED, PARTIALLY_REFUNDED, PENDING (UNKNOWN when unmapped)
+STATUS_MAPPINGS = {
+    "MPGS": {
+        "APPROVED": "AUTHORIZED",
+        "CAPTURED": "CAPTURED",
+        "DECLINED": "DECLINED",
+        "FAILED": "FAILED",
+        "VOIDED": "VOIDED",
+        "REFUNDED": "REFUNDED",
+        "PARTIALLY_REFUNDED": "PARTIALLY_REFUNDED",
+    },
+    "STRIPE": {
+        "succeeded": "CAPTURED",
+        "requires_capture": "AUTHORIZED",
+        "requires_payment_method": "PENDING",
+        "requires_confirmation": "PENDING",
+        "requires_action": "PENDING",
+        "processing": "PENDING",
+        "canceled": "VOIDED",
+    },
+    "ADYEN": {
+        "Authorised": "AUTHORIZED",
+        "Refused": "DECLINED",
+        "Error": "FAILED",
+        "Cancelled": "VOIDED",
+        "Received": "PENDING",
+        "Pending": "PENDING",
+        "RedirectShopper": "PENDING",
+        "IdentifyShopper": "PENDING",
+        "ChallengeShopper": "PENDING",
+        "PresentToShopper": "PENDING",
+    },
+    "CYBERSOURCE": {
+        "AUTHORIZED": "AUTHORIZED",
+        "PARTIAL_AUTHORIZED": "AUTHORIZED",
+        "AUTHORIZED_PENDING_REVIEW": "PENDING",
+        "AUTHORIZED_RISK_DECLINED": "DECLINED",
+        "PENDING_AUTHENTICATION": "PENDING",
+        "PENDING_REVIEW": "PENDING",
+        "PENDING": "PENDING",
+        "TRANSMITTED": "CAPTURED",
+        "DECLINED": "DECLINED",
+        "INVALID_REQUEST": "FAILED",
+        "SERVER_ERROR": "FAILED",
+        "REVERSED": "VOIDED",
+        "VOIDED": "VOIDED",
+        "REFUNDED": "REFUNDED",
+    },
+    "PAYPAL": {
+        "CREATED": "PENDING",
+        "SAVED": "PENDING",
+        "APPROVED": "PENDING",
+        "PAYER_ACTION_REQUIRED": "PENDING",
+        "PENDING": "PENDING",
+        "COMPLETED": "CAPTURED",
+        "CAPTURED": "CAPTURED",
+        "PARTIALLY_CAPTURED": "CAPTURED",
+        "DECLINED": "DECLINED",
+        "DENIED": "DECLINED",
+        "FAILED": "FAILED",
+        "VOIDED": "VOIDED",
+        "EXPIRED": "VOIDED",
+        "REFUNDED": "REFUNDED",
+        "PARTIALLY_REFUNDED": "PARTIALLY_REFUNDED",
+    },
+    "SQUARE": {
+        "APPROVED": "AUTHORIZED",
+        "PENDING": "PENDING",
+        "COMPLETED": "CAPTURED",
+        "CANCELED": "VOIDED",
+        "FAILED": "FAILED",
+    },
+}
+
+# Decline categories for PSP reason / refusal codes
+REASON_MAPPINGS = {
+    "ADYEN": {  # refusalReasonCode
+        "2": "DO_NOT_HONOR",
+        "3": "REFERRAL",
+        "4": "PROCESSOR_ERROR",
+        "5": "RESTRICTED_CARD",
+        "6": "EXPIRED_CARD",
+        "7": "INVALID_AMOUNT",
+        "8": "INVALID_CARD",
+        "9": "ISSUER_UNAVAILABLE",
+        "10": "NOT_SUPPORTED",
+        "11": "AUTHENTICATION_FAILED",
+        "12": "INSUFFICIENT_FUNDS",
+        "14": "FRAUD_SUSPECTED",
+        "15": "CANCELLED",
+        "16": "CANCELLED",
+        "17": "INVALID_PIN",
+        "18": "PIN_TRIES_EXCEEDED",
+        "20": "FRAUD_SUSPECTED",
+        "22": "FRAUD_SUSPECTED",
+        "23": "NOT_PERMITTED",
+        "24": "CVC_DECLINED",
+        "25": "RESTRICTED_CARD",
+        "26": "REVOCATION",
+        "27": "DO_NOT_HONOR",
+        "28": "LIMIT_EXCEEDED",
+        "29": "LIMIT_EXCEEDED",
+        "31": "FRAUD_SUSPECTED",
+        "32": "AVS_DECLINED",
+        "38": "AUTHENTICATION_REQUIRED",
+    },
+    "CYBERSOURCE": {  # legacy reasonCode + REST v2 errorInformation.reason
+        "101": "INVALID_REQUEST",
+        "102": "INVALID_REQUEST",
+        "150": "PROCESSOR_ERROR",
+        "151": "PROCESSOR_ERROR",
+        "152": "PROCESSOR_ERROR",
+        "200": "AVS_DECLINED",
+        "201": "REFERRAL",
+        "202": "EXPIRED_CARD",
+        "203": "DO_NOT_HONOR",
+        "204": "INSUFFICIENT_FUNDS",
+        "205": "LOST_OR_STOLEN",
+        "207": "ISSUER_UNAVAILABLE",
+        "208": "RESTRICTED_CARD",
+        "210": "LIMIT_EXCEEDED",
+        "211": "CVC_DECLINED",
+        "221": "FRAUD_SUSPECTED",
+        "230": "CVC_DECLINED",
+        "231": "INVALID_CARD",
+        "232": "NOT_SUPPORTED",
+        "233": "DO_NOT_HONOR",
+        "234": "MERCHANT_CONFIG",
+        "236": "PROCESSOR_ERROR",
+        "240": "INVALID_CARD",
+        "475": "AUTHENTICATION_REQUIRED",
+        "476": "AUTHENTICATION_FAILED",
+        "480": "REVIEW",
+        "481": "FRAUD_SUSPECTED",
+        "MISSING_FIELD": "INVALID_REQUEST",
+        "INVALID_DATA": "INVALID_REQUEST",
+        "SYSTEM_ERROR": "PROCESSOR_ERROR",
+        "SERVER_TIMEOUT": "PROCESSOR_ERROR",
+        "AVS_FAILED": "AVS_DECLINED",
+        "EXPIRED_CARD": "EXPIRED_CARD",
+        "PROCESSOR_DECLINED": "DO_NOT_HONOR",
+        "GENERAL_DECLINE": "DO_NOT_HONOR",
+        "INSUFFICIENT_FUND": "INSUFFICIENT_FUNDS",
+        "STOLEN_LOST_CARD": "LOST_OR_STOLEN",
+        "ISSUER_UNAVAILABLE": "ISSUER_UNAVAILABLE",
+        "UNAUTHORIZED_CARD": "RESTRICTED_CARD",
+        "CREDIT_LIMIT_REACHED": "LIMIT_EXCEEDED",
+        "CV_FAILED": "CVC_DECLINED",
+        "INVALID_ACCOUNT": "INVALID_CARD",
+        "CARD_TYPE_NOT_ACCEPTED": "NOT_SUPPORTED",
+        "BLACKLISTED_CUSTOMER": "FRAUD_SUSPECTED",
+        "DECISION_PROFILE_REJECT": "FRAUD_SUSPECTED",
+        "CONSUMER_AUTHENTICATION_REQUIRED": "AUTHENTICATION_REQUIRED",
+        "PAYMENT_REFUSED": "DO_NOT_HONOR",
+    },
+    "PAYPAL": {  # processor_response.response_code + API error names
+        "0500": "DO_NOT_HONOR",
+        "5100": "DO_NOT_HONOR",
+        "5110": "CVC_DECLINED",
+        "5120": "INSUFFICIENT_FUNDS",
+        "5180": "INVALID_CARD",
+        "5400": "EXPIRED_CARD",
+        "5650": "AUTHENTICATION_REQUIRED",
+        "5930": "RESTRICTED_CARD",
+        "1330": "INVALID_CARD",
+        "9100": "PROCESSOR_ERROR",
+        "9500": "FRAUD_SUSPECTED",
+        "9520": "LOST_OR_STOLEN",
+        "INSTRUMENT_DECLINED": "DO_NOT_HONOR",
+        "TRANSACTION_REFUSED": "DO_NOT_HONOR",
+        "PAYER_ACTION_REQUIRED": "AUTHENTICATION_REQUIRED",
+        "INTERNAL_SERVER_ERROR": "PROCESSOR_ERROR",
+    },
+    "SQUARE": {  # errors[].code
+        "GENERIC_DECLINE": "DO_NOT_HONOR",
+        "CARD_DECLINED": "DO_NOT_HONOR",
+        "CARD_DECLINED_CALL_ISSUER": "REFERRAL",
+        "CARD_DECLINED_VERIFICATION_REQUIRED": "AUTHENTICATION_REQUIRED",
+        "INSUFFICIENT_FUNDS": "INSUFFICIENT_FUNDS",
+        "CVV_FAILURE": "CVC_DECLINED",
+        "VERIFY_CVV_FAILURE": "CVC_DECLINED",
+        "ADDRESS_VERIFICATION_FAILURE": "AVS_DECLINED",
+        "VERIFY_AVS_FAILURE": "AVS_DECLINED",
+        "INVALID_ACCOUNT": "INVALID_CARD",
+        "INVALID_CARD": "INVALID_CARD",
+        "PAN_FAILURE": "INVALID_CARD",
+        "CARD_EXPIRED": "EXPIRED_CARD",
+        "INVALID_EXPIRATION": "EXPIRED_CARD",
+        "EXPIRATION_FAILURE": "EXPIRED_CARD",
+        "BAD_EXPIRATION": "EXPIRED_CARD",
+        "CARD_NOT_SUPPORTED": "NOT_SUPPORTED",
+        "TRANSACTION_LIMIT": "LIMIT_EXCEEDED",
+        "INVALID_PIN": "INVALID_PIN",
+        "ALLOWABLE_PIN_TRIES_EXCEEDED": "PIN_TRIES_EXCEEDED",
+        "CARDHOLDER_INSUFFICIENT_PERMISSIONS": "RESTRICTED_CARD",
+        "TEMPORARY_ERROR": "PROCESSOR_ERROR",
+    },
+}
+
+
+def _freeze(mappings):
+    """
+    Flatten {psp: {raw: value}} into a read-only dict keyed on (PSP, raw).
+    Raw keys are stored as given and upper-cased, so the common spellings hit
+    on the first lookup without normalizing the input.
+    """
+    table = {}
+    for psp, statuses in mappings.items():
+        for raw, value in statuses.items():
+            for psp_key in (psp, psp.lower()):
+                table[(psp_key, raw)] = value
+                table[(psp_key, raw.upper())] = value
+                table[(psp_key, raw.lower())] = value
+    return MappingProxyType(table)
+
+
+class StatusRegistry:
+    """
+    Frozen (psp, raw_status) -> platform status lookup with unmapped counters.
+    Each counter tracks at most `max_unmapped` distinct values (truncated to
+    `max_raw_length`); misses beyond that are only counted in `overflow`.
+    """
+
+    def __init__(self, status_mappings=STATUS_MAPPINGS, reason_mappings=REASON_MAPPINGS,
+                 max_unmapped=1000, max_raw_length=64):
+        self.statuses = _freeze(status_mappings)
+        self.reasons = _freeze(reason_mappings)
+        self.unmapped_statuses = Counter()
+        self.unmapped_reasons = Counter()
+        self.overflow = {"statuses": 0, "reasons": 0}
+        self.max_unmapped = max_unmapped
+        self.max_raw_length = max_raw_length
+        self.lock = threading.Lock()
+
+    def _miss(self, table, counter, kind, psp_name, raw):
+        # Slow path: normalize case, then count the gap
+        value = table.get((psp_name.upper(), raw.upper()))
+        if value is None:
+            key = (psp_name[:self.max_raw_length], raw[:self.max_raw_length])
+            with self.lock:
+                if key in counter or len(counter) < self.max_unmapped:
+                    counter[key] += 1
+                else:
+                    self.overflow[kind] += 1
+        return value
+
+    def normalize(self, psp_name, raw_status):
+        status = self.statuses.get((psp_name, raw_status))
+        if status is None:
+            status = self._miss(self.statuses, self.unmapped_statuses, "statuses", psp_name, raw_status) or "UNKNOWN"
+        return status
+
+    def normalize_reason(self, psp_name, reason_code):
+        code = str(reason_code)
+        reason = self.reasons.get((psp_name, code))
+        if reason is None:
+            reason = self._miss(self.reasons, self.unmapped_reasons, "reasons", psp_name, code) or "UNKNOWN"
+        return reason
+
+    def normalize_many(self, rows):
+        """
+        Bulk normalize an iterable of (psp_name, raw_status) pairs.
+        """
+        get = self.statuses.get
+        miss = self._miss
+        statuses, counter = self.statuses, self.unmapped_statuses
+        out = []
+        append = out.append
+        for key in rows:
+            status = get(key)
+            if status is None:
+                status = miss(statuses, counter, "statuses", key[0], key[1]) or "UNKNOWN"
+            append(status)
+        return out
+
+    def gaps(self, top=20):
+        """
+        Most frequent unmapped statuses and reason codes, plus misses past the tracking cap.
+        """
+        with self.lock:
+            return {
+                "statuses": self.unmapped_statuses.most_common(top),
+                "reasons": self.unmapped_reasons.most_common(top),
+                "overflow": dict(self.overflow),
+            }
+
+
+REGISTRY = StatusRegistry()
+
+
 def normalize_status(psp_name, raw_status):
     """
     Normalize PSP status to Platform Enum.
     """
-    raw = raw_status.upper()
-    
-    # MPGS Maps
-    if psp_name == "MPGS":
-        if raw == "APPROVED": return "AUTHORIZED"
-        if raw == "DECLINED": return "DECLINED"
-        if raw == "CAPTURED": return "CAPTURED"
-        
-    # Stripe Maps
-    if psp_name == "STRIPE":
-        if raw == "SUCCEEDED": return "CAPTURED" # Simple assumption
-        if raw == "REQUIRES_ACTION": return "PENDING"
-        
-    # Fallback
-    return "UNKNOWN"
+    return REGISTRY.normalize(psp_name, raw_status)
+
+
+def normalize_reason(psp_name, reason_code):
+    """
+    Normalize PSP decline reason code to a platform decline category.
+    """
+    return REGISTRY.normalize_reason(psp_name, reason_code)
+
+
+def benchmark(n=1_000_000):
+    """
+    Bulk normalize throughput for a status-sync style workload.
+    """
+    import random
+
+    rng = random.Random(7)
+    pairs = [(psp, raw) for psp, statuses in STATUS_MAPPINGS.items() for raw in statuses]
+    pairs.append(("ADYEN", "SomethingNew"))
+    rows = [rng.choice(pairs) for _ in range(n)]
+
+    registry = StatusRegistry()
+    start = time.perf_counter()
+    registry.normalize_many(rows)
+    elapsed = time.perf_counter() - start
+    print(f"normalize_many: {n / elapsed:,.0f} rows/s")
+    print(f"gaps: {registry.gaps()}")
 
 # Test
 if __name__ == "__main__":
     print(normalize_status("MPGS", "Approved"))
+    print(normalize_status("ADYEN", "Refused"), normalize_reason("ADYEN", 12))
+
+    if "--bench" in sys.argv:
+        benchmark()
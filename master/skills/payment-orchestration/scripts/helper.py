@@ -1,3 +1,12 @@
+import asyncio
+import importlib.util
+import inspect
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
 class MockRouter:
     def route(self, amount):
         return "stripe" if amount < 100 else "adyen"
@@ -17,6 +26,391 @@ class MockOrchestrator:
             
         return f"SUCCESS ({psp})"
 
+
+def _load_helper(skill, name):
+    """
+    PaymentAdapter contract lives in psp-integration, LatencySketch in monitor-transaction-latency.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "..", skill, "scripts", "helper.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+psp = _load_helper("psp-integration", "psp_helper")
+latency = _load_helper("monitor-transaction-latency", "latency_helper")
+
+
+class CircuitBreaker:
+    """
+    CLOSED -> OPEN after `failure_threshold` consecutive failures. After `reset_timeout`
+    one probe call is let through (HALF_OPEN); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "CLOSED"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self):
+        if self.state == "OPEN" and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = "HALF_OPEN"
+            self.probing = False
+        if self.state == "CLOSED":
+            return True
+        if self.state == "HALF_OPEN" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "CLOSED"
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "HALF_OPEN" or self.failures >= self.failure_threshold:
+            self.state = "OPEN"
+            self.opened_at = self.clock()
+            self.probing = False
+
+
+EXPORT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def export_sketch(sketch):
+    """
+    Cumulative counts at Prometheus-style `le` bounds, plus summary percentiles.
+    """
+    ordered = sorted(sketch.counts.items())
+    buckets = []
+    running = 0
+    i = 0
+    for le in EXPORT_BUCKETS:
+        # Bucket i covers (min * gamma^(i-1), min * gamma^i]
+        while i < len(ordered) and sketch.min_value * sketch.gamma ** ordered[i][0] <= le:
+            running += ordered[i][1]
+            i += 1
+        buckets.append((le, running))
+    buckets.append(("+Inf", sketch.count))
+    return {
+        "count": sketch.count,
+        "sum_seconds": round(sketch.sum, 6),
+        "p50_ms": round((sketch.quantile(0.50) or 0) * 1000, 2),
+        "p95_ms": round((sketch.quantile(0.95) or 0) * 1000, 2),
+        "p99_ms": round((sketch.quantile(0.99) or 0) * 1000, 2),
+        "buckets": buckets,
+    }
+
+
+def _is_ambiguous(exc):
+    """
+    True when the PSP may have acted on the request: timeouts and connections lost
+    after sending. A refused connection never reached the PSP.
+    """
+    if isinstance(exc, ConnectionRefusedError):
+        return False
+    return isinstance(exc, (asyncio.TimeoutError, OSError))
+
+
+class HedgedOrchestrator:
+    """
+    asyncio authorization across PaymentAdapters: per-PSP circuit breakers, one timeout
+    budget per payment, failover on errors, and optional hedging to the next PSP once
+    the primary has been slower than its own p95.
+
+    Idempotency keys are PSP-specific (payment_id:psp). A hedge can leave two live
+    authorizations; the loser is never cancelled mid-flight but reaped, and voided if
+    it approved, so at most one authorization survives (nothing is captured here).
+    Adapters may be sync (run in a thread) or async.
+
+    A leg that times out, loses its connection or returns something other than a dict
+    has an unknown outcome: the PSP may have authorized. Failover still happens, but the
+    leg is reconciled by replaying authorize under its original key (the PSP answers
+    from its idempotency store) and voided if it approved. Legs that stay unknown after
+    `reconcile_attempts` are listed in `unreconciled`.
+
+    Only legs that got an answer feed the latency sketch behind the hedge delay. A leg
+    that runs out of the payment's budget counts against its PSP's breaker only if it
+    had at least half the budget; no leg is launched with less than `min_leg_budget` left.
+    """
+
+    def __init__(self, adapters, route=None, timeout_budget=2.0, hedge=True, hedge_quantile=0.95,
+                 hedge_delay=0.1, min_hedge_delay=0.01, max_hedge_ratio=0.1, breaker_factory=CircuitBreaker,
+                 reconcile_attempts=3, reconcile_delay=0.5, min_leg_budget=0.005):
+        self.adapters = dict(adapters)
+        self.route = route or (lambda amount, names: names)
+        self.timeout_budget = timeout_budget
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.reconcile_attempts = reconcile_attempts
+        self.reconcile_delay = reconcile_delay
+        self.min_leg_budget = min_leg_budget
+        self.breakers = {name: breaker_factory() for name in self.adapters}
+        self.latency = {name: latency.LatencySketch() for name in self.adapters}
+        self.stats = defaultdict(int)
+        self.reapers = set()
+        self.unreconciled = []
+
+    def hedge_delay_for(self, name):
+        sketch = self.latency[name]
+        if sketch.count < 100:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, sketch.quantile(self.hedge_quantile))
+
+    async def _call(self, name, method, *args, **kwargs):
+        fn = getattr(self.adapters[name], method)
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args, **kwargs)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def _authorize_leg(self, name, amount, key, timeout):
+        """
+        One authorize call. Returns (result, error, unknown, started); `unknown` means the
+        PSP may have authorized even though no usable answer came back. A call cancelled
+        before it started never reached the PSP.
+        """
+        started = False
+
+        async def call():
+            nonlocal started
+            started = True
+            return await self._call(name, "authorize", amount, idempotency_key=key)
+
+        try:
+            result = await asyncio.wait_for(call(), timeout)
+        except Exception as exc:
+            return None, exc, started and _is_ambiguous(exc), started
+        if not isinstance(result, dict):
+            return None, TypeError(f"{name} authorize returned {type(result).__name__}, not a dict"), True, True
+        return result, None, False, True
+
+    async def _attempt(self, name, payment_id, amount, timeout):
+        key = f"{payment_id}:{name}"
+        start = time.perf_counter()
+        result, error, unknown, started = await self._authorize_leg(name, amount, key, timeout)
+        if error is None:
+            self.latency[name].add(time.perf_counter() - start)
+            self.breakers[name].record_success()
+        elif started and (not isinstance(error, asyncio.TimeoutError) or timeout >= self.timeout_budget / 2):
+            self.breakers[name].record_failure()
+        return name, key, amount, result, error, unknown
+
+    def _next_psp(self, candidates):
+        for name in candidates:
+            if self.breakers[name].allow():
+                return name
+        return None
+
+    async def authorize(self, payment_id, amount):
+        """
+        Returns {"status", "psp", "authorization", "attempts", "hedged", "latency_ms"}.
+        A decline is a PSP answer, not a fault: it neither fails over nor trips the breaker.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout_budget
+        candidates = iter([n for n in self.route(amount, list(self.adapters)) if n in self.adapters])
+        self.stats["requests"] += 1
+
+        in_flight = set()
+        attempts = []
+        hedged = hedge_tried = False
+        winner = None
+        last_error = None
+
+        def launch(name):
+            remaining = deadline - time.monotonic()
+            if remaining <= self.min_leg_budget:
+                return False
+            task = asyncio.ensure_future(self._attempt(name, payment_id, amount, remaining))
+            in_flight.add(task)
+            attempts.append(name)
+            return True
+
+        first = self._next_psp(candidates)
+        if first is not None:
+            launch(first)
+
+        while in_flight and winner is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            can_hedge = (self.hedge and not hedge_tried and len(in_flight) == 1
+                         and self.stats["hedges"] < self.max_hedge_ratio * self.stats["requests"])
+            wait = min(remaining, self.hedge_delay_for(attempts[-1])) if can_hedge else remaining
+            done, _ = await asyncio.wait(in_flight, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                if can_hedge:
+                    hedge_tried = True
+                    name = self._next_psp(candidates)
+                    if name is not None and launch(name):
+                        hedged = True
+                        self.stats["hedges"] += 1
+                continue
+
+            for task in done:
+                in_flight.discard(task)
+                name, key, _, result, error, unknown = task.result()
+                if error is not None:
+                    last_error = error
+                    self.stats["errors"] += 1
+                    if unknown:
+                        self.stats["unknown"] += 1
+                        self._reap(task)  # may have authorized under its own key
+                elif winner is None:
+                    winner = (name, result)
+                else:
+                    self._reap(task)  # both legs answered in the same tick
+
+            if winner is None and not in_flight:
+                name = self._next_psp(candidates)
+                if name is not None and launch(name):
+                    self.stats["failovers"] += 1
+
+        for task in in_flight:
+            self._reap(task)
+
+        latency_ms = round((time.monotonic() - start) * 1000, 2)
+        if winner is None:
+            if in_flight or deadline - time.monotonic() <= self.min_leg_budget:
+                status, error = "TIMEOUT", f"Timeout budget of {self.timeout_budget}s exhausted"
+            else:
+                status, error = "FAILED", repr(last_error) if last_error else "No PSP available (all circuits open)"
+            self.stats[status.lower()] += 1
+            return {"status": status, "psp": None, "error": error, "attempts": attempts,
+                    "hedged": hedged, "latency_ms": latency_ms}
+
+        name, result = winner
+        if hedged and name != attempts[0]:
+            self.stats["hedge_wins"] += 1
+        return {"status": result.get("status", "AUTHORIZED"), "psp": name, "authorization": result,
+                "attempts": attempts, "hedged": hedged, "latency_ms": latency_ms}
+
+    def _reap(self, task):
+        async def reap():
+            name, key, amount, result, error, unknown = await task
+            for attempt in range(self.reconcile_attempts if unknown else 0):
+                # Replaying the original key returns what the PSP did with the first request
+                await asyncio.sleep(self.reconcile_delay * 2 ** attempt)
+                self.stats["reconcile_calls"] += 1
+                result, error, unknown, _ = await self._authorize_leg(name, amount, key, self.timeout_budget)
+                if not unknown:
+                    break
+            if unknown:
+                self.stats["unreconciled"] += 1
+                self.unreconciled.append({"psp": name, "idempotency_key": key, "error": repr(error)})
+            elif error is None and result.get("status", "AUTHORIZED") == "AUTHORIZED":
+                self.stats["voids"] += 1
+                try:
+                    await self._call(name, "void", result, idempotency_key=f"{key}:void")
+                except Exception as exc:
+                    self.stats["void_failures"] += 1
+                    self.unreconciled.append({"psp": name, "idempotency_key": key, "error": repr(exc)})
+
+        reaper = asyncio.ensure_future(reap())
+        self.reapers.add(reaper)
+        reaper.add_done_callback(self.reapers.discard)
+
+    async def drain(self):
+        """
+        Wait for outstanding loser legs (and their voids) before shutdown.
+        """
+        while self.reapers:
+            await asyncio.gather(*list(self.reapers))
+
+    def histograms(self):
+        return {name: export_sketch(sketch) for name, sketch in self.latency.items()}
+
+    def prometheus_text(self, metric="psp_authorize_latency_seconds"):
+        lines = [f"# TYPE {metric} histogram"]
+        for name, data in self.histograms().items():
+            for le, count in data["buckets"]:
+                lines.append(f'{metric}_bucket{{psp="{name}",le="{le}"}} {count}')
+            lines.append(f'{metric}_sum{{psp="{name}"}} {data["sum_seconds"]}')
+            lines.append(f'{metric}_count{{psp="{name}"}} {data["count"]}')
+        return "\n".join(lines)
+
+
+class SimulatedPSP(psp.PaymentAdapter):
+    """
+    Async adapter with a configurable latency tail and error rate, for benchmarks.
+    """
+
+    def __init__(self, name, latency=0.03, jitter=0.01, slow_rate=0.0, slow_latency=1.0, error_rate=0.0, seed=0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.authorized = {}
+
+    async def authorize(self, amount, idempotency_key=None):
+        if idempotency_key in self.authorized:
+            return self.authorized[idempotency_key]
+        slow = self.rng.random() < self.slow_rate
+        await asyncio.sleep(self.slow_latency if slow else self.latency + self.rng.random() * self.jitter)
+        if self.rng.random() < self.error_rate:
+            raise ConnectionError(f"{self.name} unavailable")
+        result = {"psp": self.name, "status": "AUTHORIZED", "amount": amount, "id": idempotency_key}
+        self.authorized[idempotency_key] = result
+        return result
+
+    async def void(self, authorization, idempotency_key=None):
+        self.authorized.pop(authorization["id"], None)
+
+
+def benchmark(payments=3000, concurrency=200):
+    """
+    Tail latency with a degraded primary (8% of calls take 800ms): hedging off vs on.
+    """
+    async def run(hedge):
+        adapters = {
+            "stripe": SimulatedPSP("stripe", slow_rate=0.08, slow_latency=0.8, seed=1),
+            "adyen": SimulatedPSP("adyen", latency=0.04, seed=2),
+        }
+        orchestrator = HedgedOrchestrator(adapters, hedge=hedge, max_hedge_ratio=0.15)
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with slots:
+                return await orchestrator.authorize(f"pay_{i}", 100)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(payments)))
+        elapsed = time.perf_counter() - start
+        await orchestrator.drain()
+
+        latencies = sorted(r["latency_ms"] for r in results)
+        live = sum(len(a.authorized) for a in adapters.values())
+        print(f"hedge={'on ' if hedge else 'off'} p50 {latencies[len(latencies) // 2]:7.1f} ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)]:7.1f} ms  max {latencies[-1]:7.1f} ms  "
+              f"{payments / elapsed:6,.0f} auth/s  hedges {orchestrator.stats['hedges']} "
+              f"voids {orchestrator.stats['voids']}  live auths {live}/{payments}")
+        return orchestrator
+
+    asyncio.run(run(False))
+    orchestrator = asyncio.run(run(True))
+    print(orchestrator.prometheus_text().splitlines()[1:4])
+
 if __name__ == "__main__":
     engine = MockOrchestrator()
     engine.process(99)
+
+    orchestrator = HedgedOrchestrator({"stripe": psp.StripeAdapter(), "adyen": psp.AdyenAdapter()})
+    print(asyncio.run(orchestrator.authorize("pay_1", 99)))
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -1,3 +1,15 @@
+import asyncio
+import json
+import os
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import requests
 
 def check_headers(url):
@@ -21,8 +33,472 @@ def check_headers(url):
                 missing.append(h)
                 
         return missing
-    except:
+    except requests.RequestException:
         return ["ERROR: Connection Failed"]
 
+
+SEVERITY = {"PASS": 0, "WARN": 1, "FAIL": 2, "ERROR": 3}
+MIN_HSTS_MAX_AGE = 31536000  # one year, as in examples.md
+UNSAFE_SCRIPT_SOURCES = {"'unsafe-inline'", "'unsafe-eval'", "*", "http:", "https:", "data:"}
+
+
+def _directives(value, separator=";"):
+    parsed = {}
+    for part in value.split(separator):
+        tokens = part.strip().split()
+        if tokens:
+            parsed.setdefault(tokens[0].lower(), tokens[1:])
+    return parsed
+
+
+def check_hsts(value):
+    if value is None:
+        return [("FAIL", "Strict-Transport-Security missing")]
+    directives = {k: v for k, v in (d.strip().partition("=")[::2] for d in value.lower().split(";")) if k}
+    try:
+        max_age = int(directives.get("max-age", "").strip('"'))
+    except ValueError:
+        return [("FAIL", f"HSTS max-age missing or invalid: {value!r}")]
+    findings = []
+    if max_age < MIN_HSTS_MAX_AGE:
+        findings.append(("FAIL", f"HSTS max-age={max_age} below {MIN_HSTS_MAX_AGE}"))
+    if "includesubdomains" not in directives:
+        findings.append(("WARN", "HSTS without includeSubDomains"))
+    return findings
+
+
+def check_csp(value):
+    if value is None:
+        return [("FAIL", "Content-Security-Policy missing")]
+    directives = _directives(value)
+    script = directives.get("script-src", directives.get("default-src"))
+    if script is None:
+        return [("FAIL", "CSP has neither script-src nor default-src")]
+    findings = []
+    has_nonce = any(s.startswith(("'nonce-", "'sha256-", "'sha384-", "'sha512-")) for s in script)
+    for source in sorted(UNSAFE_SCRIPT_SOURCES.intersection(s.lower() for s in script)):
+        if source == "'unsafe-inline'" and has_nonce:
+            continue  # ignored by CSP2+ browsers when a nonce/hash is present
+        findings.append(("FAIL", f"CSP script sources allow {source}"))
+    objects = directives.get("object-src", directives.get("default-src", []))
+    if objects not in (["'none'"], ["'self'"]):
+        findings.append(("WARN", "CSP does not restrict object-src"))
+    if "frame-ancestors" not in directives:
+        findings.append(("WARN", "CSP without frame-ancestors"))
+    if "base-uri" not in directives:
+        findings.append(("WARN", "CSP without base-uri"))
+    return findings
+
+
+def check_frame_options(value, csp):
+    if csp is not None and "frame-ancestors" in _directives(csp):
+        return []
+    if value is None:
+        return [("FAIL", "X-Frame-Options missing (and no CSP frame-ancestors)")]
+    if value.strip().upper() not in ("DENY", "SAMEORIGIN"):
+        return [("FAIL", f"X-Frame-Options {value!r} is not DENY/SAMEORIGIN")]
+    return []
+
+
+def check_content_type_options(value):
+    if value is None:
+        return [("FAIL", "X-Content-Type-Options missing")]
+    if value.strip().lower() != "nosniff":
+        return [("FAIL", f"X-Content-Type-Options {value!r} is not nosniff")]
+    return []
+
+
+def check_disclosure(headers):
+    return [("WARN", f"{name} discloses {headers[name]!r}")
+            for name in ("Server", "X-Powered-By", "X-AspNet-Version") if any(c.isdigit() for c in headers.get(name, ""))]
+
+
+def validate_headers(headers, https=True):
+    """
+    Value-level checks on a case-insensitive header mapping. Returns [(severity, message)].
+    """
+    csp = headers.get("Content-Security-Policy")
+    findings = []
+    if https:
+        findings += check_hsts(headers.get("Strict-Transport-Security"))
+    findings += check_csp(csp)
+    findings += check_frame_options(headers.get("X-Frame-Options"), csp)
+    findings += check_content_type_options(headers.get("X-Content-Type-Options"))
+    findings += check_disclosure(headers)
+    return findings
+
+
+class TTLCache:
+    """
+    key -> value, dropped `ttl` seconds after being set.
+    """
+
+    def __init__(self, ttl=3600, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            self.entries.pop(key, None)
+            return None
+        return entry[1]
+
+    def set(self, key, value):
+        self.entries[key] = (self.clock() + self.ttl, value)
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+
+def legacy_tls_context():
+    """
+    Client context offering only TLS 1.0/1.1, to probe whether a server still accepts them.
+    None when the local OpenSSL cannot offer them at all.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            context.minimum_version = ssl.TLSVersion.TLSv1
+            context.maximum_version = ssl.TLSVersion.TLSv1_1
+            context.set_ciphers("ALL:@SECLEVEL=0")  # OpenSSL 3 otherwise refuses to offer TLS < 1.2
+    except (ValueError, ssl.SSLError):
+        return None
+    return context
+
+
+def _ssl_cause(exc):
+    """
+    True when an ssl.SSLError is somewhere in the exception's cause chain.
+    """
+    while exc is not None:
+        if isinstance(exc, ssl.SSLError):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class HeaderAuditor:
+    """
+    Concurrent security-header + TLS audit over one pooled httpx.AsyncClient.
+    Results (and TLS handshakes, per host:port) are cached for `ttl` seconds;
+    ERROR results and failed handshakes are not, so the next audit retries them.
+    """
+
+    def __init__(self, concurrency=50, timeout=5.0, ttl=3600, ssl_context=None, cert_warn_days=30):
+        import httpx
+
+        self.httpx = httpx
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.ssl_context = ssl_context or ssl.create_default_context()
+        self.legacy_context = legacy_tls_context()
+        self.cert_warn_days = cert_warn_days
+        self.cache = TTLCache(ttl)
+        self.tls_cache = TTLCache(ttl)
+        self.client = httpx.AsyncClient(
+            verify=self.ssl_context, follow_redirects=True, timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+
+    async def _tls(self, host, port):
+        # Cache the in-flight task so concurrent URLs on one host share a single handshake
+        task = self.tls_cache.get((host, port))
+        if task is None:
+            task = asyncio.ensure_future(self._handshake(host, port))
+            self.tls_cache.set((host, port), task)
+        try:
+            info, findings = await asyncio.shield(task)
+        except Exception:
+            self._forget_tls(host, port, task)
+            raise
+        if any(severity == "ERROR" for severity, _ in findings):
+            self._forget_tls(host, port, task)
+        return info, findings
+
+    def _forget_tls(self, host, port, task):
+        if self.tls_cache.get((host, port)) is task:
+            self.tls_cache.discard((host, port))
+
+    async def _accepts_legacy(self, host, port):
+        """
+        The version if the server completes a TLS 1.0/1.1 handshake, False if it
+        refuses, None if that could not be determined.
+        """
+        if self.legacy_context is None:
+            return None
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=self.legacy_context, server_hostname=host), self.timeout)
+        except ssl.SSLError as exc:
+            return None if exc.reason == "NO_PROTOCOLS_AVAILABLE" else False
+        except ConnectionError:
+            return False
+        except (OSError, asyncio.TimeoutError):
+            return None
+        version = writer.get_extra_info("ssl_object").version()
+        writer.close()
+        return version
+
+    async def _handshake(self, host, port):
+        findings = []
+        info = {}
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=self.ssl_context, server_hostname=host), self.timeout)
+        except ssl.SSLCertVerificationError as exc:
+            findings.append(("FAIL", f"Certificate verification failed: {exc.verify_message}"))
+        except ssl.SSLError as exc:
+            # The audit context only offers TLS 1.2+; a server that only speaks older versions fails
+            legacy = await self._accepts_legacy(host, port)
+            info["legacy_tls"] = legacy
+            if legacy:
+                findings.append(("FAIL", f"Server only accepts {legacy}; PCI DSS requires TLS 1.2+"))
+            else:
+                findings.append(("ERROR", f"TLS handshake failed: {exc!r}"))
+        except (OSError, asyncio.TimeoutError) as exc:
+            findings.append(("ERROR", f"TLS handshake failed: {exc!r}"))
+        else:
+            tls = writer.get_extra_info("ssl_object")
+            info = {"version": tls.version(), "cipher": tls.cipher()[0]}
+            if tls.version() not in ("TLSv1.2", "TLSv1.3"):
+                findings.append(("FAIL", f"Negotiated {tls.version()}; PCI DSS requires TLS 1.2+"))
+            # getpeercert() is {} when the context does not verify certificates
+            not_after = (tls.getpeercert() or {}).get("notAfter")
+            if not_after is None:
+                findings.append(("WARN", "Certificate expiry unavailable (peer certificate not verified)"))
+            else:
+                expires = datetime.fromtimestamp(ssl.cert_time_to_seconds(not_after), timezone.utc)
+                days_left = (expires - datetime.now(timezone.utc)).days
+                info.update(cert_expires=expires.isoformat(), cert_days_left=days_left)
+                if days_left < self.cert_warn_days:
+                    findings.append(("WARN", f"Certificate expires in {days_left} days"))
+            writer.close()
+
+            # The audit context already refuses TLS < 1.2, so ask with one that offers only that
+            legacy = await self._accepts_legacy(host, port)
+            info["legacy_tls"] = legacy
+            if legacy:
+                findings.append(("FAIL", f"Server accepts {legacy}; PCI DSS requires TLS 1.2+"))
+            elif legacy is None:
+                findings.append(("WARN", "Could not probe for TLS 1.0/1.1 support"))
+        return info, findings
+
+    async def audit_url(self, url, refresh=False):
+        if not refresh:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return dict(cached, cached=True)
+
+        start = time.perf_counter()
+        entry = {"url": url, "http_status": None, "tls": None, "findings": []}
+        try:
+            response = await self.client.head(url)
+            if response.status_code in (405, 501):
+                response = await self.client.get(url)
+        except self.httpx.HTTPError as exc:
+            findings = [("connect", "ERROR", repr(exc))]
+            target = self.httpx.URL(url)
+            if target.scheme == "https" and isinstance(exc, self.httpx.ConnectError) and _ssl_cause(exc):
+                # Reachable, but the handshake was refused: that is a TLS finding, not an outage
+                info, tls_findings = await self._tls(target.host, target.port or 443)
+                entry["tls"] = info
+                if any(severity == "FAIL" for severity, _ in tls_findings):
+                    findings = [("headers", "WARN", "Headers not checked: no acceptable TLS connection")]
+                findings += [("tls", s, m) for s, m in tls_findings]
+            entry["findings"] = [{"severity": s, "check": c, "message": m} for c, s, m in findings]
+        else:
+            final = response.url
+            https = final.scheme == "https"
+            entry["http_status"] = response.status_code
+            entry["final_url"] = str(final)
+            findings = [("headers", s, m) for s, m in validate_headers(response.headers, https)]
+            if https:
+                info, tls_findings = await self._tls(final.host, final.port or 443)
+                entry["tls"] = info
+                findings += [("tls", s, m) for s, m in tls_findings]
+            else:
+                findings.append(("tls", "FAIL", "Served over plain HTTP"))
+            entry["findings"] = [{"severity": s, "check": c, "message": m} for c, s, m in findings]
+
+        entry["result"] = max((f["severity"] for f in entry["findings"]), key=SEVERITY.get, default="PASS")
+        entry["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if entry["result"] != "ERROR":
+            self.cache.set(url, entry)
+        return dict(entry, cached=False)
+
+    async def audit(self, urls, refresh=False):
+        """
+        Audit all URLs with at most `concurrency` in flight. Returns a structured report.
+        """
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def one(url):
+            async with slots:
+                return await self.audit_url(url, refresh)
+
+        start = time.perf_counter()
+        endpoints = await asyncio.gather(*(one(url) for url in urls))
+        summary = {level: 0 for level in SEVERITY}
+        for endpoint in endpoints:
+            summary[endpoint["result"]] += 1
+        return {
+            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - start, 2),
+            "summary": summary,
+            "endpoints": sorted(endpoints, key=lambda e: (-SEVERITY[e["result"]], e["url"])),
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+# Test-server header profiles: /good/*, /weak/*, /missing/*
+FIXTURE_PROFILES = {
+    "good": {
+        "Strict-Transport-Security": "max-age=63072000; includeSubDomains; preload",
+        "Content-Security-Policy": "default-src 'self'; object-src 'none'; frame-ancestors 'none'; base-uri 'self'",
+        "X-Frame-Options": "DENY",
+        "X-Content-Type-Options": "nosniff",
+    },
+    "weak": {
+        "Strict-Transport-Security": "max-age=300",
+        "Content-Security-Policy": "default-src *; script-src 'self' 'unsafe-inline'",
+        "X-Frame-Options": "ALLOW-FROM https://partner.example",
+        "X-Content-Type-Options": "nosniff",
+        "Server": "nginx/1.18.0",
+    },
+    "missing": {},
+}
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server_version = "fixture"
+    sys_version = ""
+    delay = 0.0
+
+    def do_HEAD(self):
+        if self.delay:
+            time.sleep(self.delay)
+        profile = FIXTURE_PROFILES.get(self.path.strip("/").split("/")[0])
+        self.send_response(200 if profile is not None else 404)
+        for name, value in (profile or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_HEAD
+
+    def log_message(self, *args):
+        pass
+
+
+def _self_signed_context(directory):
+    """
+    Server and client SSL contexts for a throwaway localhost CA-less cert (needs `cryptography`).
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=90))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "fixture.pem")
+    key_path = os.path.join(directory, "fixture.key")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_ctx.load_cert_chain(cert_path, key_path)
+    return server_ctx, cert_path
+
+
+def run_fixture_server(https=True, delay=0.0, legacy_tls=False):
+    """
+    Offline test server on localhost serving FIXTURE_PROFILES. HTTPS uses a fresh
+    self-signed cert when `cryptography` is installed, else plain HTTP; `legacy_tls`
+    also accepts TLS 1.0/1.1.
+    Returns (server, base_url, client_ssl_context); call server.shutdown().
+    server.ca_file is the fixture cert, e.g. for REQUESTS_CA_BUNDLE.
+    """
+    handler = type("FixtureHandler", (_FixtureHandler,), {"delay": delay})
+    server_cls = type("FixtureServer", (ThreadingHTTPServer,), {"request_queue_size": 512, "daemon_threads": True})
+    server = server_cls(("127.0.0.1", 0), handler)
+    client_ctx = server.ca_file = None
+    if https:
+        try:
+            server_ctx, server.ca_file = _self_signed_context(tempfile.mkdtemp(prefix="pentest-fixture-"))
+            if legacy_tls:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", DeprecationWarning)
+                    server_ctx.minimum_version = ssl.TLSVersion.TLSv1
+                server_ctx.set_ciphers("ALL:@SECLEVEL=0")
+            server.socket = server_ctx.wrap_socket(server.socket, server_side=True)
+            client_ctx = ssl.create_default_context(cafile=server.ca_file)
+        except ImportError:
+            https = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    scheme = "https" if https else "http"
+    return server, f"{scheme}://localhost:{server.server_address[1]}", client_ctx
+
+
+def benchmark(endpoints=300, delay=0.05, concurrency=20):
+    """
+    Fixture fleet with `delay` s per response: sequential check_headers vs HeaderAuditor (cold, then cached).
+    The fixture shares this process, so concurrency stays modest to keep its threads off the client's GIL.
+    """
+    server, base, client_ctx = run_fixture_server(delay=delay)
+    profiles = list(FIXTURE_PROFILES)
+    urls = [f"{base}/{profiles[i % len(profiles)]}/{i}" for i in range(endpoints)]
+
+    if server.ca_file:
+        os.environ["REQUESTS_CA_BUNDLE"] = server.ca_file  # let check_headers trust the fixture cert
+    sample = urls[:20]
+    start = time.perf_counter()
+    for url in sample:
+        check_headers(url)
+    sequential = (time.perf_counter() - start) / len(sample) * endpoints
+
+    async def main():
+        async with HeaderAuditor(concurrency=concurrency, ssl_context=client_ctx) as auditor:
+            cold = await auditor.audit(urls)
+            warm = await auditor.audit(urls)
+            return cold, warm
+
+    cold, warm = asyncio.run(main())
+    server.shutdown()
+    print(f"{endpoints} endpoints @ {delay * 1000:.0f} ms: check_headers ~{sequential:.1f}s (estimated), "
+          f"HeaderAuditor {cold['seconds']:.2f}s cold, {warm['seconds']:.3f}s cached")
+    print("summary:", cold["summary"])
+    for endpoint in cold["endpoints"][:1] + cold["endpoints"][-1:]:
+        print(json.dumps({k: endpoint[k] for k in ("url", "result", "tls", "findings")}, indent=2))
+
 if __name__ == "__main__":
     print(f"Missing Headers on Google: {check_headers('https://google.com')}")
+
+    if "--bench" in sys.argv:
+        benchmark()
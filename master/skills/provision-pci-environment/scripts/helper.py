@@ -1,4 +1,9 @@
+import bisect
+import heapq
 import ipaddress
+import sys
+import time
+from itertools import islice
 
 def check_cidr_overlap(network1, network2):
     """
@@ -8,14 +13,214 @@ def check_cidr_overlap(network1, network2):
     n2 = ipaddress.ip_network(network2)
     return n1.overlaps(n2)
 
-def generate_subnets(vpc_cidr, count=3):
+def generate_subnets(vpc_cidr, count=3, prefixlen_diff=8):
     """
     Generate subnets from a VPC CIDR.
     """
     vpc = ipaddress.ip_network(vpc_cidr)
-    return list(vpc.subnets(prefixlen_diff=8))[:count]
+    return list(islice(vpc.subnets(prefixlen_diff=prefixlen_diff), count))
+
+def iter_hosts(targets):
+    """
+    Lazily expand CIDRs / addresses to host addresses.
+    """
+    for target in targets:
+        network = ipaddress.ip_network(target, strict=False)
+        if network.num_addresses <= 2:
+            yield from network  # /31, /32 (and v6 /127, /128): every address is a host
+        else:
+            yield from network.hosts()
+
+def _as_network(value):
+    if isinstance(value, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        return value
+    return ipaddress.ip_network(value, strict=False)
+
+def _range(network):
+    # broadcast_address is a cached property that re-parses; bit math is much cheaper
+    start = int(network.network_address)
+    return network.version, start, start | ((1 << (network.max_prefixlen - network.prefixlen)) - 1)
+
+class CIDRIndex:
+    """
+    Sorted interval index over CIDRs (v4 and v6). CIDR blocks either nest or are
+    disjoint, so one sort plus a containment stack finds every overlap.
+    """
+
+    def __init__(self, networks):
+        entries = []
+        for value in networks:
+            network = _as_network(value)
+            version, start, end = _range(network)
+            entries.append((version, start, network.prefixlen, end, network))
+        entries.sort(key=lambda e: e[:3])
+        self.entries = entries
+        self.networks = [e[4] for e in entries]
+        self.keys = [e[:3] for e in entries]
+        self.present = {e[:3] for e in entries}
+
+    def __len__(self):
+        return len(self.networks)
+
+    def overlaps(self):
+        """
+        All (outer, inner) overlapping pairs in O(N log N + pairs).
+        """
+        pairs = []
+        stack = []
+        for entry in self.entries:
+            version, start, _, _, network = entry
+            while stack and (stack[-1][0] != version or stack[-1][3] < start):
+                stack.pop()
+            if stack:
+                pairs.extend((outer[4], network) for outer in stack)
+            stack.append(entry)
+        return pairs
+
+    def overlapping_networks(self):
+        return sorted({n for pair in self.overlaps() for n in pair},
+                      key=lambda n: (n.version, int(n.network_address), n.prefixlen))
+
+    def query(self, network):
+        """
+        Indexed networks overlapping `network`: its supernets, then everything inside it.
+        """
+        network = _as_network(network)
+        version, start, end = _range(network)
+        found = []
+        # 1. Supernets: at most one candidate per shorter prefix length
+        for prefixlen in range(network.prefixlen):
+            supernet = network.supernet(new_prefix=prefixlen)
+            if (version, int(supernet.network_address), prefixlen) in self.present:
+                found.append(supernet)
+        # 2. Equal or contained: contiguous run from (network_address, prefixlen); supernets
+        #    sharing the start address sort before it and were found above
+        i = bisect.bisect_left(self.keys, (version, start, network.prefixlen))
+        while i < len(self.networks) and self.keys[i][:2] <= (version, end):
+            found.append(self.networks[i])
+            i += 1
+        return found
+
+class SubnetPlanner:
+    """
+    Buddy allocator over a supernet. Free space is kept as aligned blocks per
+    prefix length, so nothing is enumerated: allocate() splits the smallest
+    free block that fits (lowest address first) in O(prefix bits).
+    """
+
+    def __init__(self, supernet, reserved=()):
+        self.supernet = ipaddress.ip_network(supernet)
+        self.max_prefixlen = self.supernet.max_prefixlen
+        self.free = {p: [] for p in range(self.supernet.prefixlen, self.max_prefixlen + 1)}
+        self.allocated = []
+
+        # 1. Free blocks are the gaps between (collapsed) reserved ranges
+        version, low, high = _range(self.supernet)
+        taken = [ipaddress.ip_network(r, strict=False) for r in reserved]
+        taken = ipaddress.collapse_addresses(n for n in taken if n.version == version and n.overlaps(self.supernet))
+        cursor = low
+        for network in taken:
+            _, start, end = _range(network)
+            self._add_free_range(cursor, start - 1)
+            cursor = max(cursor, end + 1)
+        self._add_free_range(cursor, high)
+
+    def _add_free_range(self, first, last):
+        if first > last:
+            return
+        address = ipaddress.ip_address
+        for block in ipaddress.summarize_address_range(address(first), address(last)):
+            heapq.heappush(self.free[block.prefixlen], int(block.network_address))
+
+    def allocate(self, prefixlen):
+        for size in range(prefixlen, self.supernet.prefixlen - 1, -1):
+            if self.free[size]:
+                start = heapq.heappop(self.free[size])
+                break
+        else:
+            raise ValueError(f"No free /{prefixlen} left in {self.supernet}")
+        # Split down, returning each upper half to the free lists
+        while size < prefixlen:
+            size += 1
+            heapq.heappush(self.free[size], start + (1 << (self.max_prefixlen - size)))
+        network = ipaddress.ip_network((start, prefixlen))
+        self.allocated.append(network)
+        return network
+
+    def free_addresses(self):
+        return sum(len(blocks) << (self.max_prefixlen - p) for p, blocks in self.free.items())
+
+# 3-tier PCI layout (SKILL.md): tier -> subnet prefix, one subnet per AZ
+PCI_TIERS = [("public", 24), ("private", 24), ("isolated", 24)]
+
+def plan_environment(accounts, supernet="10.0.0.0/8", vpc_prefix=16, tier_prefix=20,
+                     tiers=PCI_TIERS, azs=("a", "b"), reserved=()):
+    """
+    Non-overlapping multi-account plan: one VPC per account, one aligned block per
+    tier inside it (one NACL boundary per tier), one subnet per AZ inside that.
+    """
+    planner = SubnetPlanner(supernet, reserved)
+    plan = {}
+    for account in accounts:
+        vpc = planner.allocate(vpc_prefix)
+        vpc_planner = SubnetPlanner(vpc)
+        layout = {}
+        for tier, subnet_prefix in tiers:
+            block = vpc_planner.allocate(tier_prefix)
+            tier_planner = SubnetPlanner(block)
+            layout[tier] = {"block": str(block),
+                            "subnets": {az: str(tier_planner.allocate(subnet_prefix)) for az in azs}}
+        plan[account] = {"vpc": str(vpc), "tiers": layout}
+
+    # Only planned vs reserved: reserved ranges may legitimately nest or overlap each other
+    index = CIDRIndex(reserved)
+    clashes = [(taken, vpc) for vpc in plan.values() for taken in index.query(vpc["vpc"])]
+    if clashes:
+        raise ValueError(f"Plan overlaps existing networks: {[(str(a), str(b)) for a, b in clashes[:5]]}")
+    return plan
+
+def benchmark(networks=200_000, seed=9):
+    """
+    Lazy vs materialized subnetting, CIDRIndex vs pairwise overlap checks, plan size.
+    """
+    import random
+
+    start = time.perf_counter()
+    list(ipaddress.ip_network("10.0.0.0/8").subnets(prefixlen_diff=16))[:3]
+    eager = time.perf_counter() - start
+    start = time.perf_counter()
+    generate_subnets("10.0.0.0/8", prefixlen_diff=16)
+    lazy = time.perf_counter() - start
+    print(f"/8 -> first 3 of 65,536 /24s: list() {eager * 1000:.0f} ms, lazy {lazy * 1000:.3f} ms")
+
+    rng = random.Random(seed)
+    nets = []
+    for _ in range(networks):
+        prefixlen = rng.randint(16, 28)
+        nets.append(ipaddress.ip_network((rng.getrandbits(24) << 8 | 10 << 24, prefixlen), strict=False))
+    start = time.perf_counter()
+    index = CIDRIndex(nets)
+    pairs = index.overlaps()
+    indexed = time.perf_counter() - start
+
+    sample = 200_000
+    start = time.perf_counter()
+    for _ in range(sample):
+        rng.choice(nets).overlaps(rng.choice(nets))
+    per_pair = (time.perf_counter() - start) / sample
+    pairwise = per_pair * networks * (networks - 1) / 2
+    print(f"{networks:,} CIDRs: CIDRIndex {indexed:.2f}s ({len(pairs):,} overlapping pairs), "
+          f"pairwise check_cidr_overlap ~{pairwise / 3600:.1f}h (estimated)")
+
+    start = time.perf_counter()
+    plan = plan_environment([f"pci-{i:03d}" for i in range(200)], reserved=["10.0.0.0/16", "10.128.0.0/12"])
+    print(f"plan for {len(plan)} accounts in {(time.perf_counter() - start) * 1000:.0f} ms; "
+          f"first: {plan['pci-000']}")
 
 if __name__ == "__main__":
     vpc = "10.0.0.0/16"
     subnets = generate_subnets(vpc)
     print(f"Subnets for {vpc}: {[str(s) for s in subnets]}")
+
+    if "--bench" in sys.argv:
+        benchmark()
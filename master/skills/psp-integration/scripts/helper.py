@@ -1,19 +1,315 @@
+import abc
+import importlib
+import os
+import sys
+import threading
+import time
+
 class PaymentAdapter:
-    def authorize(self, amount): pass
+    def authorize(self, amount, idempotency_key=None): pass
+    def void(self, authorization, idempotency_key=None): pass
 
 class StripeAdapter(PaymentAdapter):
-    def authorize(self, amount):
+    def authorize(self, amount, idempotency_key=None):
         print(f"Stripe Charging {amount}")
+        return {"psp": "stripe", "status": "AUTHORIZED", "amount": amount}
 
 class AdyenAdapter(PaymentAdapter):
-    def authorize(self, amount):
+    def authorize(self, amount, idempotency_key=None):
         print(f"Adyen Charging {amount}")
+        return {"psp": "adyen", "status": "AUTHORIZED", "amount": amount}
+
+
+ENTRY_POINT_GROUP = "payment_orchestrator.psp_adapters"
+
+
+class AsyncPaymentAdapter(abc.ABC):
+    """
+    Async IPaymentProvider contract. One instance per PSP is shared by every request
+    in a worker and owns that PSP's connection pool. Amounts are in minor units.
+    Responses carry a TransactionStatus: AUTHORIZED, COMPLETED, DECLINED, CANCELLED.
+    Technical failures (network, 5xx) raise.
+    """
+
+    name = None
+
+    @abc.abstractmethod
+    async def authorize(self, amount, currency="USD", idempotency_key=None, **details):
+        pass
+
+    @abc.abstractmethod
+    async def capture(self, authorization, amount=None, idempotency_key=None):
+        pass
+
+    @abc.abstractmethod
+    async def refund(self, payment, amount=None, idempotency_key=None):
+        pass
+
+    @abc.abstractmethod
+    async def void(self, authorization, idempotency_key=None):
+        pass
+
+    async def close(self):
+        pass
+
+
+class HTTPPaymentAdapter(AsyncPaymentAdapter):
+    """
+    Pooled httpx client, created (and httpx imported) on first use.
+    """
+
+    def __init__(self, base_url, headers, max_connections=50, connect_timeout=3.05, read_timeout=30,
+                 transport=None):
+        self.base_url = base_url
+        self.headers = headers
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.transport = transport
+        self.client = None
+
+    def _client(self):
+        if self.client is None:
+            import httpx
+
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                transport=self.transport,
+            )
+        return self.client
+
+    async def _post(self, path, idempotency_key=None, **kwargs):
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+        return await self._client().post(path, headers=headers, **kwargs)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+class StripeAsyncAdapter(HTTPPaymentAdapter):
+    """
+    Stripe PaymentIntents with manual capture.
+    """
+
+    name = "stripe"
+
+    def __init__(self, api_key=None, base_url="https://api.stripe.com", **pool):
+        api_key = api_key or os.environ.get("STRIPE_API_KEY", "")
+        super().__init__(base_url, {"Authorization": f"Bearer {api_key}"}, **pool)
+
+    def _result(self, response, amount=None):
+        if response.status_code == 402:
+            error = response.json().get("error", {})
+            return {"psp": self.name, "status": "DECLINED", "id": error.get("payment_intent", {}).get("id"),
+                    "decline_code": error.get("decline_code") or error.get("code")}
+        # Status first: a 5xx from a proxy is usually an HTML page, not JSON
+        response.raise_for_status()
+        body = response.json()
+        status = {"requires_capture": "AUTHORIZED", "succeeded": "COMPLETED", "canceled": "CANCELLED"}
+        return {"psp": self.name, "status": status.get(body.get("status"), "PENDING"), "id": body["id"],
+                "amount": body.get("amount", amount)}
+
+    async def authorize(self, amount, currency="USD", idempotency_key=None, **details):
+        payment_method = details.get("payment_method")
+        if not payment_method:
+            raise ValueError("Stripe authorize needs a payment_method (e.g. payment_method='pm_card_visa')")
+        response = await self._post("/v1/payment_intents", idempotency_key, data={
+            "amount": amount, "currency": currency.lower(), "payment_method": payment_method,
+            "capture_method": "manual", "confirm": "true",
+        })
+        return self._result(response, amount)
+
+    async def capture(self, authorization, amount=None, idempotency_key=None):
+        data = {"amount_to_capture": amount} if amount is not None else {}
+        response = await self._post(f"/v1/payment_intents/{authorization['id']}/capture", idempotency_key, data=data)
+        return self._result(response, amount)
+
+    async def refund(self, payment, amount=None, idempotency_key=None):
+        data = {"payment_intent": payment["id"]}
+        if amount is not None:
+            data["amount"] = amount
+        response = await self._post("/v1/refunds", idempotency_key, data=data)
+        response.raise_for_status()
+        body = response.json()
+        return {"psp": self.name, "status": "COMPLETED" if body.get("status") == "succeeded" else "PENDING",
+                "id": body["id"], "amount": body.get("amount")}
+
+    async def void(self, authorization, idempotency_key=None):
+        response = await self._post(f"/v1/payment_intents/{authorization['id']}/cancel", idempotency_key)
+        return self._result(response)
+
+
+class AdyenAsyncAdapter(HTTPPaymentAdapter):
+    """
+    Adyen Checkout API (v71) with manual capture.
+    """
+
+    name = "adyen"
+
+    def __init__(self, api_key=None, merchant_account=None, base_url="https://checkout-test.adyen.com/v71", **pool):
+        api_key = api_key or os.environ.get("ADYEN_API_KEY", "")
+        self.merchant_account = merchant_account or os.environ.get("ADYEN_MERCHANT_ACCOUNT", "")
+        super().__init__(base_url, {"X-API-Key": api_key}, **pool)
+
+    async def _modify(self, path, idempotency_key, payload):
+        payload["merchantAccount"] = self.merchant_account
+        response = await self._post(path, idempotency_key, json=payload)
+        response.raise_for_status()
+        # Modifications are asynchronous at Adyen: "received" now, final outcome by webhook
+        return {"psp": self.name, "status": "PENDING", "id": response.json()["pspReference"]}
+
+    async def authorize(self, amount, currency="USD", idempotency_key=None, **details):
+        response = await self._post("/payments", idempotency_key, json={
+            "amount": {"value": amount, "currency": currency.upper()},
+            "merchantAccount": self.merchant_account,
+            "reference": idempotency_key or f"auth-{time.time_ns()}",
+            "paymentMethod": details.get("payment_method") or {"type": "scheme"},
+            "additionalData": {"manualCapture": "true"},
+        })
+        response.raise_for_status()
+        body = response.json()
+        status = {"Authorised": "AUTHORIZED", "Refused": "DECLINED", "Cancelled": "CANCELLED"}
+        return {"psp": self.name, "status": status.get(body.get("resultCode"), "PENDING"),
+                "id": body.get("pspReference"), "amount": amount, "currency": currency.upper(),
+                "decline_code": body.get("refusalReasonCode")}
+
+    async def capture(self, authorization, amount=None, idempotency_key=None):
+        value = authorization["amount"] if amount is None else amount
+        return await self._modify(f"/payments/{authorization['id']}/captures", idempotency_key,
+                                  {"amount": {"value": value, "currency": authorization.get("currency", "USD")}})
+
+    async def refund(self, payment, amount=None, idempotency_key=None):
+        value = payment["amount"] if amount is None else amount
+        return await self._modify(f"/payments/{payment['id']}/refunds", idempotency_key,
+                                  {"amount": {"value": value, "currency": payment.get("currency", "USD")}})
+
+    async def void(self, authorization, idempotency_key=None):
+        return await self._modify(f"/payments/{authorization['id']}/cancels", idempotency_key, {})
+
+
+def _resolve(target):
+    # "package.module:Factory" and entry points are imported only when first requested
+    if isinstance(target, str):
+        module_name, _, attr = target.partition(":")
+        return getattr(importlib.import_module(module_name), attr)
+    if hasattr(target, "load"):
+        return target.load()
+    return target
+
+
+class AdapterRegistry:
+    """
+    Name -> adapter factory. Factories may be classes, "module:attr" strings, or
+    entry points in ENTRY_POINT_GROUP; nothing is imported until get() needs it.
+    get() returns one shared (pooled) instance per name.
+    """
+
+    def __init__(self, group=ENTRY_POINT_GROUP):
+        self.group = group
+        self.targets = {}
+        self.instances = {}
+        self.lock = threading.Lock()
+        self.discovered = False
+
+    def register(self, name, target, **config):
+        with self.lock:
+            self.targets[name] = (target, config)
+            self.instances.pop(name, None)
+
+    def discover(self):
+        """
+        Index installed entry points without importing them. Explicit registrations win.
+        """
+        import importlib.metadata
+
+        with self.lock:
+            if self.discovered:
+                return
+            for entry_point in importlib.metadata.entry_points(group=self.group):
+                self.targets.setdefault(entry_point.name, (entry_point, {}))
+            self.discovered = True
+
+    def names(self):
+        self.discover()
+        return sorted(self.targets)
+
+    def loaded(self):
+        return sorted(self.instances)
+
+    def get(self, name):
+        instance = self.instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self.targets:
+            self.discover()  # scanning installed distributions is the slow part; skip it when we can
+        with self.lock:
+            if name not in self.instances:
+                if name not in self.targets:
+                    raise ValueError("Unknown Provider")
+                target, config = self.targets[name]
+                self.instances[name] = _resolve(target)(**config)
+            return self.instances[name]
+
+    async def aclose(self):
+        with self.lock:
+            instances, self.instances = list(self.instances.values()), {}
+        for instance in instances:
+            close = getattr(instance, "close", None)
+            result = close() if close is not None else None
+            if hasattr(result, "__await__"):
+                await result
+
+
+REGISTRY = AdapterRegistry()
+REGISTRY.register("stripe", StripeAsyncAdapter)
+REGISTRY.register("adyen", AdyenAsyncAdapter)
+
 
 def get_provider(name):
     if name == "stripe": return StripeAdapter()
     if name == "adyen": return AdyenAdapter()
     raise ValueError("Unknown Provider")
 
+
+def get_async_provider(name):
+    """
+    Shared async adapter (one connection pool per PSP per worker).
+    """
+    return REGISTRY.get(name)
+
+
+def benchmark(runs=5):
+    """
+    Worker startup: load this module + resolve an adapter, vs importing httpx eagerly.
+    """
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    cases = {
+        "interpreter only": "pass",
+        "registry get (lazy)": "import helper; helper.get_async_provider('stripe')",
+        "registry get + first client": "import helper; helper.get_async_provider('stripe')._client()",
+        "import httpx (eager)": "import httpx",
+    }
+    for label, code in cases.items():
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=here, check=True)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:<28} {min(timings) * 1000:7.1f} ms (best of {runs})")
+
 if __name__ == "__main__":
     p = get_provider("stripe")
     p.authorize(100)
+
+    print(REGISTRY.names(), get_async_provider("stripe") is get_async_provider("stripe"), REGISTRY.loaded())
+
+    if "--bench" in sys.argv:
+        benchmark()
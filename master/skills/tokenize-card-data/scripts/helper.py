@@ -1,5 +1,20 @@
 import uuid
 import base64
+import hashlib
+import hmac
+import mmap
+import os
+import secrets
+import struct
+import sys
+import threading
+import time
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # CardVault needs `cryptography`; the mock vault does not
+    AESGCM = None
 
 # Mock Vault DB
 vault_db = {}
@@ -34,8 +49,346 @@ def detokenize(token_id):
         return None
     return base64.b64decode(blob).decode()
 
+SEGMENT_MAGIC = b"PVS1"
+KEK_ID_SIZE = 32
+# magic | kek_id (null padded) | nonce | wrapped DEK (32 + 16 tag)
+HEADER = struct.Struct(f">4s{KEK_ID_SIZE}s12s48s")
+# length of the rest | token | PAN fingerprint | nonce, then ciphertext
+RECORD = struct.Struct(">I20s32s12s")
+TOKEN_PREFIX = "tok_"
+
+
+def check_kek_id(kek_id):
+    if len(kek_id.encode()) > KEK_ID_SIZE:
+        raise ValueError(f"kek_id longer than {KEK_ID_SIZE} bytes: {kek_id!r}")
+
+
+def write_all(fd, data):
+    """
+    os.write until every byte is written (a single write may be short).
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def rewrite_header(seg_path, header):
+    """
+    Replace a segment's header in place, crash-safe: the new header is made
+    durable in a `.header` journal first, so a torn in-place write is repaired
+    by restore_header() instead of leaving the only wrapped DEK unreadable.
+    """
+    journal = f"{seg_path}.header"
+    with open(f"{journal}.tmp", "wb") as f:
+        f.write(header)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{journal}.tmp", journal)
+    fsync_dir(os.path.dirname(seg_path) or ".")
+    restore_header(seg_path)
+
+
+def restore_header(seg_path):
+    """
+    Finish an interrupted rewrite_header(): copy the journaled header into the
+    segment and drop the journal. No-op when there is no journal.
+    The vault and a rotation worker may both finish the same journal; whoever
+    loses the race finds it gone, which is fine since both write the same header.
+    """
+    journal = f"{seg_path}.header"
+    try:
+        os.unlink(f"{journal}.tmp")  # crashed before the journal was complete; segment untouched
+    except FileNotFoundError:
+        pass
+    try:
+        with open(journal, "rb") as f:
+            header = f.read()
+    except FileNotFoundError:
+        return False
+    fd = os.open(seg_path, os.O_WRONLY)
+    try:
+        view = memoryview(header)
+        offset = 0
+        while offset < len(view):
+            offset += os.pwrite(fd, view[offset:], offset)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    try:
+        os.unlink(journal)
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def wrap_dek(kek, kek_id, dek, segment_name):
+    nonce = os.urandom(12)
+    return HEADER.pack(SEGMENT_MAGIC, kek_id.encode(), nonce,
+                       AESGCM(kek).encrypt(nonce, dek, segment_name.encode()))
+
+
+def unwrap_dek(keks, header, segment_name):
+    magic, kek_id, nonce, wrapped = HEADER.unpack(header)
+    if magic != SEGMENT_MAGIC:
+        raise ValueError(f"{segment_name}: not a vault segment")
+    kek_id = kek_id.rstrip(b"\0").decode()
+    return kek_id, AESGCM(keks[kek_id]).decrypt(nonce, wrapped, segment_name.encode())
+
+
+class CardVault:
+    """
+    PAN vault with envelope encryption and an append-only segmented store.
+
+    Each segment file gets its own AES-256-GCM data key (DEK), wrapped by the
+    key-encryption key (KEK) in the segment header. Records hold the token, a
+    keyed-HMAC PAN fingerprint and the GCM ciphertext (token as AAD), so the
+    token and fingerprint indexes are rebuilt on open without decrypting.
+    Segments are read through mmap. Tokens are only returned once their
+    records are on disk (fsync per batch unless durable=False).
+    """
+
+    def __init__(self, path, keks, active_kek_id, fingerprint_key, segment_size=64 * 2**20):
+        if AESGCM is None:
+            raise ImportError("CardVault requires the 'cryptography' package")
+        for kek_id in keks:
+            check_kek_id(kek_id)
+        if active_kek_id not in keks:
+            raise KeyError(f"Unknown active_kek_id {active_kek_id}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.keks = dict(keks)
+        self.active_kek_id = active_kek_id
+        self.fingerprint_key = fingerprint_key
+        self.segment_size = segment_size
+        self.lock = threading.Lock()      # appends and index updates
+        self.map_lock = threading.Lock()  # mmap / DEK caches on the read path
+
+        self.by_fingerprint = {}  # fingerprint -> token
+        self.by_token = {}        # token -> (segment_no, offset, length)
+        self.ciphers = {}         # segment_no -> AESGCM(dek)
+        self.maps = {}            # segment_no -> mmap
+
+        segments = sorted(int(name[:-4]) for name in os.listdir(path) if name.endswith(".seg"))
+        for seg_no in segments:
+            self._load_segment(seg_no)
+        self.active = segments[-1] if segments else None
+        if self.active is None:
+            self._new_segment(0)
+        self.fh = open(self._segment_path(self.active), "ab", buffering=0)
+
+    def _segment_path(self, seg_no):
+        return os.path.join(self.path, f"{seg_no:08d}.seg")
+
+    def _new_segment(self, seg_no):
+        dek = AESGCM.generate_key(bit_length=256)
+        with open(self._segment_path(seg_no), "xb") as f:
+            f.write(wrap_dek(self.keks[self.active_kek_id], self.active_kek_id, dek, f"{seg_no:08d}"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.ciphers[seg_no] = AESGCM(dek)
+        self.active = seg_no
+
+    def _load_segment(self, seg_no):
+        seg_path = self._segment_path(seg_no)
+        restore_header(seg_path)
+        with open(seg_path, "rb") as f:
+            data = f.read()
+        _, dek = unwrap_dek(self.keks, data[:HEADER.size], f"{seg_no:08d}")
+        self.ciphers[seg_no] = AESGCM(dek)
+
+        offset = HEADER.size
+        while offset + RECORD.size <= len(data):
+            length, token, fingerprint, _ = RECORD.unpack_from(data, offset)
+            if offset + 4 + length > len(data):
+                break
+            token = token.decode()
+            self.by_token[token] = (seg_no, offset, 4 + length)
+            self.by_fingerprint[fingerprint] = token
+            offset += 4 + length
+
+        if offset < len(data):
+            # Torn write at the tail (crash mid-append): drop it
+            with open(seg_path, "r+b") as f:
+                f.truncate(offset)
+
+    def add_kek(self, kek_id, kek, activate=False):
+        """
+        Register a new KEK (before a rotation job rewraps segments onto it).
+        """
+        check_kek_id(kek_id)
+        self.keks = {**self.keks, kek_id: kek}
+        if activate:
+            self.active_kek_id = kek_id
+
+    def reload_segment(self, seg_no):
+        """
+        Re-read a segment's DEK after it was re-encrypted by a key rotation job.
+        """
+        with open(self._segment_path(seg_no), "rb") as f:
+            _, dek = unwrap_dek(self.keks, f.read(HEADER.size), f"{seg_no:08d}")
+        with self.map_lock:
+            self.maps.pop(seg_no, None)
+            self.ciphers[seg_no] = AESGCM(dek)
+
+    def fingerprint(self, pan):
+        return hmac.new(self.fingerprint_key, pan.encode(), hashlib.sha256).digest()
+
+    def _encode(self, token, fingerprint, pan):
+        cipher = self.ciphers[self.active]
+        nonce = os.urandom(12)
+        ciphertext = cipher.encrypt(nonce, pan.encode(), token.encode())
+        return RECORD.pack(RECORD.size - 4 + len(ciphertext), token.encode(), fingerprint, nonce) + ciphertext
+
+    def tokenize_many(self, pans, durable=True):
+        """
+        Tokenize PANs; a PAN already in the vault returns its existing token.
+        Each batch is encrypted, appended and fsynced once (group commit); the
+        indexes only learn about new records after they are written.
+        """
+        fingerprints = [self.fingerprint(pan) for pan in pans]
+        results = []
+        with self.lock:
+            fd = self.fh.fileno()
+            start = os.fstat(fd).st_size
+            if start >= self.segment_size:
+                self.fh.close()
+                self._new_segment(self.active + 1)
+                self.fh = open(self._segment_path(self.active), "ab", buffering=0)
+                fd = self.fh.fileno()
+                start = os.fstat(fd).st_size
+
+            chunks = []
+            pending = {}    # fingerprint -> new token
+            locations = {}  # new token -> (segment_no, offset, length)
+            offset = start
+            for pan, fp in zip(pans, fingerprints):
+                token = self.by_fingerprint.get(fp) or pending.get(fp)
+                if token is None:
+                    token = f"{TOKEN_PREFIX}{secrets.token_hex(8)}"
+                    while token in self.by_token or token in locations:
+                        token = f"{TOKEN_PREFIX}{secrets.token_hex(8)}"
+                    record = self._encode(token, fp, pan)
+                    locations[token] = (self.active, offset, len(record))
+                    pending[fp] = token
+                    chunks.append(record)
+                    offset += len(record)
+                results.append({"token": token, "last4": pan[-4:], "bin": pan[:6]})
+
+            if chunks:
+                try:
+                    write_all(fd, b"".join(chunks))
+                    if durable:
+                        os.fsync(fd)
+                except BaseException:
+                    # Cut the partial batch off so the next append starts on a record boundary
+                    os.ftruncate(fd, start)
+                    raise
+            self.by_token.update(locations)
+            self.by_fingerprint.update(pending)
+        return results
+
+    def tokenize(self, pan, durable=True):
+        return self.tokenize_many([pan], durable)[0]
+
+    def _record(self, seg_no, offset, length):
+        mm = self.maps.get(seg_no)
+        if mm is None or offset + length > len(mm):
+            with self.map_lock:
+                mm = self.maps.get(seg_no)
+                if mm is None or offset + length > len(mm):
+                    with open(self._segment_path(seg_no), "rb") as f:
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    # The old map is left to GC: a concurrent reader may still hold it
+                    self.maps[seg_no] = mm
+        return mm[offset:offset + length]
+
+    def detokenize_many(self, tokens):
+        """
+        Decrypt PANs for tokens (None for unknown tokens).
+        """
+        pans = []
+        for token in tokens:
+            location = self.by_token.get(token)
+            if location is None:
+                pans.append(None)
+                continue
+            try:
+                pan = self._decrypt(location)
+            except InvalidTag:
+                # Segment was re-encrypted under a new DEK since it was loaded
+                self.reload_segment(location[0])
+                pan = self._decrypt(location)
+            pans.append(pan.decode())
+        return pans
+
+    def _decrypt(self, location):
+        record = self._record(*location)
+        _, token_bytes, _, nonce = RECORD.unpack_from(record)
+        return self.ciphers[location[0]].decrypt(nonce, record[RECORD.size:], token_bytes)
+
+    def detokenize(self, token_id):
+        return self.detokenize_many([token_id])[0]
+
+    def flush(self):
+        os.fsync(self.fh.fileno())
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.fh.close()
+        with self.map_lock:
+            for mm in self.maps.values():
+                mm.close()
+            self.maps.clear()
+
+    def __len__(self):
+        return len(self.by_token)
+
+
+def benchmark(n=1_000_000, batch=10_000, path="/tmp/vault-bench"):
+    """
+    Card-on-file migration style bulk tokenize / detokenize throughput.
+    """
+    import random
+    import shutil
+
+    shutil.rmtree(path, ignore_errors=True)
+    rng = random.Random(7)
+    pans = [f"4{rng.randrange(10**14, 10**15)}" for _ in range(n)]
+    pans[::10] = pans[1::10][:len(pans[::10])]  # ~10% duplicates
+
+    vault = CardVault(path, {"kek-1": AESGCM.generate_key(bit_length=256)}, "kek-1", secrets.token_bytes(32))
+    start = time.perf_counter()
+    tokens = []
+    for i in range(0, n, batch):
+        tokens.extend(r["token"] for r in vault.tokenize_many(pans[i:i + batch]))
+    vault.flush()
+    elapsed = time.perf_counter() - start
+    print(f"tokenize_many:   {n / elapsed:,.0f} PANs/s, {len(vault):,} vault entries for {n:,} PANs")
+
+    start = time.perf_counter()
+    out = []
+    for i in range(0, n, batch):
+        out.extend(vault.detokenize_many(tokens[i:i + batch]))
+    elapsed = time.perf_counter() - start
+    assert out == pans
+    print(f"detokenize_many: {n / elapsed:,.0f} PANs/s")
+    vault.close()
+    shutil.rmtree(path, ignore_errors=True)
+
 # Test
 if __name__ == "__main__":
     res = tokenize("4111111111111111")
     print(res)
     print(f"Detokenized: {detokenize(res['token'])}")
+
+    if "--bench" in sys.argv:
+        benchmark()
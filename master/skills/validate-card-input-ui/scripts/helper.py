@@ -1,3 +1,11 @@
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # Bulk validation falls back to the scalar path
+    np = None
+
 def luhn_check(card_number):
     """
     Validate card number using Luhn algorithm.
@@ -18,5 +26,148 @@ def luhn_check(card_number):
         
     return (checksum % 10) == 0
 
+# (brand, prefix digits, low, high, valid lengths); first match wins, so
+# narrower ranges come before the broad ones they overlap
+BRAND_RANGES = [
+    ("amex", 2, 34, 34, (15,)),
+    ("amex", 2, 37, 37, (15,)),
+    ("mir", 4, 2200, 2204, (16, 17, 18, 19)),
+    ("mastercard", 4, 2221, 2720, (16,)),
+    ("diners", 3, 300, 305, (14, 15, 16, 17, 18, 19)),
+    ("diners", 2, 36, 36, (14, 15, 16, 17, 18, 19)),
+    ("diners", 2, 38, 39, (14, 15, 16, 17, 18, 19)),
+    ("jcb", 4, 3528, 3589, (16, 17, 18, 19)),
+    ("visa", 1, 4, 4, (13, 16, 19)),
+    ("mastercard", 2, 51, 55, (16,)),
+    ("maestro", 2, 50, 50, (12, 13, 14, 15, 16, 17, 18, 19)),
+    ("maestro", 2, 56, 58, (12, 13, 14, 15, 16, 17, 18, 19)),
+    ("discover", 4, 6011, 6011, (16, 17, 18, 19)),
+    ("discover", 6, 622126, 622925, (16, 17, 18, 19)),
+    ("discover", 3, 644, 649, (16, 17, 18, 19)),
+    ("discover", 2, 65, 65, (16, 17, 18, 19)),
+    ("unionpay", 2, 62, 62, (16, 17, 18, 19)),
+    ("maestro", 4, 6304, 6304, (12, 13, 14, 15, 16, 17, 18, 19)),
+    ("maestro", 4, 6759, 6759, (12, 13, 14, 15, 16, 17, 18, 19)),
+    ("maestro", 2, 67, 67, (12, 13, 14, 15, 16, 17, 18, 19)),
+]
+
+BRANDS = ["unknown"] + sorted({r[0] for r in BRAND_RANGES})
+MAX_DIGITS = 19
+_STRIP = str.maketrans("", "", " -")
+
+
+def detect_brand(card_number):
+    """
+    Card brand from the BIN / IIN prefix.
+    """
+    digits = str(card_number).translate(_STRIP)
+    for brand, width, low, high, _ in BRAND_RANGES:
+        prefix = digits[:width]
+        if len(prefix) == width and prefix.isdigit() and low <= int(prefix) <= high:
+            return brand
+    return "unknown"
+
+
+def validate_card_number(card_number):
+    """
+    Luhn + brand + length-by-brand for one number.
+    Anything but 1-19 ASCII digits is malformed: brand "unknown", never valid.
+    """
+    digits = str(card_number).translate(_STRIP)
+    well_formed = 0 < len(digits) <= MAX_DIGITS and digits.isascii() and digits.isdigit()
+    brand = detect_brand(digits) if well_formed else "unknown"
+    lengths = next((r[4] for r in BRAND_RANGES if r[0] == brand), ())
+    luhn = well_formed and luhn_check(digits)
+    length_ok = len(digits) in lengths
+    return {"luhn": luhn, "brand": brand, "length_ok": length_ok, "valid": luhn and length_ok}
+
+
+def _digit_matrix(card_numbers):
+    """
+    Right-align numbers into an (n, 19) uint8 digit matrix (leading zeros do not change Luhn).
+    Returns (digits, lengths, well_formed).
+    """
+    cleaned = [str(c).translate(_STRIP) for c in card_numbers]
+    lengths = np.fromiter((len(c) for c in cleaned), dtype=np.int64, count=len(cleaned))
+    well_formed = (lengths > 0) & (lengths <= MAX_DIGITS)
+    padded = "".join(c.rjust(MAX_DIGITS, "0") if len(c) <= MAX_DIGITS else "0" * MAX_DIGITS for c in cleaned)
+    raw = np.frombuffer(padded.encode("ascii", "replace"), dtype=np.uint8).reshape(-1, MAX_DIGITS)
+    digits = raw - ord("0")
+    well_formed &= (digits <= 9).all(axis=1)  # uint8 wrap makes chars below '0' large too
+    return np.where(well_formed[:, None], digits, 0).astype(np.uint8), lengths, well_formed
+
+
+def validate_card_numbers(card_numbers):
+    """
+    Bulk Luhn + brand + length check over a NumPy digit matrix.
+    Returns {"luhn", "brand", "length_ok", "valid"} arrays.
+    """
+    if np is None:
+        rows = [validate_card_number(c) for c in card_numbers]
+        return {key: [row[key] for row in rows] for key in ("luhn", "brand", "length_ok", "valid")}
+
+    digits, lengths, well_formed = _digit_matrix(card_numbers)
+    n = len(lengths)
+
+    # Luhn: every second digit from the right goes through the doubling table
+    double_table = np.array([0, 2, 4, 6, 8, 1, 3, 5, 7, 9], dtype=np.uint8)
+    doubled_cols = (MAX_DIGITS - 1 - np.arange(MAX_DIGITS)) % 2 == 1
+    checksum = digits[:, ~doubled_cols].sum(axis=1, dtype=np.int64)
+    checksum += double_table[digits[:, doubled_cols]].sum(axis=1, dtype=np.int64)
+    luhn = well_formed & (checksum % 10 == 0)
+
+    # IIN: first 6 significant digits of each number
+    start = MAX_DIGITS - np.minimum(lengths, MAX_DIGITS)
+    cols = np.minimum(start[:, None] + np.arange(6), MAX_DIGITS - 1)
+    iin = (digits[np.arange(n)[:, None], cols].astype(np.int64) * (10 ** np.arange(5, -1, -1))).sum(axis=1)
+
+    brand_idx = np.zeros(n, dtype=np.int64)
+    valid_lengths = np.zeros((len(BRANDS), MAX_DIGITS + 1), dtype=bool)
+    for brand, width, low, high, brand_lengths in BRAND_RANGES:
+        b = BRANDS.index(brand)
+        valid_lengths[b, list(brand_lengths)] = True
+        prefix = iin // 10 ** (6 - width)
+        match = (brand_idx == 0) & well_formed & (lengths >= width) & (prefix >= low) & (prefix <= high)
+        brand_idx[match] = b
+
+    length_ok = valid_lengths[brand_idx, np.minimum(lengths, MAX_DIGITS)]
+    return {
+        "luhn": luhn,
+        "brand": np.array(BRANDS, dtype=object)[brand_idx],
+        "length_ok": length_ok,
+        "valid": luhn & length_ok,
+    }
+
+
+def benchmark(n=1_000_000, seed=7):
+    """
+    Scalar luhn_check vs validate_card_numbers.
+    """
+    import random
+
+    rng = random.Random(seed)
+    prefixes = ["4", "51", "2221", "34", "6011", "62", "3530"]
+    numbers = []
+    for _ in range(n):
+        prefix = rng.choice(prefixes)
+        length = 15 if prefix == "34" else 16
+        numbers.append(prefix + "".join(rng.choice("0123456789") for _ in range(length - len(prefix))))
+
+    start = time.perf_counter()
+    scalar = [luhn_check(c) for c in numbers]
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk = validate_card_numbers(numbers)
+    bulk_s = time.perf_counter() - start
+
+    assert list(bulk["luhn"]) == scalar, "bulk Luhn diverged from luhn_check"
+    print(f"luhn_check:            {n / scalar_s:,.0f} cards/s (Luhn only)")
+    print(f"validate_card_numbers: {n / bulk_s:,.0f} cards/s (Luhn + brand + length, {scalar_s / bulk_s:.1f}x)")
+
 if __name__ == "__main__":
     print(luhn_check("4242424242424242")) # Valid?
+    print(validate_card_numbers(["4242 4242 4242 4242", "378282246310005", "5555555555554443"]))
+
+    if "--bench" in sys.argv:
+        benchmark()
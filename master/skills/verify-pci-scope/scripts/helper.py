@@ -1,4 +1,11 @@
+import asyncio
+import errno
+import importlib.util
+import os
 import socket
+import sys
+import time
+from collections import defaultdict
 
 def check_port(ip, port, timeout=1):
     """
@@ -19,6 +26,242 @@ def check_port(ip, port, timeout=1):
     except Exception:
         return "ERROR"
 
+
+def _load_cidr_helper():
+    """
+    CIDR expansion lives in provision-pci-environment.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "..", "..", "provision-pci-environment", "scripts", "helper.py")
+    spec = importlib.util.spec_from_file_location("cidr_helper", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+cidr = _load_cidr_helper()
+
+# Each rule: traffic from `source` to `targets` on `ports` should be "closed"
+# (segmentation) or "open" (an allowed path that must keep working: some host in
+# `targets` answers on each port; a database /24 is rarely fully populated)
+ZONE_MATRIX = [
+    {"source": "office", "target": "cde-data", "targets": ["10.0.20.0/24", "10.0.21.0/24"], "ports": [5432, 22],
+     "expect": "closed"},
+    {"source": "office", "target": "cde-app", "targets": ["10.0.10.0/24", "10.0.11.0/24"], "ports": [8080, 22],
+     "expect": "closed"},
+    {"source": "cde-app", "target": "cde-data", "targets": ["10.0.20.0/24"], "ports": [5432], "expect": "open"},
+]
+
+
+# Connect errors that come from the network path (ICMP unreachable / admin-prohibited,
+# a REJECT rule, kernel SYN timeout): the port is not reachable, so segmentation holds.
+# Anything else (EMFILE, EADDRNOTAVAIL, ENOBUFS, ...) is a fault on the scanning host.
+BLOCKED_ERRNOS = {
+    errno.EHOSTUNREACH: "FILTERED",
+    errno.ENETUNREACH: "FILTERED",
+    errno.EACCES: "FILTERED",
+    errno.EPERM: "FILTERED",
+    errno.ETIMEDOUT: "FILTERED",
+    errno.ECONNRESET: "CLOSED",
+}
+
+
+class HostRateLimiter:
+    """
+    At most `rate` probes per second to any one host (burst of 1), so a /16 sweep
+    never hammers a single CDE box or trips its IDS rate rules.
+    """
+
+    def __init__(self, rate=10.0, clock=time.monotonic):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.clock = clock
+        self.next_slot = {}
+
+    async def acquire(self, host):
+        if not self.interval:
+            return
+        now = self.clock()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def forget(self, host, now=None):
+        # Drop hosts whose slot has passed so the table stays proportional to in-flight hosts
+        if self.next_slot.get(host, 0) <= (now if now is not None else self.clock()):
+            self.next_slot.pop(host, None)
+
+
+async def probe(ip, port, timeout=1.0):
+    """
+    One TCP connect: OPEN, CLOSED (refused/reset), FILTERED (timeout, unreachable,
+    rejected by a firewall) or ERROR (a local fault; see BLOCKED_ERRNOS).
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(str(ip), port), timeout)
+    except ConnectionRefusedError:
+        return "CLOSED"
+    except asyncio.TimeoutError:
+        return "FILTERED"
+    except OSError as exc:
+        return BLOCKED_ERRNOS.get(exc.errno, "ERROR")
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return "OPEN"
+
+
+class SegmentationScanner:
+    """
+    asyncio scan of a zone matrix from the zone the scanner runs in.
+    Bounded by `concurrency` open probes and `per_host_rate` probes/s per host.
+    A "closed" rule is violated by every OPEN probe; an "open" rule passes when each
+    of its ports answered OPEN on at least one host, and is violated once per port
+    that never did.
+    """
+
+    def __init__(self, concurrency=512, per_host_rate=10.0, timeout=1.0, max_findings=100):
+        self.concurrency = concurrency
+        self.limiter = HostRateLimiter(per_host_rate)
+        self.timeout = timeout
+        self.max_findings = max_findings
+
+    def _jobs(self, rules):
+        # Port-major order spreads consecutive probes across hosts
+        for index, rule in enumerate(rules):
+            for port in rule["ports"]:
+                for ip in cidr.iter_hosts(rule["targets"]):
+                    yield index, str(ip), port
+
+    async def scan(self, matrix, source_zone):
+        rules = [r for r in matrix if r["source"] == source_zone]
+        results = [{"counts": defaultdict(int), "findings": [], "violations": 0,
+                    "open_ports": set(), "unanswered": defaultdict(list)} for _ in rules]
+        jobs = self._jobs(rules)
+
+        async def worker():
+            for index, ip, port in jobs:
+                await self.limiter.acquire(ip)
+                state = await probe(ip, port, self.timeout)
+                self.limiter.forget(ip)
+                result = results[index]
+                result["counts"][state] += 1
+                finding = {"ip": ip, "port": port, "state": state}
+                if rules[index].get("expect", "closed") == "closed":
+                    if state == "OPEN":
+                        result["violations"] += 1
+                        if len(result["findings"]) < self.max_findings:
+                            result["findings"].append(finding)
+                elif state == "OPEN":
+                    result["open_ports"].add(port)
+                elif len(result["unanswered"][port]) < self.max_findings:
+                    # Kept in case no host opens this port; dropped once one does
+                    result["unanswered"][port].append(finding)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        report = []
+        for rule, result in zip(rules, results):
+            counts = dict(result["counts"])
+            if rule.get("expect", "closed") == "open":
+                missing = [port for port in rule["ports"] if port not in result["open_ports"]]
+                result["violations"] = len(missing)
+                result["findings"] = [f for port in missing for f in result["unanswered"][port]][:self.max_findings]
+            violations = result["violations"]
+            # A probe ERROR means the rule was not verified, so it cannot pass either
+            failed = violations > 0 or counts.get("ERROR", 0) > 0
+            report.append({
+                "source": rule["source"], "target": rule.get("target", ",".join(rule["targets"])),
+                "ports": rule["ports"], "expect": rule.get("expect", "closed"),
+                "probes": sum(counts.values()), "counts": counts, "violations": violations,
+                "result": "FAIL" if failed else "PASS", "findings": result["findings"],
+            })
+        return {"source_zone": source_zone, "seconds": round(elapsed, 2), "rules": report}
+
+
+def format_matrix(report):
+    """
+    PASS/FAIL matrix: one row per (source zone, target zone) rule.
+    """
+    lines = [f"Segmentation scan from '{report['source_zone']}' ({report['seconds']}s)",
+             f"{'SOURCE':<12} {'TARGET':<14} {'PORTS':<14} {'EXPECT':<7} {'PROBES':>7} {'OPEN':>6} "
+             f"{'CLOSED':>7} {'FILTERED':>8} {'ERROR':>6}  RESULT"]
+    for row in report["rules"]:
+        c = row["counts"]
+        lines.append(f"{row['source']:<12} {row['target']:<14} {','.join(map(str, row['ports'])):<14} "
+                     f"{row['expect']:<7} {row['probes']:>7} {c.get('OPEN', 0):>6} {c.get('CLOSED', 0):>7} "
+                     f"{c.get('FILTERED', 0):>8} {c.get('ERROR', 0):>6}  {row['result']}")
+        for finding in row["findings"][:5]:
+            lines.append(f"    {finding['state']}: {finding['ip']}:{finding['port']}")
+    return "\n".join(lines)
+
+
+def _black_hole(host, port=0):
+    """
+    Loopback stand-in for a firewall DROP: a listener with a full backlog that never
+    accepts, so further SYNs are dropped and connects time out.
+    """
+    listener = socket.socket()
+    listener.bind((host, port))
+    listener.listen(0)
+    filler = socket.create_connection(listener.getsockname(), timeout=1)
+    return listener, filler
+
+
+def benchmark(timeout=1.0):
+    """
+    Loopback zone matrix with open, refused and dropped (filtered) ports; compared
+    with sequential check_port, estimated from measured per-probe costs.
+    """
+    holes = [_black_hole("127.0.1.1")]
+    drop_port = holes[0][0].getsockname()[1]
+    holes += [_black_hole(f"127.0.1.{i}", drop_port) for i in range(2, 63)]
+
+    async def main():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        open_port = server.sockets[0].getsockname()[1]
+        matrix = [
+            {"source": "office", "target": "cde-data", "targets": ["127.0.1.0/26"], "ports": [drop_port, 5432, 22],
+             "expect": "closed"},
+            {"source": "office", "target": "cde-app", "targets": ["127.0.0.0/22"], "ports": [8080, 22, open_port],
+             "expect": "closed"},
+            {"source": "office", "target": "jump-host", "targets": ["127.0.0.1/32"], "ports": [open_port],
+             "expect": "open"},
+        ]
+        report = await SegmentationScanner(concurrency=512, per_host_rate=50, timeout=timeout).scan(matrix, "office")
+        server.close()
+        return report
+
+    report = asyncio.run(main())
+    print(format_matrix(report))
+
+    sample = [str(ip) for ip in list(cidr.iter_hosts(["127.0.0.0/24"]))[1:201]]
+    start = time.perf_counter()
+    for ip in sample:
+        check_port(ip, 22)
+    refused_cost = (time.perf_counter() - start) / len(sample)
+    start = time.perf_counter()
+    check_port("127.0.1.2", drop_port, timeout)
+    dropped_cost = time.perf_counter() - start
+
+    totals = defaultdict(int)
+    for row in report["rules"]:
+        for state, count in row["counts"].items():
+            totals[state] += count
+    sequential = totals["FILTERED"] * dropped_cost + (sum(totals.values()) - totals["FILTERED"]) * refused_cost
+    print(f"{sum(totals.values())} probes ({totals['FILTERED']} dropped): async {report['seconds']:.2f}s, "
+          f"sequential check_port ~{sequential:.1f}s (estimated)")
+    for listener, filler in holes:
+        filler.close()
+        listener.close()
+
 if __name__ == "__main__":
     # Check CDE Database Port from "Office Network"
     print(f"Checking CDE Port 5432: {check_port('10.0.20.5', 5432)}")
+
+    if "--bench" in sys.argv:
+        benchmark()
@@ -0,0 +1,19 @@
+"""
+Load master/skills/<skill>/scripts/helper.py as a module (skills are not a package).
+"""
+import importlib.util
+import os
+import sys
+
+SKILLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "master", "skills")
+
+
+def load_helper(skill):
+    name = f"{skill.replace('-', '_')}_helper"
+    if name not in sys.modules:
+        path = os.path.join(SKILLS, skill, "scripts", "helper.py")
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
@@ -0,0 +1,160 @@
+import asyncio
+import importlib.util
+import logging
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from skill_loader import load_helper
+
+api = load_helper("api-development")
+
+needs_httpx = pytest.mark.skipif(importlib.util.find_spec("httpx") is None, reason="httpx not installed")
+
+
+@pytest.fixture
+def stub():
+    """
+    Stub that answers 503 to the first attempt of every key, then replays by key.
+    """
+    attempts = {}
+
+    class Handler(api._StubHandler):
+        seen = {}
+
+        def do_POST(self):
+            key = self.headers.get("Idempotency-Key")
+            attempts[key] = attempts.get(key, 0) + 1
+            self.fail_rate = 1.0 if attempts[key] == 1 else 0.0
+            super().do_POST()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", attempts
+    server.shutdown()
+    server.server_close()
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def client(base, **kwargs):
+    kwargs.setdefault("backoff_base", 0.0)
+    return api.APIClient(base, "sk_test", **kwargs)
+
+
+def test_retries_reuse_one_idempotency_key(stub):
+    base, attempts = stub
+    events = []
+    with client(base, hooks=[events.append]) as c:
+        body = c.post("/v1/payments", {"amount": 100}, idempotency_key="k1")
+    assert body["request"] == {"amount": 100}
+    assert attempts == {"k1": 2}
+    assert [e["outcome"] for e in events] == ["retry", "ok"]
+
+
+def test_failing_hook_is_logged_not_raised(stub, caplog):
+    base, _ = stub
+
+    def broken(event):
+        raise RuntimeError("metrics backend down")
+
+    with caplog.at_level(logging.ERROR), client(base, hooks=[broken]) as c:
+        assert c.post("/v1/payments", {"amount": 1})["request"] == {"amount": 1}
+    assert "hook" in caplog.text and "metrics backend down" in caplog.text
+
+
+def test_post_many_accepts_caller_keys(stub):
+    base, attempts = stub
+    with client(base) as c:
+        results = c.post_many("/v1/payments", [api.Idempotent("order-1", {"amount": 1}),
+                                               api.Idempotent("order-1", {"amount": 1}), {"amount": 2}, ("x", 1)])
+    assert results[0]["id"] == results[1]["id"]
+    assert results[2]["request"] == {"amount": 2}
+    assert results[3]["request"] == ["x", 1]  # a plain tuple is data, not (key, data)
+    assert "order-1" in attempts
+    with client(base) as c:
+        assert c.post_many("/v1/payments", []) == []
+
+
+def test_transport_errors_are_retried():
+    with client(f"http://127.0.0.1:{closed_port()}", max_retries=2) as c:
+        with pytest.raises(api.APIError) as info:
+            c.post("/v1/payments", {})
+    assert info.value.attempts == 3 and info.value.status is None
+
+
+def test_tls_failures_are_not_retried(stub):
+    base, attempts = stub
+    events = []
+    with client(base.replace("http://", "https://"), max_retries=3, hooks=[events.append]) as c:
+        with pytest.raises(api.APIError) as info:
+            c.post("/v1/payments", {})
+    assert info.value.attempts == 1
+    assert [e["outcome"] for e in events] == ["error"]
+
+
+def test_non_json_body_raises():
+    with pytest.raises(api.APIError):
+        api._BaseClient._decode(200, "<html>")
+    assert api._BaseClient._decode(204, "") is None
+
+
+def test_backoff_honours_retry_after_within_its_own_cap():
+    assert api.backoff_delay(0, base=0.0, retry_after="1.5") == 1.5
+    # The jitter cap does not clamp the server's Retry-After; only retry_after_cap bounds it
+    assert api.backoff_delay(0, base=0.0, cap=1.0, retry_after="30") == 30.0
+    assert api.backoff_delay(0, base=0.0, cap=1.0, retry_after="30", retry_after_cap=10) is None
+    assert api.backoff_delay(0, base=0.0, retry_after="Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_retry_after_beyond_cap_stops_retrying():
+    class Handler(api._StubHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(429)
+            self.send_header("Retry-After", "3600")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    events = []
+    try:
+        with client(f"http://127.0.0.1:{server.server_address[1]}", hooks=[events.append]) as c:
+            with pytest.raises(api.APIError) as info:
+                c.post("/v1/payments", {})
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert info.value.status == 429 and info.value.attempts == 1
+    assert [e["outcome"] for e in events] == ["error"]
+
+
+@needs_httpx
+def test_async_client_keys_hooks_and_tls(stub):
+    base, attempts = stub
+
+    def broken(event):
+        raise RuntimeError("boom")
+
+    async def run():
+        async with api.AsyncAPIClient(base, "sk_test", backoff_base=0.0, hooks=[broken]) as c:
+            results = await c.post_many("/v1/payments", [api.Idempotent("a-1", {"amount": 1}),
+                                                         api.Idempotent("a-1", {"amount": 1})])
+        async with api.AsyncAPIClient(base.replace("http://", "https://"), "sk_test", backoff_base=0.0) as c:
+            try:
+                await c.post("/v1/payments", {})
+            except api.APIError as e:
+                return results, e
+
+    results, error = asyncio.run(run())
+    assert results[0]["id"] == results[1]["id"] and attempts["a-1"] >= 2
+    assert error.attempts == 1
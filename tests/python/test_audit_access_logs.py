@@ -0,0 +1,120 @@
+import gzip
+import json
+import random
+
+import pytest
+
+from skill_loader import load_helper
+
+audit = load_helper("audit-access-logs")
+
+
+def write_trail(path, records, compress=True):
+    opener = gzip.open if compress else open
+    with opener(path, "wt") as f:
+        json.dump({"Records": records}, f)
+    return str(path)
+
+
+def read_report(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_iter_records_across_small_chunks(tmp_path):
+    rng = random.Random(1)
+    records = [audit._synthetic_record(rng, i) for i in range(50)]
+    path = write_trail(tmp_path / "trail.json.gz", records)
+    stats = {"bytes": 0}
+    assert list(audit.iter_records(path, chunk_size=37, stats=stats)) == records
+    assert stats["bytes"] > 0
+
+
+def test_iter_records_empty_and_missing_array(tmp_path):
+    assert list(audit.iter_records(write_trail(tmp_path / "empty.json", [], compress=False))) == []
+    other = tmp_path / "other.json"
+    other.write_text('{"Digest": true}')
+    assert list(audit.iter_records(str(other))) == []
+
+
+def test_iter_records_rejects_truncated_file(tmp_path):
+    path = tmp_path / "torn.json"
+    path.write_text('{"Records": [{"eventName": "A"}, {"eventName": "B"')
+    records = audit.iter_records(str(path), chunk_size=8)
+    assert next(records) == {"eventName": "A"}
+    with pytest.raises(ValueError):
+        list(records)
+
+
+def test_compile_filter_combinators():
+    match = audit.compile_filter({"eventName": ["A", "B"], "not": {"errorCode": {"exists": True}},
+                                  "any": [{"user.name": "alice"}, {"user.arn|user.name": "bob"}]})
+    assert match({"eventName": "A", "user": {"name": "alice"}})
+    assert match({"eventName": "B", "user": {"name": "bob"}})
+    assert not match({"eventName": "B", "user": {"name": "bob"}, "errorCode": "AccessDenied"})
+    assert not match({"eventName": "C", "user": {"name": "alice"}})
+    assert not match({"eventName": "A", "user": "not-a-dict"})
+    assert audit.compile_filter({})({"anything": 1})
+
+
+def test_analyze_merges_groups_across_files(tmp_path):
+    login = {"eventName": "ConsoleLogin", "eventTime": "2024-05-01T00:00:00Z", "sourceIPAddress": "1.2.3.4",
+             "userIdentity": {"userName": "alice"}, "responseElements": {"ConsoleLogin": "Failure"}}
+    later = dict(login, eventTime="2024-05-02T00:00:00Z")
+    grant = {"eventSource": "iam.amazonaws.com", "eventName": "AttachUserPolicy", "eventTime": "2024-05-01T01:00:00Z",
+             "userIdentity": {"arn": "arn:aws:iam::1:user/bob"}, "requestParameters": {"userName": "eve"}}
+    paths = [write_trail(tmp_path / "a.json.gz", [login, grant]), write_trail(tmp_path / "b.json.gz", [later])]
+    out = tmp_path / "report.jsonl"
+
+    totals = audit.analyze(paths, str(out), workers=1)
+    assert totals["files"] == 2 and totals["records"] == 3
+    lines = read_report(out)
+    assert lines[0]["event"]["requestParameters"] == {"userName": "eve"}
+    logins = [line for line in lines if line.get("aggregation") == "logins_per_user_ip" and "count" in line]
+    assert logins == [{"aggregation": "logins_per_user_ip",
+                       "key": {"userIdentity.userName|userIdentity.arn": "alice", "sourceIPAddress": "1.2.3.4",
+                               "responseElements.ConsoleLogin": "Failure"},
+                       "count": 2, "first_seen": "2024-05-01T00:00:00Z", "last_seen": "2024-05-02T00:00:00Z"}]
+    failed = [line for line in lines if line.get("aggregation") == "failed_auth"]
+    assert failed[0]["count"] == 2
+
+
+def test_analyze_pool_matches_serial(tmp_path):
+    rng = random.Random(2)
+    paths = [write_trail(tmp_path / f"{n}.json.gz", [audit._synthetic_record(rng, n * 100 + i) for i in range(100)])
+             for n in range(4)]
+    audit.analyze(paths, str(tmp_path / "serial.jsonl"), workers=1)
+    audit.analyze(paths, str(tmp_path / "pool.jsonl"), workers=2)
+    serial = [l for l in read_report(tmp_path / "serial.jsonl") if "count" in l]
+    pooled = [l for l in read_report(tmp_path / "pool.jsonl") if "count" in l]
+    key = lambda l: (l["aggregation"], json.dumps(l["key"], sort_keys=True))
+    assert sorted(serial, key=key) == sorted(pooled, key=key)
+
+
+def test_analyze_no_files(tmp_path):
+    out = tmp_path / "report.jsonl"
+    totals = audit.analyze([], str(out), workers=1)
+    assert totals["files"] == 0 and read_report(out) == []
+
+
+def test_iter_records_counts_uncompressed_bytes(tmp_path):
+    records = [{"eventName": "ConsoleLogin", "userIdentity": {"userName": "zoë"}}] * 20
+    path = tmp_path / "trail.json"
+    path.write_text(json.dumps({"Records": records}, ensure_ascii=False), encoding="utf-8")
+    stats = {"bytes": 0}
+    assert list(audit.iter_records(str(path), chunk_size=7, stats=stats)) == records
+    assert stats["bytes"] == path.stat().st_size
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_analyze_reports_unreadable_files_and_keeps_going(tmp_path, workers):
+    login = {"eventName": "ConsoleLogin", "eventTime": None, "sourceIPAddress": "1.2.3.4",
+             "userIdentity": {"userName": "alice"}, "responseElements": {"ConsoleLogin": "Failure"}}
+    good = write_trail(tmp_path / "good.json.gz", [login, dict(login, eventTime="2024-05-01T00:00:00Z")])
+    corrupt = tmp_path / "corrupt.json.gz"
+    corrupt.write_bytes(gzip.compress(b'{"Records": [{"eventName": "A"}')[:-12])
+    totals = audit.analyze([str(corrupt), good], str(tmp_path / "report.jsonl"), workers=workers)
+    assert totals["files"] == 2 and totals["records"] == 2
+    assert [f["file"] for f in totals["failed"]] == [str(corrupt)]
+    logins = [l for l in read_report(tmp_path / "report.jsonl") if l.get("aggregation") == "logins_per_user_ip"]
+    assert logins[0]["count"] == 2 and logins[0]["last_seen"] == "2024-05-01T00:00:00Z"
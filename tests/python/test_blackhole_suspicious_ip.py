@@ -0,0 +1,55 @@
+import ipaddress
+import random
+
+import pytest
+
+from skill_loader import load_helper
+
+blackhole = load_helper("blackhole-suspicious-ip")
+
+
+def test_compiled_matches_linear_scan():
+    blocklist = blackhole.CompiledBlocklist(blackhole.BLACKLIST)
+    rng = random.Random(5)
+    probes = ["1.2.3.4", "1.2.3.5", "203.0.113.0", "203.0.113.255", "203.0.114.0", "192.168.1.100"]
+    probes += [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(500)]
+    probes += [f"203.0.113.{i}" for i in range(0, 256, 17)]
+    for ip in probes:
+        assert blocklist.is_blocked(ip) == blackhole.is_ip_blocked(ip), ip
+
+
+def test_ranges_merge_and_ipv6():
+    blocklist = blackhole.CompiledBlocklist(["10.0.0.0/25", "10.0.0.128/25", "10.0.0.5", "2001:db8::/32", "# comment", ""])
+    assert len(blocklist) == 2
+    assert blocklist.is_blocked("10.0.0.200")
+    assert not blocklist.is_blocked("10.0.1.0")
+    assert blocklist.is_blocked("2001:db8::1")
+    assert not blocklist.is_blocked("2001:db9::1")
+
+
+def test_empty_blocklist():
+    blocklist = blackhole.CompiledBlocklist()
+    assert len(blocklist) == 0
+    assert not blocklist.is_blocked("1.2.3.4")
+    assert not blocklist.is_blocked("::1")
+
+
+def test_invalid_address_raises_value_error():
+    with pytest.raises(ValueError):
+        blackhole.CompiledBlocklist(["1.2.3.4"]).is_blocked("not-an-ip")
+
+
+def test_reload_swaps_snapshot(tmp_path):
+    blocklist = blackhole.CompiledBlocklist(["1.2.3.4"])
+    feed = tmp_path / "feed.txt"
+    feed.write_text("5.6.7.0/24\n")
+    blocklist.reload_from_file(str(feed))
+    assert not blocklist.is_blocked("1.2.3.4")
+    assert blocklist.is_blocked("5.6.7.8")
+
+
+def test_bad_feed_keeps_previous_snapshot():
+    blocklist = blackhole.CompiledBlocklist(["1.2.3.4"])
+    with pytest.raises(ValueError):
+        blocklist.reload(["1.2.3.4", "garbage"])
+    assert blocklist.is_blocked("1.2.3.4")
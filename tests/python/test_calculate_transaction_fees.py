@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from skill_loader import load_helper
+
+fees = load_helper("calculate-transaction-fees")
+
+BLENDED = {"type": "BLENDED", "percent": "2.9", "fixed_cents": "30"}
+IC_PLUS = {"type": "IC_PLUS", "interchange_percent": "1.65", "scheme_percent": "0.13",
+           "markup_percent": "0.45", "markup_fixed": "12.5"}
+
+
+@pytest.mark.parametrize("conf", [BLENDED, IC_PLUS])
+def test_fee_model_matches_calculate_fees(conf):
+    rng = random.Random(3)
+    amounts = [rng.randint(-50_000, 5_000_000) for _ in range(2000)] + [0, 1, -1, 5, 15]
+    model = fees.FeeModel(conf)
+    result = model.calculate_many(amounts)
+    for i, amount in enumerate(amounts):
+        expected = fees.calculate_fees(amount, conf)
+        assert model.calculate(amount) == expected
+        assert (int(result["fee"][i]), int(result["net"][i])) == (expected["fee"], expected["net"])
+
+
+def test_calculate_many_empty():
+    result = fees.FeeModel(BLENDED).calculate_many([])
+    assert len(result["fee"]) == 0
+
+
+def test_calculate_many_falls_back_on_int64_overflow():
+    amount = 2 ** 62
+    result = fees.FeeModel(IC_PLUS).calculate_many([amount])
+    assert int(result["fee"][0]) == fees.calculate_fees(amount, IC_PLUS)["fee"]
+
+
+def test_fee_model_rejects_bad_configs():
+    with pytest.raises(ValueError):
+        fees.FeeModel({"type": "FLAT"})
+    with pytest.raises(ValueError):
+        fees.FeeModel({"type": "IC_PLUS", "interchange_table": object(), "markup_percent": "1"})
+
+
+@pytest.mark.skipif(fees.np is None, reason="numpy not installed")
+def test_calculate_many_rejects_float_amounts():
+    with pytest.raises(TypeError):
+        fees.FeeModel(BLENDED).calculate_many(fees.np.array([1.5]))
+
+
+def test_iter_amount_chunks_csv(tmp_path):
+    path = tmp_path / "amounts.csv"
+    path.write_text("amount_cents\n" + "\n".join(str(i) for i in range(7)) + "\n")
+    chunks = [list(map(int, c)) for c in fees.iter_amount_chunks(str(path), chunk_size=3)]
+    assert chunks == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def interchange_row(category, region, percent, start="400000", end="449999"):
+    row = {"bin_start": start, "bin_end": end, "card_category": category,
+           "interchange_percent": percent, "scheme_percent": "0.13"}
+    if region:
+        row["region"] = region
+    return row
+
+
+def test_interchange_table_keys_ranges_by_region():
+    table = fees.InterchangeTable([
+        interchange_row("CONSUMER_DEBIT", "US", "0.05"),
+        interchange_row("CONSUMER_DEBIT", "EU", "0.2"),
+        interchange_row("CONSUMER_DEBIT", None, "1.0"),
+    ])
+    assert table.lookup("424242", "CONSUMER_DEBIT", "US")["row"]["interchange_percent"] == "0.05"
+    assert table.lookup("424242", "CONSUMER_DEBIT", "EU")["row"]["interchange_percent"] == "0.2"
+    # No row of its own: falls back to the region-agnostic row
+    assert table.lookup("424242", "CONSUMER_DEBIT", "APAC")["row"]["interchange_percent"] == "1.0"
+    assert table.lookup("424242", "CONSUMER_DEBIT")["row"]["interchange_percent"] == "1.0"
+    assert table.lookup("500000", "CONSUMER_DEBIT", "US") is None
+    assert table.lookup("424242", "COMMERCIAL", "US") is None
+
+
+def test_interchange_table_rejects_overlap_within_region():
+    with pytest.raises(ValueError, match="Overlapping"):
+        fees.InterchangeTable([
+            interchange_row("CONSUMER_DEBIT", "US", "0.05"),
+            interchange_row("CONSUMER_DEBIT", "US", "0.2", start="449000", end="459999"),
+        ])
+
+
+def test_calculate_fees_with_regional_table():
+    table = fees.InterchangeTable([
+        interchange_row("CONSUMER_CREDIT", "US", "1.65"),
+        interchange_row("CONSUMER_CREDIT", "EU", "0.3"),
+    ])
+    conf = {"type": "IC_PLUS", "interchange_table": table, "markup_percent": "0.5"}
+    us = fees.calculate_fees(10000, conf, card_bin="424242", card_category="CONSUMER_CREDIT", region="US")
+    eu = fees.calculate_fees(10000, conf, card_bin="424242", card_category="CONSUMER_CREDIT", region="EU")
+    assert us["breakdown"]["interchange"] == 165 and eu["breakdown"]["interchange"] == 30
+    assert us["fee"] == sum(us["breakdown"][k] for k in ("interchange", "scheme", "markup"))
+    with pytest.raises(ValueError, match="No interchange row"):
+        fees.calculate_fees(10000, conf, card_bin="424242", card_category="CONSUMER_CREDIT", region="APAC")
@@ -0,0 +1,72 @@
+import pytest
+
+from skill_loader import load_helper
+
+velocity = load_helper("detect-velocity-attack")
+
+
+def test_gcra_allows_burst_then_blocks():
+    limiter = velocity.GCRALimiter(limit=10, period=60)
+    results = [limiter.allow("ip:1", now=100.0) for _ in range(11)]
+    assert all(allowed for allowed, _ in results[:10])
+    allowed, retry_after = results[10]
+    assert not allowed
+    assert retry_after == pytest.approx(6.0)
+
+
+def test_gcra_refills_one_cell_per_interval():
+    limiter = velocity.GCRALimiter(limit=10, period=60)
+    for _ in range(10):
+        limiter.allow("k", now=0.0)
+    assert not limiter.allow("k", now=5.9)[0]
+    assert limiter.allow("k", now=6.0)[0]
+    assert not limiter.allow("k", now=6.0)[0]
+
+
+def test_gcra_keys_are_independent():
+    limiter = velocity.GCRALimiter(limit=1, period=60)
+    assert limiter.allow("a", now=0.0)[0]
+    assert not limiter.allow("a", now=0.0)[0]
+    assert limiter.allow("b", now=0.0)[0]
+
+
+def test_gcra_memory_is_capped():
+    limiter = velocity.GCRALimiter(limit=10, period=60, capacity=64, shards=4)
+    for i in range(10_000):
+        limiter.allow(f"ip:{i}", now=0.0)
+    assert len(limiter) <= 64
+
+
+def test_gcra_expired_keys_are_dropped():
+    limiter = velocity.GCRALimiter(limit=10, period=60, capacity=1000, shards=1)
+    for i in range(100):
+        limiter.allow(f"ip:{i}", now=0.0)
+    limiter.allow("late", now=1000.0)
+    assert len(limiter) == 1
+
+
+def test_gcra_rejects_non_power_of_two_shards():
+    with pytest.raises(ValueError):
+        velocity.GCRALimiter(limit=1, period=1, shards=3)
+
+
+def test_velocity_limiter_reports_blocking_dimensions():
+    limiter = velocity.VelocityLimiter({
+        "ip": velocity.GCRALimiter(limit=10, period=60),
+        "card_fingerprint": velocity.GCRALimiter(limit=2, period=60),
+    })
+    results = [limiter.check(ip="1.2.3.4", card_fingerprint="fp", email="ignored@x") for _ in range(3)]
+    assert results[1]["allowed"]
+    assert results[2] == {"allowed": False, "blocked_by": ["card_fingerprint"], "retry_after": pytest.approx(30, abs=0.5)}
+    assert limiter.check(ip=None)["allowed"]
+
+
+def test_mock_redis_counter_expires(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(velocity.time, "monotonic", lambda: clock[0])
+    redis = velocity.MockRedis()
+    redis.incr("k")
+    redis.expire("k", 60)
+    assert redis.incr("k") == 2
+    clock[0] = 61.0
+    assert redis.incr("k") == 1
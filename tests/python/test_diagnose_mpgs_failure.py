@@ -0,0 +1,101 @@
+import gzip
+import json
+
+import pytest
+
+from skill_loader import load_helper
+
+diagnose = load_helper("diagnose-mpgs-failure")
+
+
+def mpgs(gateway_code, acquirer_code=None):
+    response = {"gatewayCode": gateway_code}
+    if acquirer_code is not None:
+        response["acquirerCode"] = acquirer_code
+    return {"response": response}
+
+
+def test_mpgs_approved_and_iso_declines():
+    assert diagnose.diagnose_mpgs(mpgs("APPROVED"))["status"] == "SUCCESS"
+    assert diagnose.diagnose_mpgs(mpgs("DECLINED", "51"))["status"] == "FAILED_FUNDS"
+    assert diagnose.diagnose_mpgs(mpgs("DECLINED", "ZZ"))["message"] == "Declined by bank (Code ZZ)"
+    assert diagnose.diagnose_mpgs(mpgs("INSUFFICIENT_FUNDS"))["status"] == "FAILED_FUNDS"
+    assert diagnose.diagnose_mpgs(mpgs("NEW_CODE"))["status"] == "UNKNOWN"
+
+
+@pytest.mark.parametrize("code", ["00", "08", "10", "11", "85"])
+def test_mpgs_declined_with_approval_code_is_not_success(code):
+    result = diagnose.diagnose_mpgs(mpgs("DECLINED", code))
+    assert result["status"] == "FAILED_DECLINE"
+    assert code in result["message"]
+
+
+def test_mpgs_error_and_empty_responses():
+    error = diagnose.diagnose_mpgs({"error": {"explanation": "Invalid merchant"}})
+    assert error == {"status": "SYSTEM_ERROR", "message": "Invalid merchant", "action": "Investigate Request Format"}
+    assert diagnose.diagnose_mpgs({})["status"] == "UNKNOWN"
+    assert diagnose.diagnose_mpgs({"response": None})["status"] == "UNKNOWN"
+
+
+def test_cybersource_rest_and_legacy():
+    assert diagnose.diagnose_cybersource({"status": "AUTHORIZED"})["status"] == "SUCCESS"
+    assert diagnose.diagnose_cybersource({"status": "PENDING"})["status"] == "PENDING"
+    assert diagnose.diagnose_cybersource(
+        {"status": "DECLINED", "errorInformation": {"reason": "EXPIRED_CARD"}})["status"] == "FAILED_EXPIRED"
+    assert diagnose.diagnose_cybersource(
+        {"status": "DECLINED", "processorInformation": {"responseCode": "05"},
+         "errorInformation": {"reason": "INVALID_CVN"}})["status"] == "FAILED_GENERIC"
+    assert diagnose.diagnose_cybersource({"decision": "ACCEPT", "reasonCode": 100})["status"] == "SUCCESS"
+    assert diagnose.diagnose_cybersource({"decision": "REJECT", "reasonCode": 204})["status"] == "FAILED_FUNDS"
+    assert diagnose.diagnose_cybersource({"status": "INVALID_REQUEST"})["status"] == "SYSTEM_ERROR"
+    assert diagnose.diagnose_cybersource({})["status"] == "UNKNOWN"
+
+
+@pytest.mark.parametrize("response", [
+    {"status": "DECLINED", "processorInformation": {"responseCode": "85"}},
+    {"status": "DECLINED", "processorInformation": {"responseCode": "00"}, "errorInformation": {"reason": "100"}},
+    {"decision": "REJECT", "reasonCode": 110},
+])
+def test_cybersource_decline_is_never_success(response):
+    assert diagnose.diagnose_cybersource(response)["status"] != "SUCCESS"
+
+
+def test_cybersource_null_sections():
+    response = {"status": "DECLINED", "processorInformation": None, "errorInformation": None}
+    assert diagnose.diagnose_cybersource(response)["status"] == "FAILED_DECLINE"
+
+
+def write_jsonl(path, records, opener=open):
+    with opener(path, "wt") as f:
+        for record in records:
+            f.write((record if isinstance(record, str) else json.dumps(record)) + "\n")
+
+
+def test_aggregate_declines_groups_and_skips_bad_lines(tmp_path):
+    path = str(tmp_path / "declines.jsonl.gz")
+    write_jsonl(path, [
+        {"psp": "MPGS", "bin": "411111", "merchant_id": "M1", "response": mpgs("DECLINED", "51")},
+        {"psp": "mpgs", "bin": "411111", "merchant_id": "M1", "response": mpgs("DECLINED", "51")},
+        {"psp": "MPGS", "bin": "411111", "merchant_id": "M1", "response": mpgs("APPROVED")},
+        {"psp": "MPGS", "bin": "411111", "merchant_id": "M1", "response": mpgs("DECLINED", "00")},
+        {"psp": "CYBERSOURCE", "bin": "555555", "merchant_id": "M2", "response": None},
+        {"psp": "MPGS", "bin": "411111", "merchant_id": "M1", "response": ["not", "an", "object"]},
+        {"psp": "ADYEN", "response": {}},
+        "not json",
+        "",
+    ], opener=gzip.open)
+    result = diagnose.aggregate_declines(path)
+    rows = {(r["psp"], r["status"]): r["count"] for r in result["rows"]}
+    assert rows == {
+        ("MPGS", "FAILED_FUNDS"): 1,
+        ("mpgs", "FAILED_FUNDS"): 1,
+        ("MPGS", "FAILED_DECLINE"): 1,
+        ("CYBERSOURCE", "UNKNOWN"): 1,
+    }
+    assert result["skipped_lines"] == 3
+
+
+def test_aggregate_declines_empty_file(tmp_path):
+    path = tmp_path / "empty.jsonl"
+    path.write_text("")
+    assert diagnose.aggregate_declines(str(path)) == {"rows": [], "skipped_lines": 0}
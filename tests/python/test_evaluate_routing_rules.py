@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from skill_loader import load_helper
+
+routing = load_helper("evaluate-routing-rules")
+np = routing.np
+needs_numpy = pytest.mark.skipif(np is None, reason="numpy not installed")
+
+RULES = [
+    {"priority": 1, "target_psp": "cybersource-01", "conditions": {"min_amount": 1000, "currency": ["USD"]}},
+    {"priority": 2, "target_psp": "stripe-01", "conditions": {"currency": ["USD"], "bin_prefix": ["4111"]}},
+    {"priority": 10, "target_psp": "fallback-mpgs", "conditions": {}},
+]
+
+
+def random_rules(rng, n):
+    rules = []
+    for i in range(n):
+        conditions = {}
+        if rng.random() < 0.7:
+            conditions["currency"] = rng.sample(["USD", "EUR", "GBP"], rng.randint(1, 2))
+        if rng.random() < 0.5:
+            conditions["min_amount"] = rng.choice([10, 100.5, 1000])
+        if rng.random() < 0.5:
+            conditions["bin_prefix"] = [str(rng.randint(3, 6)) + str(rng.randint(0, 99))[:rng.randint(0, 2)]]
+        rules.append({"priority": rng.randint(1, 20), "target_psp": f"psp-{i}", "conditions": conditions})
+    return rules
+
+
+def test_compiled_matches_evaluate_routing():
+    rng = random.Random(1)
+    rules = random_rules(rng, 200)
+    compiled = routing.CompiledRuleSet(rules)
+    for _ in range(300):
+        tx = {"amount": f"{rng.randint(1, 300000) / 100:.2f}", "currency": rng.choice(["USD", "EUR", "GBP", "JPY"]),
+              "card_bin": str(rng.randint(300000, 699999))}
+        assert compiled.evaluate(tx) == routing.evaluate_routing(tx, rules)
+
+
+def test_compiled_failover_chain():
+    compiled = routing.CompiledRuleSet(RULES)
+    assert compiled.evaluate({"amount": "1500.00", "currency": "USD", "card_bin": "411111"}) == [
+        "cybersource-01", "stripe-01", "fallback-mpgs"]
+    assert compiled.evaluate({"amount": "999.99", "currency": "USD", "card_bin": "555555"}) == ["fallback-mpgs"]
+    assert compiled.evaluate({"amount": "5", "currency": "JPY", "card_bin": "411111"}) == ["fallback-mpgs"]
+
+
+def test_compiled_empty_rules():
+    assert routing.CompiledRuleSet([]).evaluate({"amount": "1", "currency": "USD", "card_bin": "4"}) == []
+
+
+def batch_chains(result):
+    psps, offsets, chain = result["psps"], result["offsets"], result["chain"]
+    return [[psps[j] for j in chain[offsets[i]:offsets[i + 1]]] for i in range(len(offsets) - 1)]
+
+
+@needs_numpy
+def test_batch_matches_evaluate_routing():
+    rng = random.Random(2)
+    rules = random_rules(rng, 50)
+    txs = [{"amount": f"{rng.randint(1, 300000) / 100:.2f}", "currency": rng.choice(["USD", "EUR", "JPY"]),
+            "card_bin": str(rng.randint(300000, 699999))} for _ in range(500)]
+    columns = {
+        "amount": np.array([float(t["amount"]) for t in txs]),
+        "currency": np.array([t["currency"] for t in txs]),
+        "card_bin": np.array([int(t["card_bin"]) for t in txs]),
+    }
+    # A tiny matrix budget forces many small chunks
+    result = routing.evaluate_routing_batch(columns, rules, max_matrix_bytes=len(rules) * 64)
+    expected = [routing.evaluate_routing(t, rules) for t in txs]
+    assert batch_chains(result) == expected
+    assert [result["psps"][p] if p >= 0 else None for p in result["primary"]] == [e[0] if e else None for e in expected]
+
+
+@needs_numpy
+def test_batch_with_no_rules(capsys):
+    columns = {"amount": np.array([1.0, 2.0]), "currency": np.array(["USD", "EUR"]), "card_bin": np.array([411111, 555555])}
+    result = routing.evaluate_routing_batch(columns, [])
+    assert list(result["primary"]) == [-1, -1]
+    assert list(result["offsets"]) == [0, 0, 0]
+    assert len(result["chain"]) == 0
+    routing.print_traffic_report(result)
+    assert "(no route)" in capsys.readouterr().out
+
+
+@needs_numpy
+def test_batch_with_no_transactions(capsys):
+    empty = {"amount": np.array([]), "currency": np.array([], dtype=str), "card_bin": np.array([], dtype=np.int64)}
+    result = routing.evaluate_routing_batch(empty, RULES)
+    assert len(result["primary"]) == 0
+    routing.print_traffic_report(result)
+    assert capsys.readouterr().out.strip() == "No transactions."
@@ -0,0 +1,119 @@
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from skill_loader import load_helper
+
+webhooks = load_helper("handle-webhook-event")
+
+SECRET = "whsec_123"
+
+
+def signed(body, ts=None, endpoint="stripe", secret=SECRET):
+    ts = str(int(time.time())) if ts is None else ts
+    sig = hmac.new(secret.encode(), f"{ts}.{body}".encode(), hashlib.sha256).hexdigest()
+    return {"endpoint": endpoint, "signature": sig, "timestamp": ts, "body": body}
+
+
+@pytest.fixture
+def pipeline():
+    p = webhooks.WebhookPipeline({"stripe": SECRET}, workers=2)
+    yield p
+    p.close()
+
+
+def test_matches_verify_webhook(pipeline):
+    event = signed('{"id":"evt_1"}')
+    assert pipeline.verify(event) == webhooks.verify_webhook(SECRET, event["signature"], event["timestamp"], event["body"])
+    forged = dict(signed('{"id":"evt_2"}'), signature="0" * 64)
+    assert pipeline.verify(forged) == {"valid": False, "reason": "Signature Mismatch"}
+    stale = signed('{"id":"evt_3"}', ts=str(int(time.time()) - 301))
+    assert pipeline.verify(stale)["reason"] == "Timestamp expired (Replay Risk)"
+    assert pipeline.verify(signed("{}", endpoint="adyen"))["reason"] == "Unknown Endpoint"
+
+
+def test_batch_dedups_retries_in_order(pipeline):
+    events = [signed(json.dumps({"id": f"evt_{i // 2}"})) for i in range(600)]
+    results = pipeline.verify_batch(events, chunk_size=64)
+    assert sum(r["valid"] for r in results) == 300
+    assert results[0] == {"valid": True} and results[1]["reason"] == "Duplicate Event"
+
+
+def test_forged_event_does_not_poison_dedup(pipeline):
+    forged = dict(signed('{"id":"evt_1"}'), signature="0" * 64)
+    assert not pipeline.verify(forged)["valid"]
+    assert pipeline.verify(signed('{"id":"evt_1"}'))["valid"]
+
+
+@pytest.mark.parametrize("body", ["not json", "[1, 2]", "null", '"text"'])
+def test_malformed_body_is_rejected_without_failing_the_batch(pipeline, body):
+    results = pipeline.verify_batch([signed(body), signed('{"id":"evt_ok"}')])
+    assert results[0] == {"valid": False, "reason": "Malformed Body"}
+    assert results[1] == {"valid": True}
+
+
+def test_malformed_timestamp_is_rejected(pipeline):
+    event = signed('{"id":"evt_1"}', ts="yesterday")
+    assert pipeline.verify_batch([event]) == [{"valid": False, "reason": "Malformed Timestamp"}]
+
+
+def test_explicit_event_id_and_bodies_without_id(pipeline):
+    assert pipeline.verify(dict(signed("[]"), event_id="evt_x"))["valid"]
+    assert not pipeline.verify(dict(signed("[]"), event_id="evt_x"))["valid"]
+    # No ID to dedup on: every copy is accepted
+    assert pipeline.verify(signed('{"type":"ping"}'))["valid"]
+    assert pipeline.verify(signed('{"type":"ping"}'))["valid"]
+
+
+def test_failed_handler_releases_event_id(pipeline):
+    calls = []
+
+    def flaky(event):
+        calls.append(event["body"])
+        if len(calls) == 1:
+            raise RuntimeError("db down")
+
+    event = signed('{"id":"evt_1"}')
+    first = pipeline.handle(event, flaky)
+    assert first == {"valid": True, "handled": False, "error": "RuntimeError: db down"}
+    assert pipeline.handle(event, flaky) == {"valid": True, "handled": True}
+    assert pipeline.handle(event, flaky) == {"valid": False, "reason": "Duplicate Event"}
+    assert len(calls) == 2
+
+
+def test_batch_with_handler(pipeline):
+    handled = []
+    events = [signed(json.dumps({"id": f"evt_{i}"})) for i in range(3)] + [signed("oops")]
+    results = pipeline.verify_batch(events, handler=lambda e: handled.append(e["body"]))
+    assert [r.get("handled") for r in results] == [True, True, True, None]
+    assert len(handled) == 3
+
+
+def test_seen_cache_expiry_capacity_and_discard():
+    clock = [0.0]
+    cache = webhooks.SeenEventCache(ttl_seconds=10, capacity=3, clock=lambda: clock[0])
+    assert cache.add_if_new("a") and not cache.add_if_new("a")
+    cache.discard("a")
+    assert cache.add_if_new("a")
+    for key in "bcd":
+        cache.add_if_new(key)
+    assert len(cache) <= 3
+    clock[0] = 11.0
+    assert cache.add_if_new("d")
+
+
+def test_malformed_events_do_not_sink_the_batch(pipeline):
+    good = signed('{"id":"evt_good"}')
+    no_sig = dict(good, signature=None)
+    unicode_sig = dict(good, signature="ä" * 64)
+    missing = {k: v for k, v in good.items() if k != "timestamp"}
+    no_endpoint = {k: v for k, v in good.items() if k != "endpoint"}
+    no_body = {k: v for k, v in good.items() if k != "body"}
+    results = pipeline.verify_batch([no_sig, unicode_sig, missing, no_endpoint, no_body, "junk", good])
+    assert [r.get("reason") for r in results] == [
+        "Malformed Signature", "Malformed Signature", "Malformed Timestamp", "Unknown Endpoint",
+        "Malformed Event", "Malformed Event", None]
+    assert results[-1] == {"valid": True}
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+import requests
+
+from skill_loader import load_helper
+
+mpgs = load_helper("integrate-mpgs-gateway")
+
+PAYLOAD = {"apiOperation": "AUTHORIZE", "order": {"amount": "10.00", "currency": "USD"}}
+
+
+@pytest.fixture
+def stub():
+    server, url = mpgs.run_stub_server()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture
+def slow_stub():
+    server, url = mpgs.run_stub_server(delay=0.5)
+    yield url
+    server.shutdown()
+
+
+def test_pooled_client_executes_and_records_metrics(stub):
+    with mpgs.MPGSClient(stub, "TEST01", "pw", pool_size=2) as client:
+        for i in range(5):
+            result = client.execute(f"o{i}", "1", PAYLOAD)
+            assert result["response"]["gatewayCode"] == "APPROVED"
+        summary = client.metrics.summary()
+    assert summary["AUTHORIZE"]["count"] == 5
+    assert summary["AUTHORIZE"]["outcomes"] == {"201": 5}
+
+
+def test_pooled_client_records_timeouts(slow_stub):
+    with mpgs.MPGSClient(slow_stub, "TEST01", "pw", read_timeout=0.05) as client:
+        with pytest.raises(requests.Timeout):
+            client.execute("o1", "1", PAYLOAD)
+        assert client.metrics.summary()["AUTHORIZE"]["outcomes"] == {"timeout": 1}
+
+
+def test_metrics_window_is_bounded():
+    metrics = mpgs.CallMetrics(window=10)
+    for i in range(100):
+        metrics.record("PAY", i / 1000, "201")
+    summary = metrics.summary()["PAY"]
+    assert summary["count"] == 100
+    assert summary["max_ms"] == 99.0
+    assert len(metrics.latencies["PAY"]) == 10
+
+
+def test_empty_metrics_summary():
+    assert mpgs.CallMetrics().summary() == {}
+
+
+def test_async_client(stub, slow_stub):
+    pytest.importorskip("httpx")
+    import httpx
+
+    async def run():
+        async with mpgs.AsyncMPGSClient(stub, "TEST01", "pw", max_connections=4) as client:
+            results = await asyncio.gather(*(client.execute(f"o{i}", "1", PAYLOAD) for i in range(8)))
+            assert all(r["result"] == "SUCCESS" for r in results)
+            assert client.metrics.summary()["AUTHORIZE"]["outcomes"] == {"201": 8}
+        async with mpgs.AsyncMPGSClient(slow_stub, "TEST01", "pw", read_timeout=0.05) as client:
+            with pytest.raises(httpx.TimeoutException):
+                await client.execute("o1", "1", PAYLOAD)
+            assert client.metrics.summary()["AUTHORIZE"]["outcomes"] == {"timeout": 1}
+
+    asyncio.run(run())
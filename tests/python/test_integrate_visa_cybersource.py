@@ -0,0 +1,61 @@
+import base64
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+from skill_loader import load_helper
+
+cybersource = load_helper("integrate-visa-cybersource")
+
+SECRET = base64.b64encode(b"0123456789abcdef0123456789abcdef").decode()
+OTHER = base64.b64encode(b"fedcba9876543210fedcba9876543210").decode()
+PAYLOAD = '{"orderInformation":{"amountDetails":{"totalAmount":"102.21","currency":"USD"}}}'
+NOW = 1_700_000_000
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def utcnow(cls):
+        return datetime.fromtimestamp(NOW, timezone.utc).replace(tzinfo=None)
+
+
+def test_signer_matches_generate_cybersource_signature(monkeypatch):
+    monkeypatch.setattr(cybersource, "datetime", FrozenDatetime)
+    expected = cybersource.generate_cybersource_signature(
+        "mid", "kid", SECRET, "apitest.cybersource.com", "/pts/v2/payments", PAYLOAD)
+    signer = cybersource.CybersourceSigner("mid", "apitest.cybersource.com", {"kid": SECRET})
+    assert signer.sign("/pts/v2/payments", PAYLOAD, now=NOW) == expected
+    # The cached HMAC template is not consumed by a signature
+    assert signer.sign("/pts/v2/payments", PAYLOAD, now=NOW) == expected
+
+
+def test_body_digest_accepts_chunks():
+    expected = cybersource.body_digest(PAYLOAD)
+    assert cybersource.body_digest(PAYLOAD.encode()) == expected
+    assert cybersource.body_digest(io.BytesIO(PAYLOAD.encode())) == expected
+    assert cybersource.body_digest([PAYLOAD[:10], PAYLOAD[10:].encode()]) == expected
+    assert cybersource.body_digest(PAYLOAD.encode(), chunk_size=7) == expected
+
+
+def test_http_date_is_cached_per_second():
+    signer = cybersource.CybersourceSigner("mid", "host", {"kid": SECRET})
+    assert signer.http_date(NOW) == "Tue, 14 Nov 2023 22:13:20 GMT"
+    assert signer.http_date(NOW + 0.9) is signer.http_date(NOW)
+    assert signer.http_date(NOW + 1) == "Tue, 14 Nov 2023 22:13:21 GMT"
+
+
+def test_key_rotation():
+    signer = cybersource.CybersourceSigner("mid", "host", {"old": SECRET})
+    signer.add_key("new", OTHER)
+    old_sig = signer.sign("/r", PAYLOAD, now=NOW)["Signature"]
+    signer.activate("new")
+    new_sig = signer.sign("/r", PAYLOAD, now=NOW)["Signature"]
+    assert 'keyid="new"' in new_sig and new_sig != old_sig
+    assert signer.sign("/r", PAYLOAD, key_id="old", now=NOW)["Signature"] == old_sig
+
+    with pytest.raises(ValueError):
+        signer.remove_key("new")
+    signer.remove_key("old")
+    with pytest.raises(KeyError):
+        signer.activate("old")
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from skill_loader import load_helper
+
+sessions = load_helper("manage-payment-session")
+
+
+def make_store(**kwargs):
+    clock = [1000.0]
+    return sessions.SessionStore(clock=lambda: clock[0], **kwargs), clock
+
+
+def test_create_and_validate():
+    store, _ = make_store()
+    token = store.create("ORD-1", "50.00", ttl_seconds=60)
+    result = store.validate(token)
+    assert result["valid"] and result["data"]["order_id"] == "ORD-1"
+    assert store.validate("missing") == {"valid": False, "reason": "Not Found"}
+
+
+def test_expired_session_is_rejected_and_removed():
+    store, clock = make_store()
+    token = store.create("ORD-1", "50.00", ttl_seconds=60)
+    clock[0] += 61
+    assert store.validate(token) == {"valid": False, "reason": "Expired"}
+    assert len(store) == 0
+
+
+def test_writes_actively_expire_old_sessions():
+    store, clock = make_store()
+    for i in range(100):
+        store.create(f"ORD-{i}", "1.00", ttl_seconds=10)
+    clock[0] += 11
+    store.create("ORD-new", "1.00", ttl_seconds=10)
+    assert len(store) == 1
+
+
+def test_capacity_evicts_session_closest_to_expiry():
+    store, _ = make_store(capacity=2)
+    short = store.create("ORD-short", "1.00", ttl_seconds=10)
+    long = store.create("ORD-long", "1.00", ttl_seconds=100)
+    newest = store.create("ORD-new", "1.00", ttl_seconds=50)
+    assert len(store) == 2
+    assert not store.validate(short)["valid"]
+    assert store.validate(long)["valid"] and store.validate(newest)["valid"]
+
+
+def test_sweep_and_invalidate():
+    store, clock = make_store()
+    assert store.sweep() == 0
+    keep = store.create("ORD-keep", "1.00", ttl_seconds=100)
+    for i in range(5):
+        store.create(f"ORD-{i}", "1.00", ttl_seconds=10)
+    clock[0] += 11
+    assert store.sweep() == 5
+    store.invalidate(keep)
+    store.invalidate(keep)
+    assert len(store) == 0
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    clock = [1000.0]
+    store = sessions.SessionStore(backend=sessions.SQLiteSessionBackend(path), clock=lambda: clock[0])
+    live = store.create("ORD-live", "9.99", ttl_seconds=100)
+    gone = store.create("ORD-gone", "1.00", ttl_seconds=100)
+    store.invalidate(gone)
+    store.create("ORD-expiring", "1.00", ttl_seconds=10)
+
+    clock[0] += 20
+    restarted = sessions.SessionStore(backend=sessions.SQLiteSessionBackend(path), clock=lambda: clock[0])
+    assert len(restarted) == 1
+    assert restarted.validate(live)["data"]["amount"] == "9.99"
+
+
+def test_backend_delete_never_overtakes_save():
+    saving = threading.Event()
+    ops = []
+
+    class SlowBackend(sessions.SessionBackend):
+        def save(self, session):
+            saving.set()
+            time.sleep(0.05)
+            ops.append(("save", session.token))
+
+        def delete(self, tokens):
+            ops.extend(("delete", t) for t in tokens)
+
+    store = sessions.SessionStore(backend=SlowBackend())
+    creator = threading.Thread(target=store.create, args=("ORD-1", "1.00"))
+    creator.start()
+    saving.wait(1)
+    token = next(iter(store.sessions))
+    store.invalidate(token)
+    creator.join()
+    assert ops == [("save", token), ("delete", token)]
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        sessions.SessionStore(capacity=0)
@@ -0,0 +1,137 @@
+import asyncio
+import socket
+
+import pytest
+
+from skill_loader import load_helper
+
+mock = load_helper("mock-psp-response")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_scenarios_by_penny_value():
+    assert mock.scenario_for("10.00")[1]["result"] == "APPROVED"
+    assert mock.scenario_for("12.51") == (402, {"result": "DECLINED", "code": "51", "msg": "Insufficient Funds"})
+    assert mock.scenario_for("0.29")[0] == 200
+    assert mock.scenario_for("1.99")[0] == 504
+
+
+def test_http_round_trip_and_bad_requests():
+    async def run():
+        psp = mock.AsyncMockPSP(latency_scale=0.0, timeout_after=0.0)
+        server = await psp.start()
+        port = server.sockets[0].getsockname()[1]
+        client = mock.HTTPPaymentClient("127.0.0.1", port, connections=2)
+        try:
+            results = await asyncio.gather(*(client.submit(a) for a in ("10.00", "10.05", "10.31", "10.99")))
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"POST /payments HTTP/1.1\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}")
+            bad = (await reader.read()).split(b"\r\n")[0]
+            writer.close()
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+        return results, bad, len(client.idle)
+
+    results, bad, idle = asyncio.run(run())
+    assert [status for status, _ in results] == [200, 402, 200, 504]
+    assert bad == b"HTTP/1.1 400 Bad Request"
+    assert idle <= 2
+
+
+def test_malformed_requests_get_400_and_the_server_survives():
+    async def run():
+        psp = mock.AsyncMockPSP(latency_scale=0.0, timeout_after=0.0)
+        server = await psp.start()
+        port = server.sockets[0].getsockname()[1]
+        replies = []
+        try:
+            for raw in (b"GARBAGE\r\n\r\n",
+                        b"POST /payments HTTP/1.1\r\nContent-Length: abc\r\n\r\n",
+                        b"POST /payments HTTP/1.1\r\nContent-Length: -5\r\n\r\n"):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(raw)
+                replies.append((await reader.read()).split(b"\r\n")[0])
+                writer.close()
+            client = mock.HTTPPaymentClient("127.0.0.1", port, connections=1)
+            ok = await client.submit("10.00")
+            await client.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+        return replies, ok
+
+    replies, ok = asyncio.run(run())
+    assert replies == [b"HTTP/1.1 400 Bad Request"] * 3
+    assert ok[0] == 200
+
+
+def test_connection_errors_do_not_starve_waiters():
+    port = free_port()
+
+    async def run():
+        client = mock.HTTPPaymentClient("127.0.0.1", port, connections=2)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(client.submit("10.00") for _ in range(10)), return_exceptions=True), 5)
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ConnectionRefusedError) for r in results)
+
+
+def test_dropped_connection_is_replaced():
+    async def drop_first(reader, writer):
+        await reader.readline()
+        writer.close()
+
+    async def run():
+        psp = mock.AsyncMockPSP(latency_scale=0.0)
+        dropped = []
+
+        async def handler(reader, writer):
+            if not dropped:
+                dropped.append(True)
+                return await drop_first(reader, writer)
+            return await psp._handle(reader, writer)
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        client = mock.HTTPPaymentClient("127.0.0.1", server.sockets[0].getsockname()[1], connections=1)
+        try:
+            first = await asyncio.gather(client.submit("10.00"), return_exceptions=True)
+            second = await asyncio.wait_for(client.submit("10.00"), 5)
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+        return first[0], second
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, Exception)
+    assert second[0] == 200
+
+
+def test_run_load_in_process():
+    psp = mock.AsyncMockPSP(latency_scale=0.0, timeout_after=0.0, seed=1)
+    report = asyncio.run(mock.run_load(psp.respond, payments=200, concurrency=20))
+    assert report["payments"] == 200
+    assert sum(report["outcomes"].values()) == 200
+    assert psp.served == 200
+
+
+def test_run_load_counts_exceptions():
+    async def failing(amount):
+        raise ConnectionResetError("reset")
+
+    report = asyncio.run(mock.run_load(failing, payments=5, concurrency=2))
+    assert report["outcomes"] == {"ConnectionResetError": 5}
+
+
+def test_amount_parsing_rejects_garbage():
+    with pytest.raises(ArithmeticError):
+        mock.scenario_for("not-a-number")
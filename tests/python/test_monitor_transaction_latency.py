@@ -0,0 +1,79 @@
+import random
+import threading
+
+import pytest
+
+from skill_loader import load_helper
+
+latency = load_helper("monitor-transaction-latency")
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(-3.0, 0.6) for _ in range(20_000))
+    sketch = latency.LatencySketch(accuracy=0.01)
+    for v in values:
+        sketch.add(v)
+    for q in (0.5, 0.95, 0.99):
+        true = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - true) / true <= 0.011
+
+
+def test_empty_sketch_and_mismatched_merge():
+    assert latency.LatencySketch().quantile(0.5) is None
+    with pytest.raises(ValueError):
+        latency.LatencySketch(accuracy=0.01).merge(latency.LatencySketch(accuracy=0.05))
+
+
+def test_window_drops_old_slots():
+    clock = [0.0]
+    monitor = latency.LatencyMonitor(window=60.0, slots=6, clock=lambda: clock[0])
+    monitor.record("stripe", "authorize", 0.1)
+    assert monitor.percentiles("stripe", "authorize")["count"] == 1
+    clock[0] += 61
+    assert monitor.percentiles("stripe", "authorize") == {"count": 0}
+
+
+def test_exited_threads_fold_into_retired_shard():
+    monitor = latency.LatencyMonitor(clock=lambda: 1000.0)
+
+    def worker():
+        for _ in range(10):
+            monitor.record("adyen", "authorize", 0.05)
+
+    for _ in range(5):
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert monitor.shards == [monitor.retired]
+    assert monitor.snapshot("adyen", "authorize").count == 1000
+    assert monitor.keys() == [("adyen", "authorize")]
+
+
+def test_retired_slots_keep_newest_epoch():
+    clock = [0.0]
+    monitor = latency.LatencyMonitor(window=60.0, slots=6, clock=lambda: clock[0])
+
+    def worker():
+        monitor.record("adyen", "authorize", 0.05)
+
+    for step in (0.0, 60.0):  # same ring slot, one full window apart
+        clock[0] = step
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+    assert monitor.snapshot("adyen", "authorize").count == 1
+
+
+def test_score_needs_min_samples_and_ranks_fastest_first():
+    monitor = latency.LatencyMonitor(min_samples=5, refresh=0.0, clock=lambda: 1000.0)
+    for _ in range(10):
+        monitor.record("fast", "authorize", 0.05)
+        monitor.record("slow", "authorize", 0.5)
+    monitor.record("cold", "authorize", 0.01)
+    assert monitor.latency_score("cold") is None
+    assert monitor.latency_score("fast") < monitor.latency_score("slow")
+    assert monitor.rank(["slow", "cold", "fast"])[0] == "fast"
+    assert monitor.rank([]) == []
@@ -0,0 +1,63 @@
+import pytest
+
+from skill_loader import load_helper
+
+status = load_helper("normalize-payment-status")
+
+
+@pytest.mark.parametrize("psp, raw, expected", [
+    ("MPGS", "APPROVED", "AUTHORIZED"),
+    ("MPGS", "Approved", "AUTHORIZED"),
+    ("mpgs", "approved", "AUTHORIZED"),
+    ("STRIPE", "succeeded", "CAPTURED"),
+    ("Stripe", "SUCCEEDED", "CAPTURED"),
+    ("ADYEN", "Refused", "DECLINED"),
+    ("ADYEN", "SomethingNew", "UNKNOWN"),
+    ("NOPE", "APPROVED", "UNKNOWN"),
+])
+def test_normalize(psp, raw, expected):
+    assert status.StatusRegistry().normalize(psp, raw) == expected
+
+
+def test_normalize_reason_accepts_ints():
+    registry = status.StatusRegistry()
+    assert registry.normalize_reason("ADYEN", 12) == "INSUFFICIENT_FUNDS"
+    assert registry.normalize_reason("PAYPAL", "5120") == "INSUFFICIENT_FUNDS"
+    assert registry.normalize_reason("PAYPAL", "9999") == "UNKNOWN"
+
+
+def test_normalize_many_matches_normalize():
+    registry = status.StatusRegistry()
+    rows = [(psp, raw) for psp, statuses in status.STATUS_MAPPINGS.items() for raw in statuses]
+    rows += [("ADYEN", "SomethingNew"), ("adyen", "authorised")]
+    assert registry.normalize_many(rows) == [registry.normalize(p, r) for p, r in rows]
+    assert registry.normalize_many([]) == []
+
+
+def test_gaps_count_unmapped_values():
+    registry = status.StatusRegistry()
+    for _ in range(3):
+        registry.normalize("ADYEN", "SomethingNew")
+    registry.normalize_reason("ADYEN", "free text")
+    gaps = registry.gaps()
+    assert gaps["statuses"] == [(("ADYEN", "SomethingNew"), 3)]
+    assert gaps["reasons"] == [(("ADYEN", "free text"), 1)]
+    assert gaps["overflow"] == {"statuses": 0, "reasons": 0}
+
+
+def test_unmapped_counters_are_bounded():
+    registry = status.StatusRegistry(max_unmapped=10, max_raw_length=16)
+    for i in range(1000):
+        registry.normalize_reason("ADYEN", f"customer said {i} " + "x" * 500)
+    registry.normalize("ADYEN", "SomethingNew")
+    assert len(registry.unmapped_reasons) == 10
+    assert all(len(raw) <= 16 for _, raw in registry.unmapped_reasons)
+    assert registry.gaps()["overflow"] == {"statuses": 0, "reasons": 990}
+    # Already-tracked keys keep counting after the cap is hit
+    registry.normalize_reason("ADYEN", "customer said 0 " + "x" * 500)
+    assert registry.unmapped_reasons[("ADYEN", "customer said 0 ")] == 2
+
+
+def test_registry_tables_are_read_only():
+    with pytest.raises(TypeError):
+        status.REGISTRY.statuses[("MPGS", "APPROVED")] = "DECLINED"
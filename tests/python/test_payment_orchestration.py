@@ -0,0 +1,187 @@
+import asyncio
+import time
+
+from skill_loader import load_helper
+
+orchestration = load_helper("payment-orchestration")
+
+
+class FakePSP:
+    """
+    Async PSP with an idempotency store; `fail` is a list of per-call behaviours.
+    """
+
+    def __init__(self, name, fail=(), status="AUTHORIZED", delay=0.0):
+        self.name = name
+        self.fail = list(fail)
+        self.status = status
+        self.delay = delay
+        self.authorized = {}
+        self.calls = 0
+
+    async def authorize(self, amount, idempotency_key=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if idempotency_key in self.authorized:
+            return self.authorized[idempotency_key]
+        behaviour = self.fail.pop(0) if self.fail else None
+        if behaviour == "refused":
+            raise ConnectionRefusedError("refused")
+        if behaviour == "none":
+            return None
+        result = {"psp": self.name, "status": self.status, "id": idempotency_key}
+        if self.status == "AUTHORIZED":
+            self.authorized[idempotency_key] = result
+        if behaviour == "reset":
+            raise ConnectionResetError("connection reset after send")
+        return result
+
+    async def void(self, authorization, idempotency_key=None):
+        self.authorized.pop(authorization["id"], None)
+
+
+class SlowSyncPSP:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.authorized = {}
+
+    def authorize(self, amount, idempotency_key=None):
+        if idempotency_key not in self.authorized:
+            time.sleep(self.seconds)
+            self.authorized[idempotency_key] = {"status": "AUTHORIZED", "id": idempotency_key}
+        return self.authorized[idempotency_key]
+
+    def void(self, authorization, idempotency_key=None):
+        self.authorized.pop(authorization["id"], None)
+
+
+def run(orchestrator, payment_id="pay_1", amount=100):
+    async def go():
+        result = await orchestrator.authorize(payment_id, amount)
+        await orchestrator.drain()
+        return result
+
+    return asyncio.run(go())
+
+
+def make(adapters, **kwargs):
+    kwargs.setdefault("hedge", False)
+    kwargs.setdefault("reconcile_delay", 0.0)
+    return orchestration.HedgedOrchestrator(adapters, **kwargs)
+
+
+def test_authorizes_on_primary():
+    stripe, adyen = FakePSP("stripe"), FakePSP("adyen")
+    result = run(make({"stripe": stripe, "adyen": adyen}))
+    assert result["status"] == "AUTHORIZED" and result["psp"] == "stripe"
+    assert adyen.calls == 0
+
+
+def test_decline_is_an_answer_not_a_failover():
+    stripe, adyen = FakePSP("stripe", status="DECLINED"), FakePSP("adyen")
+    result = run(make({"stripe": stripe, "adyen": adyen}))
+    assert result["status"] == "DECLINED" and result["attempts"] == ["stripe"]
+
+
+def test_refused_connection_fails_over_without_reconciling():
+    stripe, adyen = FakePSP("stripe", fail=["refused"]), FakePSP("adyen")
+    orchestrator = make({"stripe": stripe, "adyen": adyen})
+    result = run(orchestrator)
+    assert result["psp"] == "adyen"
+    assert orchestrator.stats["reconcile_calls"] == 0 and stripe.calls == 1
+
+
+def test_ambiguous_error_is_reconciled_and_voided():
+    stripe, adyen = FakePSP("stripe", fail=["reset"]), FakePSP("adyen")
+    orchestrator = make({"stripe": stripe, "adyen": adyen})
+    result = run(orchestrator)
+    assert result["psp"] == "adyen"
+    assert orchestrator.stats["unknown"] == 1 and orchestrator.stats["voids"] == 1
+    assert stripe.authorized == {} and len(adyen.authorized) == 1
+    assert orchestrator.unreconciled == []
+
+
+def test_invalid_result_is_unknown_and_listed_when_it_stays_unknown():
+    stripe = FakePSP("stripe", fail=["none"] * 4)
+    orchestrator = make({"stripe": stripe})
+    result = run(orchestrator)
+    assert result["status"] == "FAILED" and "TypeError" in result["error"]
+    assert orchestrator.stats["reconcile_calls"] == 3
+    assert orchestrator.unreconciled[0]["idempotency_key"] == "pay_1:stripe"
+
+
+def test_timed_out_sync_leg_is_voided_after_it_lands():
+    slow = SlowSyncPSP(0.2)
+    orchestrator = make({"slow": slow}, timeout_budget=0.05, reconcile_delay=0.3)
+    result = run(orchestrator)
+    assert result["status"] == "TIMEOUT"
+    assert orchestrator.stats["voids"] == 1 and slow.authorized == {}
+
+
+def test_hedge_loser_is_voided():
+    stripe = FakePSP("stripe", delay=0.2)
+    adyen = FakePSP("adyen")
+    orchestrator = make({"stripe": stripe, "adyen": adyen}, hedge=True, hedge_delay=0.01, max_hedge_ratio=1.0)
+    result = run(orchestrator)
+    assert result["psp"] == "adyen" and result["hedged"]
+    assert stripe.authorized == {} and orchestrator.stats["voids"] == 1
+
+
+def test_no_psps_available():
+    result = run(make({}))
+    assert result["status"] == "FAILED" and result["attempts"] == []
+
+
+def test_circuit_breaker_opens_and_probes():
+    clock = [0.0]
+    breaker = orchestration.CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: clock[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock[0] = 10
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "CLOSED"
+
+
+def test_export_uses_monitor_sketch():
+    sketch = orchestration.latency.LatencySketch()
+    for v in (0.004, 0.02, 0.2, 3.0):
+        sketch.add(v)
+    exported = orchestration.export_sketch(sketch)
+    counts = dict(exported["buckets"])
+    assert counts[0.005] == 1 and counts[0.025] == 2 and counts[0.25] == 3 and counts["+Inf"] == 4
+    assert orchestration.export_sketch(orchestration.latency.LatencySketch())["p99_ms"] == 0
+
+
+def test_leg_out_of_budget_is_never_started():
+    stripe = FakePSP("stripe")
+    orchestrator = make({"stripe": stripe})
+    result, error, unknown, started = asyncio.run(orchestrator._authorize_leg("stripe", 100, "pay_1:stripe", 0))
+    assert error is not None and not unknown and not started
+    assert stripe.calls == 0
+
+
+def test_no_failover_without_budget_left():
+    stripe, adyen = FakePSP("stripe", fail=["refused"], delay=0.15), FakePSP("adyen")
+    orchestrator = make({"stripe": stripe, "adyen": adyen}, timeout_budget=1.0, min_leg_budget=0.9)
+    result = run(orchestrator)
+    assert result["status"] == "TIMEOUT" and result["attempts"] == ["stripe"]
+    assert adyen.calls == 0 and orchestrator.stats["reconcile_calls"] == 0
+
+
+def test_only_answers_feed_latency_and_only_psp_faults_trip_breaker():
+    stripe, adyen = FakePSP("stripe", fail=["refused"]), FakePSP("adyen", delay=0.2)
+    orchestrator = make({"stripe": stripe, "adyen": adyen})
+    run(orchestrator)
+    assert orchestrator.latency["stripe"].count == 0 and orchestrator.breakers["stripe"].failures == 1
+    assert orchestrator.latency["adyen"].count == 1
+
+    # A late leg that runs out of the payment's budget is not the PSP's fault
+    async def late_leg():
+        await orchestrator._attempt("adyen", "pay_2", 100, 0.01)
+        await orchestrator.drain()
+
+    asyncio.run(late_leg())
+    assert orchestrator.breakers["adyen"].failures == 0 and orchestrator.latency["adyen"].count == 1
@@ -0,0 +1,143 @@
+import asyncio
+import importlib.util
+import socket
+import ssl
+
+import pytest
+
+from skill_loader import load_helper
+
+pentest = load_helper("perform-penetration-test")
+
+needs_fixture = pytest.mark.skipif(
+    importlib.util.find_spec("httpx") is None or importlib.util.find_spec("cryptography") is None,
+    reason="httpx and cryptography needed for the HTTPS fixture")
+
+
+@pytest.fixture
+def fixture_server(request):
+    server, base, client_ctx = pentest.run_fixture_server(**getattr(request, "param", {}))
+    yield base, client_ctx
+    server.shutdown()
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def audit(url, **kwargs):
+    async def run():
+        async with pentest.HeaderAuditor(**kwargs) as auditor:
+            first = await auditor.audit_url(url)
+            second = await auditor.audit_url(url)
+            return first, second, auditor
+
+    return asyncio.run(run())
+
+
+def test_header_checks():
+    assert pentest.check_hsts(None) == [("FAIL", "Strict-Transport-Security missing")]
+    assert pentest.check_hsts("max-age=abc")[0][0] == "FAIL"
+    assert pentest.check_hsts("max-age=63072000; includeSubDomains") == []
+    assert ("FAIL", "CSP script sources allow 'unsafe-inline'") in pentest.check_csp("script-src 'unsafe-inline'")
+    assert not any(s == "FAIL" for s, _ in pentest.check_csp("script-src 'nonce-abc' 'unsafe-inline'"))
+    assert pentest.check_frame_options(None, "frame-ancestors 'none'") == []
+    assert pentest.check_content_type_options("NOSNIFF ") == []
+    assert pentest.validate_headers({}, https=False)[0] == ("FAIL", "Content-Security-Policy missing")
+
+
+def test_ttl_cache_expires_and_discards():
+    clock = [0.0]
+    cache = pentest.TTLCache(ttl=10, clock=lambda: clock[0])
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.discard("b")
+    assert cache.get("a") == 1 and cache.get("b") is None
+    clock[0] = 10
+    assert cache.get("a") is None
+
+
+def test_legacy_context_offers_only_old_protocols():
+    context = pentest.legacy_tls_context()
+    if context is None:
+        pytest.skip("local OpenSSL cannot offer TLS 1.0/1.1")
+    assert context.maximum_version == ssl.TLSVersion.TLSv1_1
+
+
+@needs_fixture
+def test_modern_server_passes_and_is_cached(fixture_server):
+    base, client_ctx = fixture_server
+    first, second, _ = audit(f"{base}/good/1", ssl_context=client_ctx)
+    assert first["result"] == "PASS" and not first["cached"]
+    assert first["tls"]["legacy_tls"] is False
+    assert second["cached"]
+
+
+@needs_fixture
+@pytest.mark.parametrize("fixture_server", [{"legacy_tls": True}], indirect=True)
+def test_server_accepting_legacy_tls_fails(fixture_server):
+    if pentest.legacy_tls_context() is None:
+        pytest.skip("local OpenSSL cannot offer TLS 1.0/1.1")
+    base, client_ctx = fixture_server
+    first, _, _ = audit(f"{base}/good/1", ssl_context=client_ctx)
+    assert first["result"] == "FAIL"
+    assert any("accepts TLSv1" in f["message"] for f in first["findings"])
+
+
+@needs_fixture
+def test_unverified_context_reports_missing_expiry(fixture_server):
+    base, _ = fixture_server
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    first, _, _ = audit(f"{base}/good/1", ssl_context=context)
+    assert "cert_expires" not in first["tls"]
+    assert any("expiry unavailable" in f["message"] for f in first["findings"])
+
+
+@needs_fixture
+def test_weak_and_missing_profiles(fixture_server):
+    base, client_ctx = fixture_server
+
+    async def run():
+        async with pentest.HeaderAuditor(ssl_context=client_ctx) as auditor:
+            return await auditor.audit([f"{base}/weak/1", f"{base}/missing/2", f"{base}/good/3"])
+
+    report = asyncio.run(run())
+    assert report["summary"] == {"PASS": 1, "WARN": 0, "FAIL": 2, "ERROR": 0}
+
+
+@pytest.mark.skipif(importlib.util.find_spec("httpx") is None, reason="httpx not installed")
+def test_errors_are_not_cached():
+    port = closed_port()
+    first, second, auditor = audit(f"https://127.0.0.1:{port}/", timeout=1.0)
+    assert first["result"] == "ERROR" and not second["cached"]
+
+    async def handshake_twice():
+        results = [await auditor._tls("127.0.0.1", port) for _ in range(2)]
+        return results, dict(auditor.tls_cache.entries)
+
+    results, cached = asyncio.run(handshake_twice())
+    assert all(findings[0][0] == "ERROR" for _, findings in results)
+    assert cached == {}
+
+
+@pytest.mark.skipif(importlib.util.find_spec("httpx") is None, reason="httpx not installed")
+def test_empty_audit():
+    async def run():
+        async with pentest.HeaderAuditor() as auditor:
+            return await auditor.audit([])
+
+    assert asyncio.run(run())["summary"] == {"PASS": 0, "WARN": 0, "FAIL": 0, "ERROR": 0}
+
+
+@needs_fixture
+def test_untrusted_cert_is_a_cached_tls_failure(fixture_server):
+    base, _ = fixture_server
+    # The default context does not trust the fixture's self-signed cert
+    first, second, _ = audit(f"{base}/good/1")
+    assert first["result"] == "FAIL" and second["cached"]
+    assert any(f["check"] == "tls" and "verification failed" in f["message"] for f in first["findings"])
+    assert not any(f["check"] == "connect" for f in first["findings"])
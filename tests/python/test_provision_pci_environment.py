@@ -0,0 +1,68 @@
+import ipaddress
+import itertools
+
+import pytest
+
+from skill_loader import load_helper
+
+provision = load_helper("provision-pci-environment")
+
+
+def names(networks):
+    return [str(n) for n in networks]
+
+
+def test_query_lists_each_overlap_once():
+    index = provision.CIDRIndex(["10.0.0.0/8", "10.0.1.0/24"])
+    assert names(index.query("10.0.0.0/16")) == ["10.0.0.0/8", "10.0.1.0/24"]
+    assert names(index.query("10.0.0.0/8")) == ["10.0.0.0/8", "10.0.1.0/24"]
+    assert names(index.query("10.0.1.128/25")) == ["10.0.0.0/8", "10.0.1.0/24"]
+    assert index.query("192.168.0.0/16") == []
+
+
+def test_query_matches_pairwise_overlaps():
+    networks = ["10.0.0.0/8", "10.0.0.0/16", "10.0.0.0/24", "10.0.1.0/24", "10.1.0.0/16", "172.16.0.0/12",
+                "fd00::/8", "fd00::/64"]
+    index = provision.CIDRIndex(networks)
+    for query in networks + ["10.0.0.0/12", "10.0.0.128/25", "0.0.0.0/0", "fd00::/16"]:
+        q = ipaddress.ip_network(query)
+        expected = sorted(n for n in networks if ipaddress.ip_network(n).version == q.version
+                          and ipaddress.ip_network(n).overlaps(q))
+        assert sorted(names(index.query(query))) == expected, query
+
+
+def test_overlaps_and_empty_index():
+    index = provision.CIDRIndex(["10.0.0.0/16", "10.0.1.0/24", "10.1.0.0/16"])
+    assert [(str(a), str(b)) for a, b in index.overlaps()] == [("10.0.0.0/16", "10.0.1.0/24")]
+    empty = provision.CIDRIndex([])
+    assert len(empty) == 0 and empty.overlaps() == [] and empty.query("10.0.0.0/8") == []
+
+
+def test_planner_skips_reserved_and_exhausts():
+    planner = provision.SubnetPlanner("10.0.0.0/22", reserved=["10.0.0.0/24"])
+    got = [planner.allocate(24) for _ in range(3)]
+    assert names(got) == ["10.0.1.0/24", "10.0.2.0/24", "10.0.3.0/24"]
+    with pytest.raises(ValueError):
+        planner.allocate(24)
+    assert planner.free_addresses() == 0
+
+
+def test_plan_allows_nested_reserved_ranges():
+    plan = provision.plan_environment(["a", "b"], reserved=["10.0.0.0/16", "10.0.1.0/24"])
+    vpcs = [ipaddress.ip_network(p["vpc"]) for p in plan.values()]
+    assert all(not v.overlaps(ipaddress.ip_network("10.0.0.0/16")) for v in vpcs)
+    assert not any(a.overlaps(b) for a, b in itertools.combinations(vpcs, 2))
+    tiers = plan["a"]["tiers"]
+    assert set(tiers) == {"public", "private", "isolated"}
+    assert set(tiers["public"]["subnets"]) == {"a", "b"}
+
+
+def test_plan_with_no_accounts_and_exhausted_supernet():
+    assert provision.plan_environment([]) == {}
+    with pytest.raises(ValueError):
+        provision.plan_environment(["a", "b"], supernet="10.0.0.0/16", vpc_prefix=16, reserved=["10.0.0.0/17"])
+
+
+def test_iter_hosts_small_networks():
+    assert names(provision.iter_hosts(["10.0.0.5/32", "10.0.0.0/31", "10.0.0.0/30"])) == [
+        "10.0.0.5", "10.0.0.0", "10.0.0.1", "10.0.0.1", "10.0.0.2"]
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+from skill_loader import load_helper
+
+psp = load_helper("psp-integration")
+
+
+def test_get_provider_returns_sync_adapters():
+    adapter = psp.get_provider("stripe")
+    assert isinstance(adapter, psp.StripeAdapter)
+    assert adapter.authorize(100)["status"] == "AUTHORIZED"
+    assert psp.get_provider("adyen") is not psp.get_provider("adyen")
+    with pytest.raises(ValueError):
+        psp.get_provider("unknown")
+
+
+def test_get_async_provider_shares_one_instance():
+    assert psp.get_async_provider("stripe") is psp.get_async_provider("stripe")
+    assert isinstance(psp.get_async_provider("adyen"), psp.AsyncPaymentAdapter)
+    with pytest.raises(ValueError):
+        psp.get_async_provider("unknown")
+
+
+def test_async_contract_is_abstract():
+    with pytest.raises(TypeError):
+        psp.AsyncPaymentAdapter()
+
+    class Partial(psp.AsyncPaymentAdapter):
+        async def authorize(self, amount, currency="USD", idempotency_key=None, **details):
+            return {}
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_registry_resolves_lazily_and_closes():
+    registry = psp.AdapterRegistry(group="tests.none")
+    registry.register("json", "json:JSONDecoder")
+    assert registry.loaded() == []
+    assert isinstance(registry.get("json"), json.JSONDecoder)
+    assert registry.loaded() == ["json"]
+    asyncio.run(registry.aclose())
+    assert registry.loaded() == []
+
+
+def test_stripe_authorize_requires_payment_method():
+    adapter = psp.StripeAsyncAdapter(api_key="sk_test")
+    with pytest.raises(ValueError, match="payment_method"):
+        asyncio.run(adapter.authorize(100))
+
+
+def test_stripe_server_error_raises_http_error_not_json_error():
+    httpx = pytest.importorskip("httpx")
+
+    def handler(request):
+        return httpx.Response(502, text="<html>Bad Gateway</html>")
+
+    async def run():
+        adapter = psp.StripeAsyncAdapter(api_key="sk_test", transport=httpx.MockTransport(handler))
+        try:
+            await adapter.authorize(100, payment_method="pm_card_visa")
+        finally:
+            await adapter.close()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(run())
+
+
+def test_stripe_results_map_to_transaction_status():
+    httpx = pytest.importorskip("httpx")
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if b"pm_card_chargeDeclined" in request.content:
+            return httpx.Response(402, json={"error": {"decline_code": "card_declined",
+                                                       "payment_intent": {"id": "pi_2"}}})
+        return httpx.Response(200, json={"id": "pi_1", "status": "requires_capture", "amount": 100})
+
+    async def run():
+        adapter = psp.StripeAsyncAdapter(api_key="sk_test", transport=httpx.MockTransport(handler))
+        try:
+            ok = await adapter.authorize(100, idempotency_key="k1", payment_method="pm_card_visa")
+            declined = await adapter.authorize(100, payment_method="pm_card_chargeDeclined")
+        finally:
+            await adapter.close()
+        return ok, declined
+
+    ok, declined = asyncio.run(run())
+    assert ok == {"psp": "stripe", "status": "AUTHORIZED", "id": "pi_1", "amount": 100}
+    assert declined["status"] == "DECLINED" and declined["decline_code"] == "card_declined"
+    assert seen[0].headers["Idempotency-Key"] == "k1"
+    assert "Idempotency-Key" not in seen[1].headers
@@ -0,0 +1,166 @@
+import json
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from skill_loader import load_helper
+
+rotation = load_helper("rotate-encryption-keys")
+vault = rotation.vault
+pytestmark = pytest.mark.skipif(vault.AESGCM is None, reason="cryptography not installed")
+
+PANS = [f"5{i:015d}" for i in range(40)]
+
+
+def test_check_key_age():
+    old = (datetime.now(timezone.utc) - timedelta(days=400)).isoformat()
+    fresh = (datetime.now(timezone.utc) - timedelta(days=10)).isoformat()
+    assert rotation.check_key_age(old)["needs_rotation"]
+    assert not rotation.check_key_age(fresh)["needs_rotation"]
+
+
+@pytest.fixture
+def populated(tmp_path):
+    keks = {"kek-1": vault.AESGCM.generate_key(bit_length=256)}
+    fp_key = secrets.token_bytes(32)
+    card_vault = vault.CardVault(str(tmp_path), keks, "kek-1", fp_key, segment_size=1024)
+    tokens = []
+    for i in range(0, len(PANS), 4):
+        tokens += [r["token"] for r in card_vault.tokenize_many(PANS[i:i + 4])]
+    card_vault.close()
+    keks["kek-2"] = vault.AESGCM.generate_key(bit_length=256)
+    return tmp_path, keks, fp_key, tokens
+
+
+def header_kek(path, seg_no):
+    with open(os.path.join(path, f"{seg_no:08d}.seg"), "rb") as f:
+        return vault.HEADER.unpack(f.read(vault.HEADER.size))[1].rstrip(b"\0").decode()
+
+
+def segments(path):
+    return sorted(int(n[:-4]) for n in os.listdir(path) if n.endswith(".seg"))
+
+
+@pytest.mark.parametrize("reencrypt", [False, True])
+def test_rotation_keeps_every_pan_readable(populated, reencrypt):
+    path, keks, fp_key, tokens = populated
+    result = rotation.KeyRotationJob(str(path), keks, "kek-2", reencrypt=reencrypt, workers=2,
+                                     max_bytes_per_sec_per_worker=None).run()
+    assert result["rotated"] == len(segments(path)) > 1
+    assert {header_kek(path, s) for s in segments(path)} == {"kek-2"}
+
+    # The old KEK is no longer needed
+    reopened = vault.CardVault(str(path), {"kek-2": keks["kek-2"]}, "kek-2", fp_key)
+    assert reopened.detokenize_many(tokens) == PANS
+    reopened.close()
+
+
+def test_rotation_resumes_from_checkpoint(populated):
+    path, keks, _, _ = populated
+    job = rotation.KeyRotationJob(str(path), keks, "kek-2", workers=1)
+    done = segments(path)[:2]
+    job._save_checkpoint(set(done))
+    result = job.run()
+    assert result["rotated"] == len(segments(path)) - 2
+    with open(job.checkpoint_path) as f:
+        assert json.load(f)["done"] == segments(path)
+
+    with pytest.raises(ValueError):
+        rotation.KeyRotationJob(str(path), keks, "kek-2", reencrypt=True).run()
+
+
+def test_rewrap_skips_segments_already_on_the_new_kek(populated):
+    path, keks, _, _ = populated
+    assert rotation.rotate_segment(str(path), 0, keks, "kek-1", False)[3] == "skipped"
+
+
+def test_torn_header_write_is_repaired_from_journal(populated):
+    path, keks, fp_key, tokens = populated
+    seg_path = os.path.join(path, "00000000.seg")
+    with open(seg_path, "rb") as f:
+        header = f.read(vault.HEADER.size)
+    kek_id, dek = vault.unwrap_dek(keks, header, "00000000")
+    new_header = vault.wrap_dek(keks["kek-2"], "kek-2", dek, "00000000")
+
+    # Crash after the journal was made durable, halfway through the in-place write
+    with open(f"{seg_path}.header", "wb") as f:
+        f.write(new_header)
+    with open(seg_path, "r+b") as f:
+        f.write(new_header[:30])
+    with pytest.raises(Exception):
+        vault.unwrap_dek(keks, open(seg_path, "rb").read(vault.HEADER.size), "00000000")
+
+    reopened = vault.CardVault(str(path), keks, "kek-1", fp_key)
+    assert header_kek(path, 0) == "kek-2"
+    assert not os.path.exists(f"{seg_path}.header")
+    assert reopened.detokenize_many(tokens) == PANS
+    reopened.close()
+
+
+def test_incomplete_journal_leaves_segment_untouched(populated):
+    path, keks, fp_key, tokens = populated
+    seg_path = os.path.join(path, "00000000.seg")
+    with open(f"{seg_path}.header.tmp", "wb") as f:
+        f.write(b"partial")
+    assert not vault.restore_header(seg_path)
+    assert not os.path.exists(f"{seg_path}.header.tmp")
+    assert header_kek(path, 0) == "kek-1"
+
+
+def test_reencrypt_tolerates_torn_tail(populated):
+    path, keks, fp_key, tokens = populated
+    seg_path = os.path.join(path, "00000000.seg")
+    with open(seg_path, "ab") as f:
+        f.write(b"\x00\x00\x01\x00tok_torn")
+    _, _, records, mode = rotation.rotate_segment(str(path), 0, keks, "kek-2", True)
+    assert mode == "reencrypted" and records > 0
+
+    reopened = vault.CardVault(str(path), keks, "kek-2", fp_key)
+    assert reopened.detokenize_many(tokens) == PANS
+    reopened.close()
+
+
+def test_restore_header_tolerates_a_concurrent_restore(populated, monkeypatch):
+    path, keks, _, _ = populated
+    seg_path = os.path.join(path, "00000000.seg")
+    _, dek = vault.unwrap_dek(keks, open(seg_path, "rb").read(vault.HEADER.size), "00000000")
+    with open(f"{seg_path}.header", "wb") as f:
+        f.write(vault.wrap_dek(keks["kek-2"], "kek-2", dek, "00000000"))
+
+    real_pwrite = os.pwrite
+
+    def pwrite_and_lose_race(fd, data, offset):
+        # The other process finishes the same journal while we are mid-write
+        if os.path.exists(f"{seg_path}.header"):
+            os.unlink(f"{seg_path}.header")
+        return real_pwrite(fd, data, offset)
+
+    monkeypatch.setattr(vault.os, "pwrite", pwrite_and_lose_race)
+    assert vault.restore_header(seg_path)
+    assert not vault.restore_header(seg_path)
+    assert header_kek(path, 0) == "kek-2"
+
+
+def test_segments_created_during_rotation_are_rotated(populated):
+    path, keks, fp_key, _ = populated
+    live = vault.CardVault(str(path), dict(keks), "kek-1", fp_key, segment_size=1024)
+    before = segments(path)
+
+    class RacingJob(rotation.KeyRotationJob):
+        calls = 0
+
+        def _segments(self):
+            RacingJob.calls += 1
+            if RacingJob.calls == 2:
+                # The live vault rolls over mid-run, still sealing under the old KEK
+                for i in range(0, 40, 4):
+                    live.tokenize_many([f"6{j:015d}" for j in range(i, i + 4)])
+            return super()._segments()
+
+    result = RacingJob(str(path), keks, "kek-2", workers=1).run()
+    assert len(segments(path)) > len(before)
+    assert result["rotated"] == len(segments(path))
+    assert {header_kek(path, s) for s in segments(path)} == {"kek-2"}
+    live.close()
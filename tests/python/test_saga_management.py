@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+
+from skill_loader import load_helper
+
+saga = load_helper("saga-management")
+
+
+def read_log(path):
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+
+def make_engine(log, calls):
+    engine = saga.SagaEngine(log, retry_delay=0)
+
+    async def reserve(context, key):
+        calls.append(key)
+        return {"reserved": True}
+
+    async def charge(context, key):
+        calls.append(key)
+        if context.get("decline"):
+            raise RuntimeError("declined")
+        return {"charged": True}
+
+    async def undo(context, key):
+        calls.append(key)
+
+    engine.register("checkout", [("reserve", reserve, undo), ("charge", charge, undo)])
+    return engine
+
+
+def test_completed_and_compensated_sagas(tmp_path):
+    path = str(tmp_path / "saga.log")
+    calls = []
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        engine = make_engine(log, calls)
+        ok = await engine.start("checkout", "S1")
+        failed = await engine.start("checkout", "S2", {"decline": True})
+        await log.close()
+        return ok, failed
+
+    ok, failed = asyncio.run(run())
+    assert ok == ("COMPLETED", {"reserved": True, "charged": True})
+    assert failed[0] == "FAILED"
+    assert "S2:reserve:compensate" in calls
+    assert {sid: s["state"] for sid, s in saga.SagaLog.replay(path).items()} == {"S1": "COMPLETED", "S2": "FAILED"}
+
+
+def test_replay_of_missing_or_empty_log(tmp_path):
+    assert saga.SagaLog.replay(str(tmp_path / "missing.log")) == {}
+    empty = tmp_path / "empty.log"
+    empty.write_bytes(b"")
+    assert saga.SagaLog.replay(str(empty)) == {}
+
+
+def test_short_writes_are_completed(tmp_path, monkeypatch):
+    path = str(tmp_path / "saga.log")
+    real_write = os.write
+    monkeypatch.setattr(saga.os, "write", lambda fd, data: real_write(fd, bytes(data[:7])))
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        await make_engine(log, []).start("checkout", "S1")
+        await log.close()
+
+    asyncio.run(run())
+    assert [r["event"] for r in read_log(path)] == ["CREATED", "STEP_DONE", "STEP_DONE", "COMPLETED"]
+
+
+def test_failed_write_is_cut_off_and_reported(tmp_path, monkeypatch):
+    path = str(tmp_path / "saga.log")
+    real_write = os.write
+    state = {"fail": False}
+
+    def flaky_write(fd, data):
+        if state["fail"]:
+            real_write(fd, bytes(data[:5]))
+            raise OSError(28, "No space left on device")
+        return real_write(fd, data)
+
+    monkeypatch.setattr(saga.os, "write", flaky_write)
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        await log.append({"saga": "S1", "event": "CREATED", "definition": "checkout", "context": {}})
+        state["fail"] = True
+        try:
+            await log.append({"saga": "S1", "event": "COMPLETED"})
+        except OSError:
+            pass
+        else:
+            raise AssertionError("append should have failed")
+        state["fail"] = False
+        await log.append({"saga": "S1", "event": "FAILED"})
+        await log.close()
+
+    asyncio.run(run())
+    assert [r["event"] for r in read_log(path)] == ["CREATED", "FAILED"]
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    path = tmp_path / "saga.log"
+    path.write_bytes(b'{"saga": "S1", "event": "CREATED", "definition": "checkout", "context": {}}\n{"saga": "S1", "ev')
+
+    async def run():
+        log = await saga.SagaLog(str(path)).open()
+        await log.append({"saga": "S1", "event": "FAILED"})
+        await log.close()
+
+    asyncio.run(run())
+    assert [r["event"] for r in read_log(path)] == ["CREATED", "FAILED"]
+
+
+def test_unserializable_result_compensates_the_step(tmp_path):
+    path = str(tmp_path / "saga.log")
+    calls = []
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        engine = make_engine(log, calls)
+
+        async def bad(context, key):
+            return {"when": object()}
+
+        async def undo(context, key):
+            calls.append(key)
+
+        engine.register("bad", [("reserve", bad, undo)])
+        result = await engine.start("bad", "S1")
+        await log.close()
+        return result
+
+    state, _ = asyncio.run(run())
+    assert state == "FAILED"
+    assert calls == ["S1:reserve:compensate"]
+    assert [r["event"] for r in read_log(path)] == ["CREATED", "STEP_DONE", "STEP_FAILED", "COMPENSATED", "FAILED"]
+
+
+def test_non_dict_result_is_a_step_failure(tmp_path):
+    path = str(tmp_path / "saga.log")
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        engine = saga.SagaEngine(log)
+
+        async def bad(context, key):
+            return ["not", "a", "dict"]
+
+        engine.register("bad", [("reserve", bad, None)])
+        result = await engine.start("bad", "S1")
+        await log.close()
+        return result
+
+    assert asyncio.run(run())[0] == "FAILED"
+
+
+def test_recover_continues_past_a_failing_saga(tmp_path):
+    path = str(tmp_path / "saga.log")
+    records = [
+        {"saga": "S1", "event": "CREATED", "definition": "checkout", "context": {}},
+        {"saga": "S2", "event": "CREATED", "definition": "broken", "context": {}},
+        {"saga": "S2", "event": "STEP_DONE", "step": "reserve", "index": 0, "result": {}},
+        {"saga": "S2", "event": "STEP_FAILED", "step": "charge", "error": "x"},
+    ]
+    with open(path, "w") as f:
+        f.writelines(json.dumps(r) + "\n" for r in records)
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        engine = make_engine(log, [])
+
+        async def stuck(context, key):
+            raise RuntimeError("PSP unavailable")
+
+        engine.register("broken", [("reserve", None, stuck)])
+        result = await engine.recover()
+        await log.close()
+        return result
+
+    result = asyncio.run(run())
+    assert result["S1"] == "COMPLETED"
+    assert isinstance(result["S2"], RuntimeError)
+    assert saga.SagaLog.replay(path)["S2"]["state"] == "COMPENSATING"
+
+
+def test_compact_drops_finished_sagas(tmp_path):
+    path = str(tmp_path / "saga.log")
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        engine = make_engine(log, [])
+        for i in range(20):
+            await engine.start("checkout", f"S{i}")
+        await log.append({"saga": "OPEN", "event": "CREATED", "definition": "checkout", "context": {}})
+        await log.compact()
+        await log.append({"saga": "OPEN", "event": "STEP_DONE", "step": "reserve", "index": 0, "result": {}})
+        await log.close()
+        return log.stats
+
+    stats = asyncio.run(run())
+    assert stats["compactions"] == 1
+    assert [(r["saga"], r["event"]) for r in read_log(path)] == [("OPEN", "CREATED"), ("OPEN", "STEP_DONE")]
+    assert not os.path.exists(path + ".compact")
+
+
+def test_log_compacts_itself_past_threshold(tmp_path):
+    path = str(tmp_path / "saga.log")
+
+    async def run():
+        log = await saga.SagaLog(path, compact_bytes=2048).open()
+        engine = make_engine(log, [])
+        for i in range(100):
+            await engine.start("checkout", f"S{i}")
+        await log.close()
+        return log.stats
+
+    stats = asyncio.run(run())
+    assert stats["compactions"] >= 1
+    assert os.path.getsize(path) < 2048 + 512
+    assert all(s["state"] == "COMPLETED" for s in saga.SagaLog.replay(path).values())
+
+
+def test_records_queued_behind_close_are_rejected(tmp_path):
+    path = str(tmp_path / "saga.log")
+
+    async def run():
+        log = await saga.SagaLog(path).open()
+        loop = asyncio.get_running_loop()
+        before, after = loop.create_future(), loop.create_future()
+        # A close sentinel landing mid-batch must not take the writer down
+        log.queue.put_nowait((b'{"saga":"S1","event":"CREATED","definition":"checkout","context":{}}\n', before))
+        log.queue.put_nowait(None)
+        log.queue.put_nowait((b'{"saga":"S2","event":"CREATED","definition":"checkout","context":{}}\n', after))
+        await log.close()
+        await before
+        try:
+            await after
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("record queued after close should fail")
+        try:
+            await log.append({"saga": "S3", "event": "CREATED", "definition": "checkout", "context": {}})
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("append after close should fail")
+
+    asyncio.run(run())
+    assert [r["saga"] for r in read_log(path)] == ["S1"]
@@ -0,0 +1,121 @@
+import os
+import secrets
+
+import pytest
+
+from skill_loader import load_helper
+
+vault = load_helper("tokenize-card-data")
+pytestmark = pytest.mark.skipif(vault.AESGCM is None, reason="cryptography not installed")
+
+PANS = [f"4{i:015d}" for i in range(50)]
+
+
+@pytest.fixture
+def keys():
+    return {"kek-1": vault.AESGCM.generate_key(bit_length=256)}, secrets.token_bytes(32)
+
+
+def open_vault(path, keys, **kwargs):
+    keks, fp_key = keys
+    return vault.CardVault(str(path), keks, "kek-1", fp_key, **kwargs)
+
+
+def test_round_trip_and_dedup(tmp_path, keys):
+    v = open_vault(tmp_path, keys)
+    results = v.tokenize_many(PANS + PANS[:5])
+    tokens = [r["token"] for r in results]
+    assert tokens[50:] == tokens[:5]
+    assert len(v) == 50
+    assert v.tokenize(PANS[7])["token"] == tokens[7]
+    assert results[0] == {"token": tokens[0], "last4": PANS[0][-4:], "bin": PANS[0][:6]}
+    assert v.detokenize_many(tokens[:50] + ["tok_unknown"]) == PANS + [None]
+    assert v.tokenize_many([]) == []
+    v.close()
+
+
+def test_reopen_rebuilds_index_and_segments_roll_over(tmp_path, keys):
+    v = open_vault(tmp_path, keys, segment_size=2048)
+    tokens = []
+    for i in range(0, 50, 5):
+        tokens += [r["token"] for r in v.tokenize_many(PANS[i:i + 5])]
+    v.close()
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) > 1
+
+    reopened = open_vault(tmp_path, keys, segment_size=2048)
+    assert reopened.detokenize_many(tokens) == PANS
+    assert reopened.tokenize(PANS[3])["token"] == tokens[3]
+    reopened.close()
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path, keys):
+    v = open_vault(tmp_path, keys)
+    tokens = [r["token"] for r in v.tokenize_many(PANS[:3])]
+    v.close()
+    segment = tmp_path / "00000000.seg"
+    size = segment.stat().st_size
+    with open(segment, "ab") as f:
+        f.write(b"\x00\x00\x00\x60tok_partial")
+
+    reopened = open_vault(tmp_path, keys)
+    assert segment.stat().st_size == size
+    assert reopened.detokenize_many(tokens) == PANS[:3]
+    new = reopened.tokenize(PANS[10])["token"]
+    reopened.close()
+    assert open_vault(tmp_path, keys).detokenize(new) == PANS[10]
+
+
+def test_short_writes_are_completed(tmp_path, keys, monkeypatch):
+    v = open_vault(tmp_path, keys)
+    real_write = os.write
+    monkeypatch.setattr(vault.os, "write", lambda fd, data: real_write(fd, bytes(data[:7])))
+    tokens = [r["token"] for r in v.tokenize_many(PANS[:10])]
+    monkeypatch.undo()
+    v.close()
+    assert open_vault(tmp_path, keys).detokenize_many(tokens) == PANS[:10]
+
+
+def test_failed_write_rolls_back_and_is_not_indexed(tmp_path, keys, monkeypatch):
+    v = open_vault(tmp_path, keys)
+    kept = v.tokenize(PANS[0])["token"]
+    size = os.path.getsize(tmp_path / "00000000.seg")
+    real_write = os.write
+
+    def failing_write(fd, data):
+        real_write(fd, bytes(data[:10]))
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(vault.os, "write", failing_write)
+    with pytest.raises(OSError):
+        v.tokenize_many(PANS[1:5])
+    monkeypatch.undo()
+
+    assert os.path.getsize(tmp_path / "00000000.seg") == size
+    assert len(v) == 1
+    retry = [r["token"] for r in v.tokenize_many(PANS[1:5])]
+    v.close()
+    assert open_vault(tmp_path, keys).detokenize_many([kept] + retry) == PANS[:5]
+
+
+def test_tokens_are_fsynced_before_return(tmp_path, keys, monkeypatch):
+    v = open_vault(tmp_path, keys)
+    synced = []
+    monkeypatch.setattr(vault.os, "fsync", lambda fd: synced.append(fd))
+    v.tokenize_many(PANS[:3])
+    assert synced == [v.fh.fileno()]
+    v.tokenize_many(PANS[:3])  # all known: nothing appended
+    v.tokenize(PANS[4], durable=False)
+    assert len(synced) == 1
+
+
+def test_kek_id_is_validated(tmp_path, keys):
+    keks, fp_key = keys
+    long_id = "k" * (vault.KEK_ID_SIZE + 1)
+    with pytest.raises(ValueError):
+        vault.CardVault(str(tmp_path), {long_id: keks["kek-1"]}, long_id, fp_key)
+    with pytest.raises(KeyError):
+        vault.CardVault(str(tmp_path), keks, "kek-missing", fp_key)
+    v = open_vault(tmp_path, keys)
+    with pytest.raises(ValueError):
+        v.add_kek(long_id, keks["kek-1"])
+    v.close()
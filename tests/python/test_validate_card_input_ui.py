@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from skill_loader import load_helper
+
+cards = load_helper("validate-card-input-ui")
+
+KNOWN = {
+    "4242 4242 4242 4242": ("visa", True),
+    "378282246310005": ("amex", True),
+    "5555-5555-5555-4444": ("mastercard", True),
+    "2223003122003222": ("mastercard", True),
+    "6011111111111117": ("discover", True),
+    "3530111333300000": ("jcb", True),
+    "36227206271667": ("diners", True),
+    "6200000000000005": ("unionpay", True),
+    "5555555555554443": ("mastercard", False),
+    "4242424242424": ("visa", False),
+    "9999999999999995": ("unknown", False),
+}
+
+
+@pytest.mark.parametrize("number, expected", KNOWN.items())
+def test_validate_card_number(number, expected):
+    brand, valid = expected
+    result = cards.validate_card_number(number)
+    assert (result["brand"], result["valid"]) == (brand, valid)
+
+
+def test_bulk_matches_scalar():
+    rng = random.Random(11)
+    numbers = list(KNOWN)
+    for _ in range(3000):
+        prefix = rng.choice(["4", "34", "37", "51", "2221", "6011", "62", "3530", "50", "9", ""])
+        length = rng.choice([12, 13, 14, 15, 16, 19, 20])
+        numbers.append(prefix + "".join(rng.choice("0123456789") for _ in range(max(0, length - len(prefix)))))
+    numbers += ["", "abcd", "4242 4242 4242 424x", "4" * 25, "٤٢٤٢٤٢٤٢٤٢٤٢٤٢٤٢"]
+
+    bulk = cards.validate_card_numbers(numbers)
+    for i, number in enumerate(numbers):
+        scalar = cards.validate_card_number(number)
+        assert bulk["brand"][i] == scalar["brand"], number
+        for key in ("luhn", "length_ok", "valid"):
+            assert bool(bulk[key][i]) == scalar[key], (number, key)
+
+
+def test_malformed_numbers_are_invalid():
+    result = cards.validate_card_numbers(["", "abcd", "4" * 25])
+    assert [bool(v) for v in result["valid"]] == [False, False, False]
+    assert [bool(v) for v in result["luhn"]] == [False, False, False]
+
+
+def test_empty_batch():
+    result = cards.validate_card_numbers([])
+    assert all(len(result[key]) == 0 for key in ("luhn", "brand", "length_ok", "valid"))
+
+
+def test_scalar_fallback_without_numpy(monkeypatch):
+    monkeypatch.setattr(cards, "np", None)
+    result = cards.validate_card_numbers(["4242424242424242", "1234"])
+    assert result == {"luhn": [True, False], "brand": ["visa", "unknown"],
+                      "length_ok": [True, False], "valid": [True, False]}
+
+
+def test_luhn_check():
+    assert cards.luhn_check("4242424242424242")
+    assert not cards.luhn_check("4242424242424241")
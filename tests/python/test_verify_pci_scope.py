@@ -0,0 +1,110 @@
+import asyncio
+import errno
+
+import pytest
+
+from skill_loader import load_helper
+
+scope = load_helper("verify-pci-scope")
+
+
+def fail_with(code):
+    async def open_connection(host, port):
+        raise OSError(code, "simulated")
+
+    return open_connection
+
+
+@pytest.mark.parametrize("code, state", [
+    (errno.EHOSTUNREACH, "FILTERED"),
+    (errno.ENETUNREACH, "FILTERED"),
+    (errno.EACCES, "FILTERED"),
+    (errno.ECONNRESET, "CLOSED"),
+    (errno.EMFILE, "ERROR"),
+    (errno.EADDRNOTAVAIL, "ERROR"),
+])
+def test_probe_classifies_connect_errors(monkeypatch, code, state):
+    monkeypatch.setattr(asyncio, "open_connection", fail_with(code))
+    assert asyncio.run(scope.probe("10.0.0.1", 22)) == state
+
+
+def test_probe_open_refused_and_timeout(monkeypatch):
+    async def run():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        opened = await scope.probe("127.0.0.1", port)
+        server.close()
+        await server.wait_closed()
+        refused = await scope.probe("127.0.0.1", port)
+        return opened, refused
+
+    assert asyncio.run(run()) == ("OPEN", "CLOSED")
+
+    async def hang(host, port):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(asyncio, "open_connection", hang)
+    assert asyncio.run(scope.probe("10.0.0.1", 22, timeout=0.01)) == "FILTERED"
+
+
+def test_unreachable_targets_pass_closed_rules_and_errors_fail(monkeypatch):
+    matrix = [{"source": "office", "target": "cde", "targets": ["10.0.20.0/30"], "ports": [22], "expect": "closed"}]
+    scanner = scope.SegmentationScanner(concurrency=4, per_host_rate=0)
+
+    monkeypatch.setattr(asyncio, "open_connection", fail_with(errno.EHOSTUNREACH))
+    row = asyncio.run(scanner.scan(matrix, "office"))["rules"][0]
+    assert row["result"] == "PASS" and row["counts"] == {"FILTERED": row["probes"]}
+
+    monkeypatch.setattr(asyncio, "open_connection", fail_with(errno.EMFILE))
+    row = asyncio.run(scanner.scan(matrix, "office"))["rules"][0]
+    assert row["result"] == "FAIL" and row["counts"]["ERROR"] == row["probes"]
+
+
+def test_open_rule_fails_when_filtered(monkeypatch):
+    matrix = [{"source": "app", "target": "db", "targets": ["10.0.20.5/32"], "ports": [5432], "expect": "open"}]
+    monkeypatch.setattr(asyncio, "open_connection", fail_with(errno.EHOSTUNREACH))
+    report = asyncio.run(scope.SegmentationScanner(per_host_rate=0).scan(matrix, "app"))
+    assert report["rules"][0]["result"] == "FAIL"
+    assert report["rules"][0]["findings"] == [{"ip": "10.0.20.5", "port": 5432, "state": "FILTERED"}]
+    assert "FAIL" in scope.format_matrix(report)
+
+
+def test_open_rule_passes_when_any_host_answers_each_port(monkeypatch):
+    matrix = [{"source": "app", "target": "db", "targets": ["10.0.20.0/30"], "ports": [5432, 6432],
+               "expect": "open"}]
+
+    class Writer:
+        def close(self):
+            pass
+
+        async def wait_closed(self):
+            pass
+
+    async def one_db_listens(host, port):
+        if host == "10.0.20.1" and port == 5432:
+            return None, Writer()
+        raise OSError(errno.EHOSTUNREACH, "simulated")
+
+    monkeypatch.setattr(asyncio, "open_connection", one_db_listens)
+    scanner = scope.SegmentationScanner(per_host_rate=0)
+    row = asyncio.run(scanner.scan(matrix, "app"))["rules"][0]
+    # 5432 is reachable on one host; 6432 on none
+    assert row["result"] == "FAIL" and row["violations"] == 1
+    assert {f["port"] for f in row["findings"]} == {6432}
+
+    matrix[0]["ports"] = [5432]
+    row = asyncio.run(scanner.scan(matrix, "app"))["rules"][0]
+    assert row["result"] == "PASS" and row["violations"] == 0 and row["findings"] == []
+
+
+def test_scan_with_no_rules_for_zone():
+    assert asyncio.run(scope.SegmentationScanner().scan(scope.ZONE_MATRIX, "nowhere"))["rules"] == []
+
+
+def test_rate_limiter_spaces_probes_per_host():
+    clock = [0.0]
+    limiter = scope.HostRateLimiter(rate=10, clock=lambda: clock[0])
+    asyncio.run(limiter.acquire("a"))
+    assert limiter.next_slot["a"] == pytest.approx(0.1)
+    limiter.forget("a", now=0.2)
+    assert "a" not in limiter.next_slot